@@ -124,6 +124,41 @@ STATICFILES_DIRS = [
     os.path.join(BASE_DIR, "static"),
 ]
 
+# Shared file-based cache so every worker process sees the same cached data.
+# The voter data-version stamp has its own cache: the default one culls random
+# entries once it is full, and losing the stamp would invalidate everything.
+# MAX_ENTRIES is far above the one key it holds, so it is never culled.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'django_cache'),
+    },
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'django_cache', 'versions'),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
+# Directory holding the memory-mapped columnar snapshot of the Voter table
+# (built only when numpy is installed; see the Pipfile)
+VOTER_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'voter_snapshot')
+
+# Size limits for the rendered voter page cache: total bytes kept in each
+# process, and the largest page also shared with other processes
+VOTER_RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+VOTER_RESULT_CACHE_SHARED_MAX_ENTRY_BYTES = 1024 * 1024
+
+# Approximate voter graphs: voters in the uniform sample kept with the snapshot,
+# and the estimated result size below which graphs are computed exactly instead
+VOTER_SAMPLE_SIZE = 100_000
+VOTER_APPROXIMATE_MIN_VOTERS = 50_000
+
+# Mini Insta profiles with more followers than this are not copied into
+# their followers' timelines; feeds read their posts directly instead
+MINI_INSTA_FANOUT_MAX_FOLLOWERS = 5_000
+
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
 MEDIA_URL= "media/"  # note: no leading slash!
 
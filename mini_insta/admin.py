@@ -10,23 +10,18 @@ from .models import Like
 #Registers model with admin
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
-    list_display = ['username', 'display_name', 'join_date']
+    list_display = ['username', 'display_name', 'join_date', 'post_count', 'follower_count', 'following_count']
     list_filter = ['join_date']
     search_fields = ['username', 'display_name']
     ordering = ['username']
-
-    def post_count(self, obj):
-        return obj.get_all_posts().count()
-    post_count.short_description = 'Posts'
-
-    def follower_count(self, obj):
-        return obj.get_num_followers()
-    follower_count.short_description = 'Followers'
+    # Maintained by counters.py; run reconcile_counters to repair them
+    readonly_fields = ['post_count', 'follower_count', 'following_count']
 
 
 @admin.register(Post)
 class PostAdmin(admin.ModelAdmin):
-    list_display = ['profile', 'caption_preview', 'timestamp', 'photo_count']
+    list_display = ['profile', 'caption_preview', 'timestamp', 'photo_count', 'like_count', 'comment_count']
+    readonly_fields = ['like_count', 'comment_count']
     list_filter = ['timestamp', 'profile']
     search_fields = ['caption', 'profile__username']
     ordering = ['-timestamp']
@@ -39,13 +34,6 @@ class PostAdmin(admin.ModelAdmin):
         return obj.get_all_photos().count()
     photo_count.short_description = 'Photos'
 
-    def comment_count(self, obj):
-        return obj.get_all_comments().count()
-    comment_count.short_description = 'Comments'
-
-    def like_count(self, obj):
-        return obj.get_likes().count()
-    like_count.short_description = 'Likes'
 
 @admin.register(Photo)
 class PhotoAdmin(admin.ModelAdmin):
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class MiniInstaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mini_insta'
+
+    def ready(self):
+        # Connect the signal handlers that keep counters, feed timelines and cached likes
+        # up to date. counters comes first so timelines see a follow already counted.
+        from . import counters, likes, timeline  # noqa: F401
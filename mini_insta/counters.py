@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Follow, Like, Post, Profile
+
+# Counter column -> (model counted, its foreign key to the counter's row), for each counted model
+COUNTERS = {
+    Profile: {
+        'follower_count': (Follow, 'profile'),
+        'following_count': (Follow, 'follower_profile'),
+        'post_count': (Post, 'profile'),
+    },
+    Post: {
+        'like_count': (Like, 'post'),
+        'comment_count': (Comment, 'post'),
+    },
+}
+
+
+def _adjust(model, pk, field, delta):
+    """
+    Add delta to one counter in the database, with an F() expression so concurrent changes are not lost.
+
+    A decrement is skipped rather than taking a drifted counter below zero,
+    which its PositiveIntegerField would reject; reconcile_counters repairs it.
+    """
+    rows = model.objects.filter(pk=pk)
+    if delta < 0:
+        rows = rows.filter(**{f'{field}__gte': -delta})
+    rows.update(**{field: F(field) + delta})
+
+
+def _counted_changes(instance, delta):
+    """Adjust every counter that counts rows like instance"""
+    for model, counters in COUNTERS.items():
+        for field, (counted, foreign_key) in counters.items():
+            if isinstance(instance, counted):
+                _adjust(model, getattr(instance, f'{foreign_key}_id'), field, delta)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Like)
+@receiver(post_save, sender=Comment)
+def counted_row_saved(sender, instance, created, raw=False, **kwargs):
+    """Count a new follow, post, like or comment"""
+    if created and not raw:
+        _counted_changes(instance, 1)
+
+
+@receiver(post_delete, sender=Follow)
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Like)
+@receiver(post_delete, sender=Comment)
+def counted_row_deleted(sender, instance, **kwargs):
+    """Uncount a deleted follow, post, like or comment"""
+    _counted_changes(instance, -1)
+
+
+def _count_subquery(counted, foreign_key):
+    """Return a subquery counting the rows of counted that point at the outer row"""
+    counts = (counted.objects.filter(**{foreign_key: OuterRef('pk')})
+              .order_by()
+              .values(foreign_key)
+              .annotate(count=Count('pk'))
+              .values('count'))
+    return Coalesce(Subquery(counts, output_field=IntegerField()), Value(0))
+
+
+def reconcile_counters(fix=True):
+    """
+    Find counter columns that disagree with a fresh COUNT, and optionally repair them.
+
+    Counters drift when rows change without signals (QuerySet.update, bulk_create
+    or raw SQL). Each model is checked with one query and repaired with one UPDATE.
+
+    Returns:
+        dict: counter name ('Profile.follower_count', ...) -> number of rows that had drifted
+    """
+    drifted = {}
+    with transaction.atomic():
+        for model, counters in COUNTERS.items():
+            actual = {f'actual_{field}': _count_subquery(*counted) for field, counted in counters.items()}
+            rows = model.objects.annotate(**actual)
+            for field in counters:
+                drifted[f'{model.__name__}.{field}'] = rows.filter(~Q(**{field: F(f'actual_{field}')})).count()
+            if fix and any(drifted[f'{model.__name__}.{field}'] for field in counters):
+                model.objects.update(**{field: _count_subquery(*counted) for field, counted in counters.items()})
+    return drifted
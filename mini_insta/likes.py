@@ -0,0 +1,75 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Like
+
+# Most recent likes of each profile kept in the cache
+RECENT_LIKES = 200
+CACHE_TIMEOUT = 60 * 60
+
+
+def _cache_key(profile_id):
+    return f"mini_insta:recent_likes:{profile_id}"
+
+
+def recent_liked_post_ids(viewer):
+    """
+    Return the ids of the posts a profile liked most recently, from the cache when possible.
+
+    Returns:
+        tuple: (set of post ids, True if they are all of the profile's likes)
+    """
+    key = _cache_key(viewer.pk)
+    recent = cache.get(key)
+    if recent is None:
+        # One extra row tells us whether the profile has liked more than we keep
+        ids = list(Like.objects.filter(profile=viewer)
+                   .order_by('-timestamp', '-pk')
+                   .values_list('post_id', flat=True)[:RECENT_LIKES + 1])
+        recent = {'ids': ids[:RECENT_LIKES], 'complete': len(ids) <= RECENT_LIKES}
+        cache.set(key, recent, CACHE_TIMEOUT)
+    return set(recent['ids']), recent['complete']
+
+
+def liked_post_ids(viewer, post_ids):
+    """
+    Find which of a page's posts a profile has liked.
+
+    Posts among the profile's cached recent likes are answered without a
+    query; the rest are checked together in one indexed query, which is
+    skipped entirely when the cache holds all of the profile's likes.
+
+    Parameters:
+        viewer --> Profile, or None for an anonymous visitor
+        post_ids --> ids of the posts on the page
+
+    Returns:
+        set: the ids in post_ids that viewer likes
+    """
+    post_ids = set(post_ids)
+    if viewer is None or not post_ids:
+        return set()
+    recent, complete = recent_liked_post_ids(viewer)
+    liked = post_ids & recent
+    unknown = post_ids - recent
+    if unknown and not complete:
+        liked.update(Like.objects.filter(profile=viewer, post_id__in=unknown).values_list('post_id', flat=True))
+    return liked
+
+
+def mark_liked(posts, viewer):
+    """Set viewer_has_liked on each of a list of Posts with one batched lookup, and return the list"""
+    liked = liked_post_ids(viewer, [post.pk for post in posts])
+    for post in posts:
+        post.viewer_has_liked = post.pk in liked
+    return posts
+
+
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def like_changed(sender, instance, **kwargs):
+    """Forget the profile's cached recent likes once the change is committed"""
+    key = _cache_key(instance.profile_id)
+    transaction.on_commit(lambda: cache.delete(key))
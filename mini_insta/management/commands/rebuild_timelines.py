@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from mini_insta.models import Profile
+from mini_insta.timeline import fan_out_limit, rebuild_timelines
+
+
+class Command(BaseCommand):
+    """
+    Rewrite every feed timeline from the Follow and Post tables.
+
+    Run after changing MINI_INSTA_FANOUT_MAX_FOLLOWERS, or if timelines drift
+    from the follow graph (for example after editing rows outside Django).
+
+    Usage: python manage.py rebuild_timelines
+    """
+    help = 'Rebuild the fan-out-on-write feed timelines of all Mini Insta profiles.'
+
+    def handle(self, *args, **options):
+        entries = rebuild_timelines()
+        on_read = Profile.objects.filter(fan_out_on_read=True).count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {entries} timeline entries; {on_read} profile(s) with over "
+            f"{fan_out_limit()} followers are read on demand"))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from mini_insta.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    """
+    Repair the denormalised follower, following, post, like and comment counters.
+
+    The counters are adjusted as rows are created and deleted; rows changed
+    without model signals (QuerySet.update, bulk_create, raw SQL) make them
+    drift. With --check the drift is reported but not repaired.
+
+    Usage: python manage.py reconcile_counters [--check]
+    """
+    help = 'Recount the Mini Insta profile and post counters and repair any that have drifted.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Report drifted counters without repairing them')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters(fix=not options['check'])
+        for counter, rows in drifted.items():
+            self.stdout.write(f"  {counter:<24} {rows} row{'s' if rows != 1 else ''} drifted")
+        total = sum(drifted.values())
+        if not total:
+            self.stdout.write(self.style.SUCCESS('All counters are correct.'))
+        elif options['check']:
+            self.stdout.write(self.style.WARNING(f'{total} counters have drifted; run without --check to repair them.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {total} counters.'))
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:43
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_rows(apps, schema_editor):
+    """Fill the new counters from the existing follows, posts, likes and comments"""
+    Profile = apps.get_model('mini_insta', 'Profile')
+    Post = apps.get_model('mini_insta', 'Post')
+
+    def count(model_name, foreign_key):
+        rows = (apps.get_model('mini_insta', model_name).objects.filter(**{foreign_key: OuterRef('pk')})
+                .order_by().values(foreign_key).annotate(count=Count('pk')).values('count'))
+        return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+    Profile.objects.update(follower_count=count('Follow', 'profile'),
+                           following_count=count('Follow', 'follower_profile'),
+                           post_count=count('Post', 'profile'))
+    Post.objects.update(like_count=count('Like', 'post'), comment_count=count('Comment', 'post'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mini_insta', '0007_cursor_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(count_existing_rows, migrations.RunPython.noop),
+    ]
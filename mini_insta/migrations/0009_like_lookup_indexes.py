@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mini_insta', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['profile', '-timestamp', '-id'], name='mini_insta_recent_likes'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['profile', 'post'], name='mini_insta_liked_posts'),
+        ),
+    ]
@@ -2,6 +2,8 @@ from django.db import models
 from django.utils import timezone
 from django.urls import reverse
 from django.contrib.auth.models import User
+from django.db.models import Prefetch, Q
+from .pagination import before
 # Create your models here.
 
 # Display for profile page
@@ -12,13 +14,20 @@ class Profile(models.Model):
     profile_image_url = models.URLField(max_length=200)
     bio_text = models.TextField(max_length=500)
     join_date = models.DateTimeField(default=timezone.now)
+    # Set once the profile has too many followers to copy its posts into every
+    # follower's timeline; feeds then read its posts directly (see timeline.py)
+    fan_out_on_read = models.BooleanField(default=False)
+    # Denormalised counts, kept up to date by counters.py and repaired by reconcile_counters
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    post_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
         return f"{self.username} ({self.display_name})"
 
-    def get_all_posts(self):
-        """Return all Posts for this Profile, ordered by timestamp (newest first)"""
-        return Post.objects.filter(profile=self).order_by('-timestamp')
+    def get_all_posts(self, older_than=None):
+        """Return all Posts for this Profile, ordered by timestamp (newest first), or only those older than a (timestamp, id) cursor key"""
+        return Post.objects.filter(before(older_than), profile=self).order_by('-timestamp', '-pk')
 
     def get_absolute_url(self):
         """Return the URL to display this Profile"""
@@ -33,7 +42,7 @@ class Profile(models.Model):
     
     def get_num_followers(self):
         """Return the count of followers"""
-        return Follow.objects.filter(profile=self).count()
+        return self.follower_count
     
     def get_following(self):
         """Return a list of Profiles that this profile follows"""
@@ -44,24 +53,70 @@ class Profile(models.Model):
     
     def get_num_following(self):
         """Return the count of profiles being followed"""
-        return Follow.objects.filter(follower_profile=self).count()
-
-    def get_post_feed(self):
-        """Return all Posts from profiles that this profile follows, ordered by timestamp"""
-        following = self.get_following()
+        return self.following_count
+
+    def get_post_feed(self, older_than=None):
+        """Return all Posts from profiles that this profile follows, ordered by timestamp, or only those older than a (timestamp, id) cursor key"""
+        celebrities = Profile.objects.filter(followers__follower_profile=self, fan_out_on_read=True)
+        if not celebrities.exists():
+            # Every followed post is in this profile's timeline: one range scan of its index.
+            # The conditions share one filter() call so they apply to the same timeline row.
+            return Post.objects.filter(
+                before(older_than, 'timeline_entries__timestamp', 'timeline_entries__post_id'),
+                timeline_entries__owner=self,
+            ).order_by('-timeline_entries__timestamp', '-timeline_entries__post_id')
         
-        """Get all posts from those profiles, ordered by most recent first"""
-        posts = Post.objects.filter(profile__in=following).order_by('-timestamp')
+        # Merge the timeline with the posts of followed profiles that are not fanned out
+        timeline = TimelineEntry.objects.filter(owner=self).values('post')
+        posts = (Post.objects.filter(Q(pk__in=timeline) | Q(profile__in=celebrities))
+                 .filter(before(older_than))
+                 .order_by('-timestamp', '-pk'))
         
         return posts
     
     class Meta:
         ordering = ['username']
 
+class PostQuerySet(models.QuerySet):
+    """QuerySet of Posts with helpers for pages that list many posts"""
+
+    def with_first_photo(self):
+        """Prefetch each Post's earliest Photo into first_photos, in one windowed query for all the posts"""
+        return self.prefetch_related(
+            Prefetch('photos', queryset=Photo.objects.order_by('timestamp', 'pk')[:1], to_attr='first_photos'))
+
+    def with_feed_details(self):
+        """
+        Load everything a feed card shows in a fixed number of queries, however many posts there are.
+
+        Adds to each Post:
+            first_photos --> list holding the earliest Photo, if any
+            first_likes --> list holding the earliest Like, with its Profile
+            latest_comments --> list of the two newest Comments, with their Profiles
+        
+        Like and comment counts are the Post's own like_count and comment_count columns;
+        whether the viewer likes each post comes from likes.mark_liked.
+        """
+        return (self.select_related('profile')
+                .with_first_photo()
+                .prefetch_related(
+                    # Sliced prefetches run as one windowed query over all the posts
+                    Prefetch('likes', queryset=Like.objects.select_related('profile').order_by('timestamp', 'pk')[:1],
+                             to_attr='first_likes'),
+                    Prefetch('comments', queryset=Comment.objects.select_related('profile').order_by('-timestamp', '-pk')[:2],
+                             to_attr='latest_comments'),
+                ))
+
+
 class Post(models.Model):
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='posts')
     caption = models.TextField(max_length=2000, blank=True)
     timestamp = models.DateTimeField(default=timezone.now)
+    # Denormalised counts, kept up to date by counters.py and repaired by reconcile_counters
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    
+    objects = PostQuerySet.as_manager()
     
     def __str__(self):
         return f"Post by {self.profile.username} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -85,6 +140,7 @@ class Post(models.Model):
     
     class Meta:
         ordering = ['-timestamp']  # Most recent first
+        indexes = [models.Index(fields=['profile', '-timestamp', '-id'], name='mini_insta_post_profile_grid')]
 
 
 class Photo(models.Model):
@@ -129,6 +185,11 @@ class Follow(models.Model):
     
     class Meta:
         unique_together = ('profile', 'follower_profile')  # Prevent duplicate follows
+        # Newest-first followers and following pages
+        indexes = [
+            models.Index(fields=['profile', '-timestamp', '-id'], name='mini_insta_followers_page'),
+            models.Index(fields=['follower_profile', '-timestamp', '-id'], name='mini_insta_following_page'),
+        ]
 
 
 class Comment(models.Model):
@@ -155,4 +216,28 @@ class Like(models.Model):
         return f"{self.profile.username} likes post {self.post.pk}"
     
     class Meta:
-        unique_together = ('post', 'profile')  # One like per user per post
\ No newline at end of file
+        unique_together = ('post', 'profile')  # One like per user per post
+        # A profile's likes, newest first (for its cached recent likes) and by post (for batched lookups)
+        indexes = [
+            models.Index(fields=['profile', '-timestamp', '-id'], name='mini_insta_recent_likes'),
+            models.Index(fields=['profile', 'post'], name='mini_insta_liked_posts'),
+        ]
+
+
+class TimelineEntry(models.Model):
+    """
+    Represents a post in a follower's feed, written when the post is created (fan-out on write).
+
+    The timestamp is copied from the post so a feed is one scan of the
+    (owner, timestamp, post) index.
+    """
+    owner = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    timestamp = models.DateTimeField()
+    
+    def __str__(self):
+        return f"Post {self.post_id} in the feed of profile {self.owner_id}"
+    
+    class Meta:
+        unique_together = ('owner', 'post')
+        indexes = [models.Index(fields=['owner', '-timestamp', '-post'], name='mini_insta_timeline_feed')]
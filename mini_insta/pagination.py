@@ -0,0 +1,63 @@
+from datetime import datetime
+
+from django.core import signing
+from django.db.models import Q
+
+CURSOR_SALT = 'mini_insta.cursor'
+
+
+def encode_cursor(key):
+    """Build an opaque, tamper-proof cursor token from a (timestamp, id) key"""
+    timestamp, pk = key
+    return signing.dumps([timestamp.isoformat(), pk], salt=CURSOR_SALT)
+
+
+def decode_cursor(token):
+    """
+    Read a cursor token built by encode_cursor.
+
+    Returns:
+        tuple or None: (timestamp, id) to continue after, or None if the token is invalid
+    """
+    try:
+        timestamp, pk = signing.loads(token, salt=CURSOR_SALT)
+        return (datetime.fromisoformat(timestamp), int(pk))
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+
+def before(key, timestamp_field='timestamp', id_field='pk'):
+    """
+    Return a filter for the rows strictly older than a (timestamp, id) key, or an empty filter for no key.
+
+    The leading timestamp range is redundant with the OR but lets the
+    database seek straight into a (timestamp, id) index.
+    """
+    if key is None:
+        return Q()
+    timestamp, pk = key
+    return Q(**{f'{timestamp_field}__lte': timestamp}) & (
+        Q(**{f'{timestamp_field}__lt': timestamp}) | Q(**{timestamp_field: timestamp, f'{id_field}__lt': pk}))
+
+
+class CursorPage:
+    """
+    One page of a newest-first list, fetched by seeking from a cursor instead of an OFFSET.
+
+    The queryset must already be ordered newest first and restricted with
+    before(); the page costs the same however far down the list it is.
+    """
+
+    def __init__(self, queryset, page_size, key=lambda obj: (obj.timestamp, obj.pk)):
+        # One extra row tells us whether there is another page
+        rows = list(queryset[:page_size + 1])
+        self.has_next = len(rows) > page_size
+        self.object_list = rows[:page_size]
+        self.key = key
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def next_cursor(self):
+        """Return the token for the following page, or None on the last page"""
+        return encode_cursor(self.key(self.object_list[-1])) if self.has_next else None
@@ -1,3 +1,345 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import likes
+from .counters import reconcile_counters
+from .pagination import decode_cursor, encode_cursor
+from .timeline import rebuild_timelines
+from .models import Comment, Follow, Like, Photo, Post, Profile, TimelineEntry
+
+# Keeps the likes cached by one test out of the next
+LOCAL_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'mini_insta-tests'}}
+
+
+def make_profile(username):
+    """Create a User and its Profile"""
+    user = User.objects.create(username=username)
+    return Profile.objects.create(user=user, username=username, display_name=username.title(),
+                                  profile_image_url='https://example.com/image.jpg', bio_text='')
+
+
+class CounterTests(TestCase):
+    """The counter columns follow every change to the rows they count"""
+
+    def setUp(self):
+        self.alice = make_profile('alice')
+        self.bob = make_profile('bob')
+        self.post = Post.objects.create(profile=self.alice, caption='Hello')
+
+    def assertCountersMatch(self):
+        """Fail if any counter column disagrees with a fresh COUNT"""
+        self.assertEqual(set(reconcile_counters(fix=False).values()), {0})
+
+    def test_like_and_unlike(self):
+        like = Like.objects.create(post=self.post, profile=self.bob)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertCountersMatch()
+
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertCountersMatch()
+
+    def test_follow_and_unfollow(self):
+        Follow.objects.create(profile=self.alice, follower_profile=self.bob)
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.follower_count, self.bob.following_count), (1, 1))
+        self.assertCountersMatch()
+
+        Follow.objects.filter(profile=self.alice, follower_profile=self.bob).delete()
+        self.alice.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.alice.follower_count, self.bob.following_count), (0, 0))
+        self.assertCountersMatch()
+
+    def test_cascade_deletes(self):
+        Follow.objects.create(profile=self.alice, follower_profile=self.bob)
+        Follow.objects.create(profile=self.bob, follower_profile=self.alice)
+        Like.objects.create(post=self.post, profile=self.bob)
+        Comment.objects.create(post=self.post, profile=self.bob, text='Hi')
+        bob_post = Post.objects.create(profile=self.bob)
+        Like.objects.create(post=bob_post, profile=self.alice)
+        self.assertCountersMatch()
+
+        # Deleting a post deletes its likes and comments
+        self.post.delete()
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.post_count, 0)
+        self.assertCountersMatch()
+
+        # Deleting a profile deletes its follows, posts and likes
+        self.bob.delete()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.alice.follower_count, self.alice.following_count), (0, 0))
+        self.assertCountersMatch()
+
+    def test_decrement_at_zero_is_skipped(self):
+        like = Like.objects.create(post=self.post, profile=self.bob)
+        # Drift the counter as a QuerySet.update would, without signals
+        Post.objects.filter(pk=self.post.pk).update(like_count=0)
+
+        like.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertCountersMatch()
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.bulk_create([Like(post=self.post, profile=self.bob)])
+        self.assertEqual(reconcile_counters(fix=True)['Post.like_count'], 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertCountersMatch()
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class DriftedCounterPageTests(TestCase):
+    """Pages still render when a post's like_count says it has likes but no Like rows exist"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_profile('viewer')
+        author = make_profile('author')
+        Follow.objects.create(profile=author, follower_profile=self.viewer)
+        self.post = Post.objects.create(profile=author, caption='Drifted')
+        Post.objects.filter(pk=self.post.pk).update(like_count=3)
+        self.client.force_login(self.viewer.user)
+
+    def test_pages_render_without_a_liker(self):
+        for url in [reverse('show_feed'), reverse('show_post', kwargs={'pk': self.post.pk}),
+                    reverse('search') + '?query=Drifted']:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotContains(response, 'Liked by')
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class FeedQueryTests(TestCase):
+    """A feed page costs the same number of queries however many posts it shows"""
+
+    # Session, user, viewer's profile, fanned-out-on-read check, posts, first
+    # photos, first likes, latest comments and the viewer's recent likes
+    FEED_QUERIES = 9
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_profile('viewer')
+        self.authors = [make_profile(f'author{number}') for number in range(3)]
+        for author in self.authors:
+            Follow.objects.create(profile=author, follower_profile=self.viewer)
+        self.client.force_login(self.viewer.user)
+
+    def add_posts(self, count):
+        for number in range(count):
+            post = Post.objects.create(profile=self.authors[number % 3], caption=f'Post {number}')
+            Photo.objects.create(post=post, image_url='https://example.com/photo.jpg')
+            Like.objects.create(post=post, profile=self.authors[(number + 1) % 3])
+            Like.objects.create(post=post, profile=self.viewer)
+            Comment.objects.create(post=post, profile=self.authors[(number + 2) % 3], text='Nice')
+
+    def get_feed(self, url):
+        cache.clear()
+        with self.assertNumQueries(self.FEED_QUERIES):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_feed_queries_do_not_grow_with_posts(self):
+        self.add_posts(2)
+        self.assertEqual(len(self.get_feed(reverse('show_feed')).context['posts']), 2)
+        self.add_posts(10)
+        self.assertEqual(len(self.get_feed(reverse('show_feed')).context['posts']), 10)
+
+    def test_next_page_queries_do_not_grow_with_posts(self):
+        self.add_posts(15)
+        page = self.client.get(reverse('show_feed_page')).json()
+        self.assertIsNotNone(page['next'])
+        self.get_feed(page['next'])
+
+
+class TimelineTests(TestCase):
+    """Timelines hold the posts of followed profiles, and feeds merge in profiles fanned out on read"""
+
+    def setUp(self):
+        self.viewer = make_profile('viewer')
+        self.friend = make_profile('friend')
+        self.celebrity = make_profile('celebrity')
+        self.fan = make_profile('fan')
+        self.start = timezone.now() - timedelta(days=1)
+
+    def post(self, profile, minutes):
+        return Post.objects.create(profile=profile, timestamp=self.start + timedelta(minutes=minutes))
+
+    def timeline(self, profile):
+        return set(TimelineEntry.objects.filter(owner=profile).values_list('post_id', flat=True))
+
+    def test_posts_fan_out_to_followers(self):
+        Follow.objects.create(profile=self.friend, follower_profile=self.viewer)
+        post = self.post(self.friend, 1)
+        self.assertEqual(self.timeline(self.viewer), {post.pk})
+        self.assertEqual(self.timeline(self.fan), set())
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [self.post(self.friend, minutes) for minutes in range(3)]
+        follow = Follow.objects.create(profile=self.friend, follower_profile=self.viewer)
+        self.assertEqual(self.timeline(self.viewer), {post.pk for post in posts})
+        follow.delete()
+        self.assertEqual(self.timeline(self.viewer), set())
+
+    def test_edited_timestamps_are_copied(self):
+        Follow.objects.create(profile=self.friend, follower_profile=self.viewer)
+        post = self.post(self.friend, 1)
+        post.timestamp = self.start + timedelta(minutes=5)
+        post.save()
+        self.assertEqual(TimelineEntry.objects.get(owner=self.viewer).timestamp, post.timestamp)
+
+    @override_settings(MINI_INSTA_FANOUT_MAX_FOLLOWERS=1)
+    def test_fan_out_on_read_merges_in_order(self):
+        Follow.objects.create(profile=self.friend, follower_profile=self.viewer)
+        Follow.objects.create(profile=self.celebrity, follower_profile=self.viewer)
+        # Copied into the viewer's timeline while the celebrity had one follower
+        early = self.post(self.celebrity, 0)
+        Follow.objects.create(profile=self.celebrity, follower_profile=self.fan)
+        # Equal timestamps must still come out in one consistent order
+        posts = [early, self.post(self.friend, 1), self.post(self.celebrity, 2),
+                 self.post(self.friend, 3), self.post(self.celebrity, 3)]
+
+        self.celebrity.refresh_from_db()
+        self.assertTrue(self.celebrity.fan_out_on_read)
+        self.assertEqual(self.timeline(self.viewer), {posts[0].pk, posts[1].pk, posts[3].pk})
+
+        expected = sorted(posts, key=lambda post: (post.timestamp, post.pk), reverse=True)
+        self.assertEqual(list(self.viewer.get_post_feed()), expected)
+
+    @override_settings(MINI_INSTA_FANOUT_MAX_FOLLOWERS=1)
+    def test_rebuild_matches_incremental_timelines(self):
+        Follow.objects.create(profile=self.friend, follower_profile=self.viewer)
+        Follow.objects.create(profile=self.celebrity, follower_profile=self.viewer)
+        Follow.objects.create(profile=self.celebrity, follower_profile=self.fan)
+        for minutes in range(4):
+            self.post(self.friend, minutes)
+            self.post(self.celebrity, minutes)
+        feed = list(self.viewer.get_post_feed())
+
+        rebuild_timelines()
+        self.assertEqual(list(self.viewer.get_post_feed()), feed)
+        self.assertEqual(len(feed), 8)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class CursorPaginationTests(TestCase):
+    """Following cursors from the first page visits every row once, in order, even when timestamps tie"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_profile('viewer')
+        self.author = make_profile('author')
+        Follow.objects.create(profile=self.author, follower_profile=self.viewer)
+        # Groups of three posts share a timestamp, so the id breaks ties
+        start = timezone.now() - timedelta(days=1)
+        self.posts = [Post.objects.create(profile=self.author, timestamp=start + timedelta(minutes=number // 3))
+                      for number in range(32)]
+        self.newest_first = sorted(self.posts, key=lambda post: (post.timestamp, post.pk), reverse=True)
+
+    def walk(self, url, context_name):
+        """Follow next_cursor from the first page, returning the items of each page"""
+        pages = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            self.assertEqual(response.status_code, 200)
+            pages.append(list(response.context[context_name]))
+            cursor = response.context['next_cursor']
+            if cursor is None:
+                return pages
+
+    def test_cursor_round_trip(self):
+        key = (self.posts[0].timestamp, self.posts[0].pk)
+        self.assertEqual(decode_cursor(encode_cursor(key)), key)
+
+    def test_invalid_cursors_are_ignored(self):
+        token = encode_cursor((self.posts[0].timestamp, self.posts[0].pk))
+        self.assertIsNone(decode_cursor(token[:-1] + ('A' if token[-1] != 'A' else 'B')))
+        self.assertIsNone(decode_cursor('not a cursor'))
+        response = self.client.get(reverse('show_profile', kwargs={'pk': self.author.pk}), {'cursor': 'junk'})
+        self.assertEqual(list(response.context['posts']), self.newest_first[:12])
+
+    def test_feed_pages(self):
+        self.client.force_login(self.viewer.user)
+        pages = self.walk(reverse('show_feed'), 'posts')
+        self.assertEqual([len(page) for page in pages], [10, 10, 10, 2])
+        self.assertEqual([post for page in pages for post in page], self.newest_first)
+
+    def test_profile_grid_pages(self):
+        pages = self.walk(reverse('show_profile', kwargs={'pk': self.author.pk}), 'posts')
+        self.assertEqual([len(page) for page in pages], [12, 12, 8])
+        self.assertEqual([post for page in pages for post in page], self.newest_first)
+
+    def test_follower_pages(self):
+        followed = make_profile('followed')
+        now = timezone.now()
+        followers = [make_profile(f'follower{number}') for number in range(30)]
+        for follower in followers:
+            Follow.objects.create(profile=followed, follower_profile=follower, timestamp=now)
+        pages = self.walk(reverse('show_followers', kwargs={'pk': followed.pk}), 'profiles')
+        self.assertEqual([len(page) for page in pages], [25, 5])
+        self.assertEqual([profile for page in pages for profile in page], followers[::-1])
+
+    def test_json_pages_continue_the_html_page(self):
+        url = reverse('show_profile', kwargs={'pk': self.author.pk})
+        first = self.client.get(url)
+        page = self.client.get(first.context['next_page_url']).json()
+        second = self.client.get(url, {'cursor': first.context['next_cursor']})
+        self.assertEqual(page['cursor'], second.context['next_cursor'])
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class LikedLookupTests(TestCase):
+    """Whether the viewer likes each post on a page is found with at most one query"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = make_profile('viewer')
+        author = make_profile('author')
+        self.posts = [Post.objects.create(profile=author) for _ in range(6)]
+        for post in self.posts[:3]:
+            Like.objects.create(post=post, profile=self.viewer)
+
+    def liked(self):
+        return [post.viewer_has_liked for post in likes.mark_liked(self.posts, self.viewer)]
+
+    def test_page_is_marked_with_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.liked(), [True] * 3 + [False] * 3)
+        # The profile's recent likes are now cached
+        with self.assertNumQueries(0):
+            self.assertEqual(self.liked(), [True] * 3 + [False] * 3)
+
+    def test_likes_beyond_the_cached_ones_are_checked_together(self):
+        with mock.patch.object(likes, 'RECENT_LIKES', 2):
+            with self.assertNumQueries(2):
+                self.assertEqual(self.liked(), [True] * 3 + [False] * 3)
+            with self.assertNumQueries(1):
+                self.assertEqual(self.liked(), [True] * 3 + [False] * 3)
+
+    def test_anonymous_viewer(self):
+        with self.assertNumQueries(0):
+            posts = likes.mark_liked(self.posts, None)
+        self.assertFalse(any(post.viewer_has_liked for post in posts))
+
+    def test_liking_and_unliking_refresh_the_cache(self):
+        self.liked()
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(post=self.posts[5], profile=self.viewer)
+        self.assertEqual(self.liked(), [True] * 3 + [False, False, True])
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.filter(post=self.posts[0], profile=self.viewer).delete()
+        self.assertEqual(self.liked(), [False] + [True] * 2 + [False, False, True])
@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Follow, Post, Profile, TimelineEntry
+
+# Rows written per INSERT when copying posts into timelines
+BATCH_SIZE = 1000
+
+
+def fan_out_limit():
+    """Return the follower count above which a profile's posts are read on demand instead of copied"""
+    return settings.MINI_INSTA_FANOUT_MAX_FOLLOWERS
+
+
+def _insert(entries):
+    """Write TimelineEntry rows in batches, skipping any that already exist"""
+    TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def update_fan_out_mode(profile):
+    """
+    Switch a profile to fan-out on read once its follower count passes the limit.
+
+    The switch is one-way: its posts stay out of new timelines until
+    rebuild_timelines recomputes it. Existing timeline entries are kept, and
+    feeds merging them with the on-read posts do not show duplicates.
+
+    Returns:
+        bool: True if the profile's posts are read on demand
+    """
+    if not profile.fan_out_on_read:
+        # Test the stored follower_count in the database, as the instance's copy may be stale
+        switched = Profile.objects.filter(pk=profile.pk, follower_count__gt=fan_out_limit()).update(
+            fan_out_on_read=True)
+        profile.fan_out_on_read = bool(switched)
+    return profile.fan_out_on_read
+
+
+def fan_out_post(post):
+    """Copy a post into the timeline of every follower of its author, unless the author is fanned out on read"""
+    if update_fan_out_mode(post.profile):
+        return
+    followers = Follow.objects.filter(profile=post.profile_id).values_list('follower_profile', flat=True)
+    _insert(TimelineEntry(owner_id=follower, post=post, timestamp=post.timestamp)
+            for follower in followers.iterator(chunk_size=BATCH_SIZE))
+
+
+def backfill_timeline(follower, profile):
+    """Copy the existing posts of a newly followed profile into the follower's timeline"""
+    if update_fan_out_mode(profile):
+        return
+    posts = Post.objects.filter(profile=profile).values_list('pk', 'timestamp')
+    _insert(TimelineEntry(owner=follower, post_id=pk, timestamp=timestamp)
+            for pk, timestamp in posts.iterator(chunk_size=BATCH_SIZE))
+
+
+def prune_timeline(follower, profile):
+    """Remove an unfollowed profile's posts from the follower's timeline"""
+    TimelineEntry.objects.filter(owner=follower, post__profile=profile).delete()
+
+
+def rebuild_timelines():
+    """
+    Recompute every profile's fan-out mode and rewrite all timelines from the Follow and Post tables.
+
+    Returns:
+        int: number of timeline entries written
+    """
+    with transaction.atomic():
+        TimelineEntry.objects.all().delete()
+        Profile.objects.update(fan_out_on_read=False)
+        for profile in Profile.objects.all():
+            update_fan_out_mode(profile)
+        for follow in Follow.objects.select_related('follower_profile', 'profile'):
+            backfill_timeline(follow.follower_profile, follow.profile)
+    return TimelineEntry.objects.count()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    """Fan a new post out to followers, and keep copied timestamps in step when a post is edited"""
+    if raw:
+        return
+    if created:
+        fan_out_post(instance)
+    else:
+        TimelineEntry.objects.filter(post=instance).exclude(timestamp=instance.timestamp).update(
+            timestamp=instance.timestamp)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    """Backfill the follower's timeline when a follow is created"""
+    if created and not raw:
+        backfill_timeline(instance.follower_profile, instance.profile)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    """Prune the follower's timeline when a follow is removed"""
+    prune_timeline(instance.follower_profile_id, instance.profile_id)
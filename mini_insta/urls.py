@@ -7,15 +7,19 @@ urlpatterns = [
     # Public URLs (no login required)
     path('', views.ProfileListView.as_view(), name='show_all_profiles'),
     path('profile/<int:pk>', views.ProfileDetailView.as_view(), name='show_profile'),
+    path('profile/<int:pk>/posts.json', views.ProfileDetailView.as_view(as_json=True), name='show_profile_posts'),
     path('post/<int:pk>', views.PostDetailView.as_view(), name='show_post'),
     path('profile/<int:pk>/followers', views.ShowFollowersDetailView.as_view(), name='show_followers'),
     path('profile/<int:pk>/following', views.ShowFollowingDetailView.as_view(), name='show_following'),
+    path('profile/<int:pk>/followers.json', views.ShowFollowersDetailView.as_view(as_json=True), name='show_followers_page'),
+    path('profile/<int:pk>/following.json', views.ShowFollowingDetailView.as_view(as_json=True), name='show_following_page'),
     path('create_profile', views.CreateProfileView.as_view(), name='create_profile'),
 
     # Protected URLs (login required)
     path('profile/create_post', views.CreatePostView.as_view(), name='create_post'),
     path('profile/update', views.UpdateProfileView.as_view(), name='update_profile'),
     path('profile/feed', views.PostFeedListView.as_view(), name='show_feed'),
+    path('profile/feed.json', views.PostFeedListView.as_view(as_json=True), name='show_feed_page'),
     path('profile/search', views.SearchView.as_view(), name='search'),
 
     # Post operations (login required)
@@ -7,7 +7,12 @@ from .forms import CreatePostForm, UpdateProfileForm, UpdatePostForm, CreateProf
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
+from django.db import transaction
 from django.http import JsonResponse
+from django.template.loader import render_to_string
+from django.utils.http import urlencode
+from .pagination import CursorPage, before, decode_cursor
+from .likes import mark_liked
 
 # Create your views here.
 
@@ -23,6 +28,65 @@ class ProfileLoginRequiredMixin(LoginRequiredMixin):
         return Profile.objects.filter(user=self.request.user).first()
 
 
+class CursorPageMixin:
+    """
+    Show a newest-first list one page at a time, paginated by a cursor on (timestamp, id).
+    
+    Views set as_json=True in their URL pattern to return the next page as
+    JSON for infinite scroll: the rendered items and the URL of the page after.
+    """
+    page_size = 12
+    as_json = False
+    page_context_name = 'posts'
+    page_template = None  # template rendering the items of one page
+    json_url_name = None
+    
+    def get_page_queryset(self, older_than):
+        """Return the list's QuerySet, newest first, restricted to rows older than the (timestamp, id) key"""
+        raise NotImplementedError
+    
+    def get_page_items(self, page):
+        """Return the items shown for a page of the QuerySet's rows"""
+        return page.object_list
+    
+    def get_page(self):
+        """Return the CursorPage for this request's cursor (the first page without one)"""
+        if not hasattr(self, '_page'):
+            token = self.request.GET.get('cursor')
+            older_than = decode_cursor(token) if token else None
+            self._page = CursorPage(self.get_page_queryset(older_than), self.page_size)
+        return self._page
+    
+    def get_page_context(self):
+        """Return the page's items and the links to the page after it"""
+        page = self.get_page()
+        next_cursor = page.next_cursor()
+        next_page_url = None
+        if next_cursor:
+            next_page_url = f"{reverse(self.json_url_name, kwargs=self.kwargs)}?{urlencode({'cursor': next_cursor})}"
+        return {
+            self.page_context_name: self.get_page_items(page),
+            'next_cursor': next_cursor,
+            'next_page_url': next_page_url,
+        }
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(self.get_page_context())
+        return context
+    
+    def get(self, request, *args, **kwargs):
+        if not self.as_json:
+            return super().get(request, *args, **kwargs)
+        self.object = self.get_object()
+        context = {'profile': self.object, **self.get_page_context()}
+        return JsonResponse({
+            'html': render_to_string(self.page_template, context, request),
+            'cursor': context['next_cursor'],
+            'next': context['next_page_url'],
+        })
+
+
 class ProfileListView(ListView):
     """Show all profiles - NO LOGIN REQUIRED"""
     model = Profile
@@ -30,11 +94,17 @@ class ProfileListView(ListView):
     context_object_name = 'profiles'
 
 
-class ProfileDetailView(DetailView):
+class ProfileDetailView(CursorPageMixin, DetailView):
     """Show a single profile - NO LOGIN REQUIRED"""
     model = Profile
     template_name = 'mini_insta/show_profile.html'
     context_object_name = 'profile'
+    page_template = 'mini_insta/profile_post_grid.html'
+    json_url_name = 'show_profile_posts'
+    
+    def get_page_queryset(self, older_than):
+        """Return the profile's posts with their first photos"""
+        return self.object.get_all_posts(older_than).with_first_photo()
 
 
 class PostDetailView(DetailView):
@@ -42,6 +112,14 @@ class PostDetailView(DetailView):
     model = Post
     template_name = 'mini_insta/show_post.html'
     context_object_name = 'post'
+    
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # Profile of the logged-in user, if any, to choose between Like and Unlike
+        viewer = Profile.objects.filter(user=self.request.user).first() if self.request.user.is_authenticated else None
+        mark_liked([self.object], viewer)
+        context['viewer'] = viewer
+        return context
 
 
 class CreatePostView(ProfileLoginRequiredMixin, CreateView):
@@ -61,12 +139,14 @@ class CreatePostView(ProfileLoginRequiredMixin, CreateView):
     def form_valid(self, form):
         profile = self.get_profile()
         form.instance.profile = profile
-        response = super().form_valid(form)
-        
-        files = self.request.FILES.getlist('files')
-        for file in files:
-            photo = Photo(post=self.object, image_file=file)
-            photo.save()
+        # The post and its author's post_count (updated by counters.py) are saved together
+        with transaction.atomic():
+            response = super().form_valid(form)
+            
+            files = self.request.FILES.getlist('files')
+            for file in files:
+                photo = Photo(post=self.object, image_file=file)
+                photo.save()
         
         return response
     
@@ -113,6 +193,11 @@ class DeletePostView(ProfileLoginRequiredMixin, DeleteView):
         context['profile'] = self.object.profile
         return context
     
+    def form_valid(self, form):
+        # Delete the post and its likes and comments together with the counters they change
+        with transaction.atomic():
+            return super().form_valid(form)
+    
     def get_success_url(self):
         return reverse('show_profile', kwargs={'pk': self.object.profile.pk})
 
@@ -133,35 +218,67 @@ class UpdatePostView(ProfileLoginRequiredMixin, UpdateView):
         return reverse('show_post', kwargs={'pk': self.object.pk})
 
 
-class ShowFollowersDetailView(DetailView):
+class ShowFollowersDetailView(CursorPageMixin, DetailView):
     """Show followers - NO LOGIN REQUIRED"""
     model = Profile
     template_name = 'mini_insta/show_followers.html'
     context_object_name = 'profile'
+    page_size = 25
+    page_context_name = 'profiles'
+    page_template = 'mini_insta/profile_rows.html'
+    json_url_name = 'show_followers_page'
+    
+    def get_page_queryset(self, older_than):
+        """Return the Follows of this profile, newest first"""
+        return (Follow.objects.filter(before(older_than), profile=self.object)
+                .select_related('follower_profile')
+                .order_by('-timestamp', '-pk'))
+    
+    def get_page_items(self, page):
+        return [follow.follower_profile for follow in page.object_list]
 
 
-class ShowFollowingDetailView(DetailView):
+class ShowFollowingDetailView(CursorPageMixin, DetailView):
     """Show following - NO LOGIN REQUIRED"""
     model = Profile
     template_name = 'mini_insta/show_following.html'
     context_object_name = 'profile'
+    page_size = 25
+    page_context_name = 'profiles'
+    page_template = 'mini_insta/profile_rows.html'
+    json_url_name = 'show_following_page'
+    
+    def get_page_queryset(self, older_than):
+        """Return the Follows made by this profile, newest first"""
+        return (Follow.objects.filter(before(older_than), follower_profile=self.object)
+                .select_related('profile')
+                .order_by('-timestamp', '-pk'))
+    
+    def get_page_items(self, page):
+        return [follow.profile for follow in page.object_list]
 
 
-class PostFeedListView(ProfileLoginRequiredMixin, DetailView):
+class PostFeedListView(ProfileLoginRequiredMixin, CursorPageMixin, DetailView):
     """Show the post feed - LOGIN REQUIRED"""
     model = Profile
     template_name = 'mini_insta/show_feed.html'
-    
+    page_size = 10
+    page_template = 'mini_insta/feed_posts.html'
+    json_url_name = 'show_feed_page'
     
     def get_object(self):
         """Get the Profile of the logged-in user"""
         return self.get_profile()
     
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        profile = self.get_profile()
-        context['posts'] = profile.get_post_feed()
-        return context
+    def get_page_queryset(self, older_than):
+        """Return the feed's posts older than the cursor"""
+        # Authors, first photo, first liker and latest comments all come from
+        # a fixed set of queries instead of several per post
+        return self.object.get_post_feed(older_than).with_feed_details()
+    
+    def get_page_items(self, page):
+        """Mark the posts the viewer likes, with one lookup for the whole page"""
+        return mark_liked(page.object_list, self.object)
 
 
 class SearchView(ProfileLoginRequiredMixin, ListView):
@@ -186,7 +303,7 @@ class SearchView(ProfileLoginRequiredMixin, ListView):
     def get_queryset(self):
         query = self.request.GET.get('query', '')
         if query:
-            return Post.objects.filter(caption__icontains=query).order_by('-timestamp')
+            return Post.objects.filter(caption__icontains=query).order_by('-timestamp').with_feed_details()
         else:
             return Post.objects.none()
     
@@ -201,7 +318,7 @@ class SearchView(ProfileLoginRequiredMixin, ListView):
         
         query = self.request.GET.get('query', '')
         context['query'] = query
-        context['posts'] = self.get_queryset()
+        context['posts'] = self.object_list
         
         if query:
             context['profiles'] = Profile.objects.filter(
@@ -268,11 +385,12 @@ class FollowProfileView(ProfileLoginRequiredMixin, TemplateView):
         if current_user_profile == profile_to_follow:
             return redirect('show_profile', pk=profile_to_follow.pk)
         
-        # Create follow relationship
-        follow, created = Follow.objects.get_or_create(
-            profile=profile_to_follow,
-            follower_profile=current_user_profile
-        )
+        # Create follow relationship; both profiles' counters change in the same transaction
+        with transaction.atomic():
+            follow, created = Follow.objects.get_or_create(
+                profile=profile_to_follow,
+                follower_profile=current_user_profile
+            )
         
         # Redirect back to the profile page
         return redirect('show_profile', pk=profile_to_follow.pk)
@@ -290,11 +408,12 @@ class UnfollowProfileView(ProfileLoginRequiredMixin, TemplateView):
         if current_user_profile == profile_to_unfollow:
             return redirect('show_profile', pk=profile_to_unfollow.pk)
         
-        # Delete follow relationship
-        Follow.objects.filter(
-            profile=profile_to_unfollow,
-            follower_profile=current_user_profile
-        ).delete()
+        # Delete follow relationship; both profiles' counters change in the same transaction
+        with transaction.atomic():
+            Follow.objects.filter(
+                profile=profile_to_unfollow,
+                follower_profile=current_user_profile
+            ).delete()
         
         # Redirect back to the profile page
         return redirect('show_profile', pk=profile_to_unfollow.pk)
@@ -312,11 +431,12 @@ class LikePostView(ProfileLoginRequiredMixin, TemplateView):
         if current_user_profile == post.profile:
             return redirect('show_post', pk=post.pk)
         
-        # Create like relationship
-        like, created = Like.objects.get_or_create(
-            post=post,
-            profile=current_user_profile
-        )
+        # Create like relationship; the post's like_count changes in the same transaction
+        with transaction.atomic():
+            like, created = Like.objects.get_or_create(
+                post=post,
+                profile=current_user_profile
+            )
         
         # Redirect back to the post page
         return redirect('show_post', pk=post.pk)
@@ -334,11 +454,12 @@ class UnlikePostView(ProfileLoginRequiredMixin, TemplateView):
         if current_user_profile == post.profile:
             return redirect('show_post', pk=post.pk)
         
-        # Delete like relationship
-        Like.objects.filter(
-            post=post,
-            profile=current_user_profile
-        ).delete()
+        # Delete like relationship; the post's like_count changes in the same transaction
+        with transaction.atomic():
+            Like.objects.filter(
+                post=post,
+                profile=current_user_profile
+            ).delete()
         
         # Redirect back to the post page
         return redirect('show_post', pk=post.pk)
@@ -369,8 +490,9 @@ class CreateCommentView(ProfileLoginRequiredMixin, CreateView):
         form.instance.post = post
         form.instance.profile = profile
         
-        # Save the comment
-        form.save()
+        # Save the comment and the post's comment_count together
+        with transaction.atomic():
+            form.save()
         
         # Redirect back to the post page
         return redirect('show_post', pk=post.pk)
\ No newline at end of file
@@ -0,0 +1,47 @@
+# File: voter_analytics/aggregates.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Grouped aggregate queries that compute the voter graph data inside the database
+
+from django.db.models import Count, Q
+from django.db.models.functions import ExtractYear
+
+from .parsing import ELECTION_BITS, ELECTION_FIELDS
+
+
+def graph_counts(queryset):
+    """
+    Compute the counts behind the three voter graphs with grouped aggregate queries.
+
+    Only aggregate rows leave the database: one row per birth year, one row
+    per party, and a single row with the total and the per-election counts.
+
+    Parameters:
+        queryset --> filtered QuerySet of Voter objects
+
+    Returns:
+        dict --> 'total' (int), 'birth_years' (list of (year, count) sorted by year),
+                 'parties' (list of (party, count)), 'elections' (dict of field name to count)
+    """
+    queryset = queryset.order_by()
+
+    totals = queryset.aggregate(
+        total=Count('id'),
+        **{field: Count('id', filter=Q(voting_history__hasall=bit)) for field, bit in ELECTION_BITS.items()}
+    )
+
+    birth_years = (queryset.annotate(year=ExtractYear('date_of_birth'))
+                   .values('year')
+                   .annotate(count=Count('id'))
+                   .order_by('year'))
+
+    parties = (queryset.values('party_affiliation')
+               .annotate(count=Count('id'))
+               .order_by('-count', 'party_affiliation'))
+
+    return {
+        'total': totals['total'],
+        'birth_years': [(row['year'], row['count']) for row in birth_years],
+        'parties': [(row['party_affiliation'], row['count']) for row in parties],
+        'elections': {field: totals[field] for field in ELECTION_FIELDS},
+    }
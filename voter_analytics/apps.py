@@ -1,6 +1,11 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_save
 
 
 class VoterAnalyticsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'voter_analytics'
+
+    def ready(self):
+        from .versioning import voter_saved
+        post_save.connect(voter_saved, sender='voter_analytics.Voter')
@@ -0,0 +1,112 @@
+# File: voter_analytics/bitmaps.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Compressed bitmap indexes over the voter snapshot for party, score and election filters
+
+try:
+    import numpy as np
+except ImportError:  # only used together with the snapshot, which needs NumPy as well
+    np = None
+
+
+# Number of set bits in every possible byte, for counting without unpacking
+_POPCOUNT = None if np is None else np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def party_key(code):
+    return f'party:{code}'
+
+
+def score_key(score):
+    return f'score:{score}'
+
+
+class BitmapIndex:
+    """
+    A set of packed bitsets, one bit per row of the voter snapshot.
+
+    Bit i of every bitset refers to row i of the snapshot columns. Bitsets
+    are numpy uint8 arrays as produced by np.packbits, so eight voters fit
+    in a byte; on disk they are stored zlib-compressed.
+
+    Keys are an election field name (voters who voted in it), 'party:<code>'
+    for each party code, and 'score:<n>' for each voter score.
+    """
+
+    def __init__(self, bitmaps, size):
+        self.bitmaps = bitmaps
+        self.size = size
+
+    @classmethod
+    def build(cls, party, score, elections, election_bits):
+        """
+        Build the index from the snapshot columns.
+
+        Parameters:
+            party --> array of party codes
+            score --> array of voter scores
+            elections --> array of packed election flags
+            election_bits --> dict of election field name to its bit in the elections column
+
+        Returns:
+            BitmapIndex --> the new index
+        """
+        bitmaps = {}
+        for field, bit in election_bits.items():
+            bitmaps[field] = np.packbits((elections & bit) != 0)
+        for code in np.unique(party):
+            bitmaps[party_key(int(code))] = np.packbits(party == code)
+        for value in np.unique(score):
+            bitmaps[score_key(int(value))] = np.packbits(score == value)
+        return cls(bitmaps, len(party))
+
+    @classmethod
+    def load(cls, path, size):
+        """Load an index saved with save()."""
+        with np.load(path) as archive:
+            return cls({name: archive[name] for name in archive.files}, size)
+
+    def save(self, path):
+        """Write the index to a compressed .npz file."""
+        np.savez_compressed(path, **self.bitmaps)
+
+    def empty(self):
+        """Bitset with no rows set."""
+        return np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def full(self):
+        """Bitset with every row set (padding bits stay clear)."""
+        return np.packbits(np.ones(self.size, dtype=bool))
+
+    def get(self, key):
+        """Return the bitset for a key, or an empty bitset if no row has that value."""
+        bits = self.bitmaps.get(key)
+        return self.empty() if bits is None else bits
+
+    def intersect(self, bitsets):
+        """AND a list of bitsets together (every row if the list is empty)."""
+        if not bitsets:
+            return self.full()
+        result = bitsets[0].copy()
+        for bits in bitsets[1:]:
+            result &= bits
+        return result
+
+    def union(self, bitsets):
+        """OR a list of bitsets together (no rows if the list is empty)."""
+        result = self.empty()
+        for bits in bitsets:
+            result |= bits
+        return result
+
+    def count(self, bits):
+        """Number of rows set in a bitset."""
+        return int(_POPCOUNT[bits].sum(dtype=np.int64))
+
+    def to_mask(self, bits):
+        """Expand a bitset into a boolean array with one entry per row."""
+        return np.unpackbits(bits, count=self.size).view(bool)
+
+    def positions(self, bits):
+        """Row numbers set in a bitset, in ascending order."""
+        return np.flatnonzero(np.unpackbits(bits, count=self.size))
@@ -0,0 +1,113 @@
+# File: voter_analytics/charts.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Minimal Plotly figure specs for the voter graphs, drawn in the browser by plotly.js
+
+# Plotly's default colour sequence and grid style, so figures look the same
+# as ones built with plotly.graph_objects without shipping its whole template
+COLORWAY = ['#636EFA', '#EF553B', '#00CC96', '#AB63FA', '#FFA15A',
+            '#19D3F3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52']
+BAR_COLOR = '#6B7FFF'
+
+
+def _layout(title, xaxis_title=None, yaxis_title=None, plot_background=True):
+    """Build the layout shared by the voter graphs."""
+    layout = {
+        'title': {'text': title},
+        'colorway': COLORWAY,
+        'paper_bgcolor': 'white',
+        'font': {'size': 14},
+    }
+    if plot_background:
+        layout['plot_bgcolor'] = '#E8ECEF'
+        layout['xaxis'] = {'title': {'text': xaxis_title}, 'gridcolor': 'white'}
+        layout['yaxis'] = {'title': {'text': yaxis_title}, 'gridcolor': 'white'}
+    return layout
+
+
+def _error_bars(values, intervals):
+    """Build plotly.js asymmetric error bars from estimated values and their (low, high) intervals."""
+    return {
+        'type': 'data',
+        'symmetric': False,
+        'array': [high - value for value, (low, high) in zip(values, intervals)],
+        'arrayminus': [value - low for value, (low, high) in zip(values, intervals)],
+        'color': '#444',
+    }
+
+
+def graph_figures(counts):
+    """
+    Build the three voter graphs as plotly.js figure specs.
+
+    Estimated counts (from voter_analytics.sampling.approximate_graph_counts)
+    are drawn with their confidence intervals: error bars on the bar charts,
+    and the interval in the titles and the pie chart's hover text.
+
+    Parameters:
+        counts --> dict from voter_analytics.aggregates.graph_counts (or the cube/snapshot/sample equivalent)
+
+    Returns:
+        dict --> figure name -> {'data': [...], 'layout': {...}}, ready for Plotly.react
+    """
+    total = counts['total']
+    birth_years = counts['birth_years']
+    parties = counts['parties']
+    elections = counts['elections']
+    approximate = counts.get('approximate')
+
+    figures = _figures(total, birth_years, parties, elections)
+    if approximate is None:
+        return figures
+
+    low, high = approximate['total']
+    percent = round(approximate['confidence'] * 100)
+    for figure in figures.values():
+        title = figure['layout']['title']
+        title['text'] = title['text'].replace(f'(n={total})', f'(n≈{total:,}, {percent}% CI {low:,}–{high:,})')
+    figures['birth_year']['data'][0]['error_y'] = _error_bars([count for year, count in birth_years],
+                                                              approximate['birth_years'])
+    figures['election_participation']['data'][0]['error_y'] = _error_bars(
+        list(elections.values()), [approximate['elections'][field] for field in elections])
+    pie = figures['party_affiliation']['data'][0]
+    pie['customdata'] = approximate['parties']
+    pie['hovertemplate'] = (f'%{{label}}: ≈%{{value:,}} voters<br>{percent}% CI '
+                            '%{customdata[0]:,}–%{customdata[1]:,}<extra></extra>')
+    return figures
+
+
+def _figures(total, birth_years, parties, elections):
+    """Build the figure specs from (possibly estimated) counts."""
+    return {
+        # Histogram of voters by year of birth
+        'birth_year': {
+            'data': [{
+                'type': 'bar',
+                'x': [year for year, count in birth_years],
+                'y': [count for year, count in birth_years],
+                'marker': {'color': BAR_COLOR},
+            }],
+            'layout': _layout(f'Voter distribution by Year of Birth (n={total})', 'Year of Birth', 'Count'),
+        },
+        # Pie chart of voters by party affiliation
+        'party_affiliation': {
+            'data': [{
+                'type': 'pie',
+                'labels': [party for party, count in parties],
+                'values': [count for party, count in parties],
+                'textposition': 'inside',
+                'textinfo': 'percent+label',
+            }],
+            'layout': _layout(f'Voter distribution by Party Affiliation (n={total})', plot_background=False),
+        },
+        # Bar chart of voter participation by election
+        'election_participation': {
+            'data': [{
+                'type': 'bar',
+                'x': list(elections.keys()),
+                'y': list(elections.values()),
+                'marker': {'color': BAR_COLOR},
+            }],
+            'layout': _layout(f'Vote Count by Election (n={total})', 'Election', 'Number of Voters'),
+        },
+    }
@@ -0,0 +1,219 @@
+# File: voter_analytics/crosstab.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Binned counts of voters over any one or two dimensions (histograms and crosstabs), computed
+#              with vectorised grouping on the columnar snapshot or with a grouped query as a fallback
+
+from django.db.models import BooleanField, Case, Count, F, Value, When
+from django.db.models.functions import ExtractYear
+
+from .parsing import ELECTION_BITS, ELECTION_FIELDS
+from .snapshot import snapshot_supports
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it the counts come from the database
+    np = None
+
+
+# Dimension name -> label shown on chart axes
+DIMENSIONS = {
+    'birth_year': 'Year of birth',
+    'birth_decade': 'Decade of birth',
+    'registration_year': 'Year of registration',
+    'party': 'Party affiliation',
+    'score': 'Voter score',
+    'precinct': 'Precinct',
+    'zip_code': 'Zip code',
+    **{field: f'Voted in {field}' for field in ELECTION_FIELDS},
+}
+
+# Dimensions with numeric values, which can be grouped into wider bins
+NUMERIC_DIMENSIONS = {'birth_year', 'birth_decade', 'registration_year', 'score'}
+
+# Snapshot column behind each dimension that is not an election flag
+SNAPSHOT_COLUMNS = {
+    'birth_year': 'birth_year', 'birth_decade': 'birth_year', 'registration_year': 'registration_year',
+    'party': 'party', 'score': 'score', 'precinct': 'precinct', 'zip_code': 'zip_code',
+}
+
+# Snapshot attribute listing the value of each code, for coded columns
+SNAPSHOT_CODES = {'party': 'parties', 'precinct': 'precincts', 'zip_code': 'zip_codes'}
+
+
+class Dimension:
+    """
+    One axis of a crosstab: a voter attribute and, for numeric ones, a bin width.
+
+    Bins are labelled by their lowest value, so birth_year with width 5
+    puts 1962 in the 1960 bin; birth_decade is birth_year in bins of 10.
+    """
+
+    def __init__(self, name, width=1):
+        """
+        Parameters:
+            name --> key of DIMENSIONS
+            width --> bin width for numeric dimensions (ignored for the others)
+
+        Raises:
+            ValueError --> if the name or width is not valid
+        """
+        if name not in DIMENSIONS:
+            raise ValueError(f'unknown dimension {name!r}; choose from {", ".join(DIMENSIONS)}')
+        if width < 1:
+            raise ValueError('bin width must be a positive integer')
+        self.name = name
+        self.numeric = name in NUMERIC_DIMENSIONS
+        self.width = width if self.numeric else 1
+        if name == 'birth_decade':
+            self.width *= 10
+
+    def describe(self, bins):
+        """Return the JSON description of this axis."""
+        return {'name': self.name, 'label': DIMENSIONS[self.name], 'numeric': self.numeric,
+                'bin_width': self.width, 'bins': bins}
+
+    def expression(self):
+        """Return the database expression giving each voter's bin."""
+        if self.name in ELECTION_BITS:
+            return Case(When(voting_history__hasall=ELECTION_BITS[self.name], then=Value(True)),
+                        default=Value(False), output_field=BooleanField())
+        expression = {
+            'birth_year': ExtractYear('date_of_birth'),
+            'birth_decade': ExtractYear('date_of_birth'),
+            'registration_year': ExtractYear('date_of_registration'),
+            'score': F('voter_score'),
+            'party': F('party_affiliation'),
+            'precinct': F('precinct_number'),
+            'zip_code': F('zip_code'),
+        }[self.name]
+        if self.width > 1:
+            # Integer division, so every value maps to the start of its bin
+            expression = expression / Value(self.width) * Value(self.width)
+        return expression
+
+    def snapshot_values(self, snapshot, mask):
+        """
+        Get the (masked) integer column for this dimension and a function turning a value into its label.
+        """
+        if self.name in ELECTION_BITS:
+            column = snapshot.elections if mask is None else snapshot.elections[mask]
+            return (column & ELECTION_BITS[self.name]) != 0, bool
+        column = getattr(snapshot, SNAPSHOT_COLUMNS[self.name])
+        column = column if mask is None else column[mask]
+        if self.name in SNAPSHOT_CODES:
+            labels = getattr(snapshot, SNAPSHOT_CODES[self.name])
+            return column, lambda code: labels[code]
+        if self.width > 1:
+            return column.astype('int64') // self.width, lambda value: value * self.width
+        return column, int
+
+
+def _sort_key(label):
+    """Order labels naturally: numbers by value (so precinct 10 follows 9), then strings."""
+    if isinstance(label, str):
+        return (1, int(label)) if label.strip().isdigit() else (2, label)
+    return (0, label)
+
+
+def _result(dimensions, cells, total):
+    """
+    Arrange {bin tuple: count} cells into the crosstab JSON structure.
+
+    Only bins with at least one voter are listed, in natural order.
+    """
+    axes = [sorted({cell[index] for cell in cells}, key=_sort_key) for index in range(len(dimensions))]
+    if len(dimensions) == 1:
+        counts = [cells[(label,)] for label in axes[0]]
+    else:
+        counts = [[cells.get((x, y), 0) for y in axes[1]] for x in axes[0]]
+    return {
+        'total': total,
+        'dimensions': [dimension.describe(bins) for dimension, bins in zip(dimensions, axes)],
+        'counts': counts,
+    }
+
+
+def snapshot_crosstab(snapshot, filters, dimensions):
+    """
+    Count voters per bin with NumPy: offset each column to start at zero, combine
+    the columns into one integer key per voter, and bincount the keys.
+
+    Parameters:
+        snapshot --> VoterSnapshot
+        filters --> dict from voter_analytics.filters.parse_filters
+        dimensions --> list of one or two Dimension objects
+
+    Returns:
+        dict --> see crosstab
+    """
+    mask = snapshot.mask(filters)
+    columns = [dimension.snapshot_values(snapshot, mask) for dimension in dimensions]
+    total = len(columns[0][0])
+    if total == 0:
+        return _result(dimensions, {}, 0)
+
+    keys = None
+    offsets, sizes = [], []
+    for values, _ in columns:
+        values = values.astype('int64')
+        low = int(values.min())
+        size = int(values.max()) - low + 1
+        keys = values - low if keys is None else keys * size + (values - low)
+        offsets.append(low)
+        sizes.append(size)
+
+    counts = np.bincount(keys, minlength=int(np.prod(sizes))).reshape(sizes)
+    labels = [label for _, label in columns]
+    cells = {}
+    for positions in zip(*np.nonzero(counts)):
+        cell = tuple(labels[axis](int(position) + offsets[axis]) for axis, position in enumerate(positions))
+        cells[cell] = int(counts[positions])
+    return _result(dimensions, cells, total)
+
+
+def database_crosstab(queryset, dimensions):
+    """
+    Count voters per bin with one grouped query.
+
+    Parameters:
+        queryset --> filtered QuerySet of Voter objects
+        dimensions --> list of one or two Dimension objects
+
+    Returns:
+        dict --> see crosstab
+    """
+    names = [f'bin{index}' for index in range(len(dimensions))]
+    rows = (queryset.order_by()
+            .annotate(**{name: dimension.expression() for name, dimension in zip(names, dimensions)})
+            .values(*names)
+            .annotate(count=Count('id')))
+    cells = {}
+    for row in rows:
+        cell = tuple(row[name] for name in names)
+        cells[cell] = cells.get(cell, 0) + row['count']
+    return _result(dimensions, cells, sum(cells.values()))
+
+
+def crosstab(queryset, filters, dimensions, snapshot=None):
+    """
+    Count the voters matching a set of filters in every bin of one or two dimensions.
+
+    Uses the columnar snapshot when it can answer the filters, otherwise a
+    grouped query on the filtered QuerySet.
+
+    Parameters:
+        queryset --> QuerySet of the voters matching filters
+        filters --> dict from voter_analytics.filters.parse_filters
+        dimensions --> list of one or two Dimension objects
+        snapshot --> VoterSnapshot, or None to use the database
+
+    Returns:
+        dict --> 'total' (int),
+                 'dimensions' (list of {'name', 'label', 'numeric', 'bin_width', 'bins'}),
+                 'counts' (list of counts per bin, or for two dimensions a list of rows,
+                           one per bin of the first, with a count per bin of the second)
+    """
+    if snapshot is not None and np is not None and snapshot_supports(filters):
+        return snapshot_crosstab(snapshot, filters, dimensions)
+    return database_crosstab(queryset, dimensions)
@@ -0,0 +1,92 @@
+# File: voter_analytics/cube.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Precomputed aggregate cube of voter counts, used to answer graph requests without
+#              touching the Voter table
+
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import Coalesce, ExtractYear
+
+from .models import Voter, VoterCube
+from .parsing import ELECTION_BITS, ELECTION_FIELDS
+
+
+# Dimensions of the cube, as columns of both VoterCube and the annotated Voter query
+# (voter_score is derived from voting_history in both)
+CUBE_DIMENSIONS = ['party_affiliation', 'birth_year', 'voting_history']
+
+# Filters (from voter_analytics.filters.parse_filters) that can be answered from the cube
+CUBE_FILTERS = {'party_affiliation', 'min_birth_year', 'max_birth_year', 'voter_score', 'elections'}
+
+
+def refresh_cube():
+    """
+    Rebuild the cube from the Voter table with a single GROUP BY query.
+
+    Call inside the transaction that changed the voter data, so the cube is
+    never out of step with it.
+
+    Returns:
+        int --> number of cube cells written
+    """
+    cells = (Voter.objects.order_by()
+             .annotate(birth_year=ExtractYear('date_of_birth'))
+             .values(*CUBE_DIMENSIONS)
+             .annotate(num_voters=Count('id')))
+    VoterCube.objects.all().delete()
+    VoterCube.objects.bulk_create((VoterCube(**cell) for cell in cells.iterator()), batch_size=1000)
+    return VoterCube.objects.count()
+
+
+def cube_supports(filters):
+    """
+    Return True if every active filter maps onto a cube dimension.
+
+    Parameters:
+        filters --> dict from voter_analytics.filters.parse_filters
+    """
+    return all(name in CUBE_FILTERS for name, value in filters.items() if value not in (None, []))
+
+
+def filter_cube(queryset, filters):
+    """Apply parsed voter filters to a VoterCube QuerySet."""
+    if filters['party_affiliation'] is not None:
+        queryset = queryset.filter(party_affiliation=filters['party_affiliation'])
+    if filters['min_birth_year'] is not None:
+        queryset = queryset.filter(birth_year__gte=filters['min_birth_year'])
+    if filters['max_birth_year'] is not None:
+        queryset = queryset.filter(birth_year__lte=filters['max_birth_year'])
+    if filters['voter_score'] is not None:
+        queryset = queryset.filter(voter_score=filters['voter_score'])
+    if filters['elections']:
+        queryset = queryset.filter(voting_history__hasall=filters['elections'])
+    return queryset
+
+
+def cube_graph_counts(filters):
+    """
+    Compute the counts behind the voter graphs from the cube.
+
+    Returns the same structure as voter_analytics.aggregates.graph_counts.
+
+    Parameters:
+        filters --> dict from voter_analytics.filters.parse_filters (see cube_supports)
+    """
+    cells = filter_cube(VoterCube.objects.order_by(), filters)
+
+    totals = cells.aggregate(
+        total=Coalesce(Sum('num_voters'), 0),
+        **{field: Coalesce(Sum('num_voters', filter=Q(voting_history__hasall=bit)), 0)
+           for field, bit in ELECTION_BITS.items()}
+    )
+    birth_years = cells.values('birth_year').annotate(count=Sum('num_voters')).order_by('birth_year')
+    parties = (cells.values('party_affiliation')
+               .annotate(count=Sum('num_voters'))
+               .order_by('-count', 'party_affiliation'))
+
+    return {
+        'total': totals['total'],
+        'birth_years': [(row['birth_year'], row['count']) for row in birth_years],
+        'parties': [(row['party_affiliation'], row['count']) for row in parties],
+        'elections': {field: totals[field] for field in ELECTION_FIELDS},
+    }
@@ -0,0 +1,172 @@
+# File: voter_analytics/export.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Streaming export of filtered voters as CSV, NDJSON, Arrow or Parquet in bounded memory
+
+import csv
+import json
+from itertools import islice
+
+from .parsing import ELECTION_BITS, ELECTION_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; without it only the text formats are offered
+    pa = None
+    pq = None
+
+
+# Exported columns, in order
+EXPORT_FIELDS = [
+    'id', 'voter_id', 'last_name', 'first_name',
+    'street_number', 'street_name', 'apartment_number', 'zip_code',
+    'date_of_birth', 'date_of_registration', 'party_affiliation', 'precinct_number',
+    *ELECTION_FIELDS, 'voter_score',
+]
+
+DATE_EXPORT_FIELDS = ('date_of_birth', 'date_of_registration')
+
+# Columns read from the database; voting_history is expanded into the election columns
+QUERY_FIELDS = EXPORT_FIELDS[:EXPORT_FIELDS.index(ELECTION_FIELDS[0])] + ['voting_history', 'voter_score']
+
+# Rows fetched from the database cursor (and written per Arrow batch / Parquet row group) at a time
+CHUNK_SIZE = 5000
+
+
+class _Echo:
+    """File-like object whose write() returns what it was given, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+class _Drain:
+    """
+    Write-only file that keeps what was written until drain() hands it out.
+
+    Lets pyarrow writers produce a stream piece by piece: everything the
+    writer has flushed so far is sent after each batch.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def _export_row(row):
+    """Expand a QUERY_FIELDS row into an EXPORT_FIELDS row."""
+    *values, history, score = row
+    return (*values, *(bool(history & bit) for bit in ELECTION_BITS.values()), score)
+
+
+def _iter_chunks(queryset):
+    """
+    Fetch the export columns through a database cursor, CHUNK_SIZE rows at a time.
+
+    Rows come in primary key order, which the database can stream without sorting.
+    """
+    rows = queryset.order_by('id').values_list(*QUERY_FIELDS).iterator(chunk_size=CHUNK_SIZE)
+    while True:
+        chunk = [_export_row(row) for row in islice(rows, CHUNK_SIZE)]
+        if not chunk:
+            return
+        yield chunk
+
+
+def stream_csv(queryset):
+    """
+    Yield the voters in a QuerySet as CSV, one chunk of lines at a time.
+
+    The header is yielded before the query runs, so the first byte is sent immediately.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for chunk in _iter_chunks(queryset):
+        yield ''.join(writer.writerow(row) for row in chunk)
+
+
+def stream_ndjson(queryset):
+    """Yield the voters in a QuerySet as newline-delimited JSON objects, one chunk at a time."""
+    date_positions = [EXPORT_FIELDS.index(field) for field in DATE_EXPORT_FIELDS]
+    for chunk in _iter_chunks(queryset):
+        lines = []
+        for row in chunk:
+            row = list(row)
+            for position in date_positions:
+                row[position] = row[position].isoformat()
+            lines.append(json.dumps(dict(zip(EXPORT_FIELDS, row)), separators=(',', ':')))
+        yield '\n'.join(lines) + '\n'
+
+
+def arrow_schema():
+    """Return the Arrow schema of an exported voter row."""
+    types = {'id': pa.int64(), 'voter_score': pa.int8()}
+    types.update({field: pa.date32() for field in DATE_EXPORT_FIELDS})
+    types.update({field: pa.bool_() for field in ELECTION_FIELDS})
+    return pa.schema([(field, types.get(field, pa.string())) for field in EXPORT_FIELDS])
+
+
+def _record_batches(queryset, schema):
+    for chunk in _iter_chunks(queryset):
+        columns = list(zip(*chunk))
+        yield pa.RecordBatch.from_arrays(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema)
+
+
+def stream_arrow(queryset):
+    """Yield the voters in a QuerySet as an Arrow IPC stream, one record batch at a time."""
+    schema = arrow_schema()
+    sink = _Drain()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        yield sink.drain()
+        for batch in _record_batches(queryset, schema):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def stream_parquet(queryset):
+    """Yield the voters in a QuerySet as a Parquet file, one row group per chunk."""
+    schema = arrow_schema()
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+        yield sink.drain()
+        for batch in _record_batches(queryset, schema):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+# Format name -> (stream function, content type, needs pyarrow)
+EXPORT_FORMATS = {
+    'csv': (stream_csv, 'text/csv', False),
+    'ndjson': (stream_ndjson, 'application/x-ndjson', False),
+    'arrow': (stream_arrow, 'application/vnd.apache.arrow.stream', True),
+    'parquet': (stream_parquet, 'application/vnd.apache.parquet', True),
+}
+
+
+def available_formats():
+    """Return the export formats that can be produced with the installed packages."""
+    return [name for name, (_, _, needs_arrow) in EXPORT_FORMATS.items() if pa is not None or not needs_arrow]
@@ -0,0 +1,104 @@
+# File: voter_analytics/fields.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Bit-packed voting history field, its hasall/hasany lookups, and the derived voter score
+
+import operator
+from abc import ABCMeta, abstractmethod
+from functools import reduce
+
+from django.core.exceptions import EmptyResultSet
+from django.db import models
+from django.db.models import F, Lookup
+
+from .parsing import ELECTION_BITS, ELECTION_FIELDS, election_mask
+
+
+# Every value a voting history can take
+ALL_HISTORIES = range(1 << len(ELECTION_FIELDS))
+
+
+class VotingHistoryField(models.PositiveSmallIntegerField):
+    """
+    The elections a voter voted in, as a bitmask (see parsing.ELECTION_BITS).
+
+    Supports two lookups, each taking a mask or a list of election field names:
+        voting_history__hasall=['v20state', 'v22general']  voted in all of them
+        voting_history__hasany=['v21town', 'v23town']     voted in at least one
+    """
+
+
+class ElectionMaskLookup(Lookup, metaclass=ABCMeta):
+    """
+    Base for the bitmask lookups.
+
+    There are only 2 ** len(ELECTION_FIELDS) possible histories, so instead
+    of a bitwise expression the database can't index, the lookup lists the
+    matching values: voting_history IN (...), which an index can seek.
+    """
+    prepare_rhs = False
+
+    @abstractmethod
+    def matches(self, history, mask):
+        """Return True if a voting history satisfies the lookup for a mask."""
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        mask = self.rhs if isinstance(self.rhs, int) else election_mask(self.rhs)
+        values = [history for history in ALL_HISTORIES if self.matches(history, mask)]
+        if not values:
+            raise EmptyResultSet
+        if len(values) == len(ALL_HISTORIES):
+            return '1 = 1', []
+        placeholders = ', '.join(['%s'] * len(values))
+        return f'{lhs} IN ({placeholders})', list(lhs_params) + values
+
+
+@VotingHistoryField.register_lookup
+class HasAll(ElectionMaskLookup):
+    lookup_name = 'hasall'
+
+    def matches(self, history, mask):
+        return history & mask == mask
+
+
+@VotingHistoryField.register_lookup
+class HasAny(ElectionMaskLookup):
+    lookup_name = 'hasany'
+
+    def matches(self, history, mask):
+        return history & mask != 0
+
+
+def voter_score_expression(field='voting_history'):
+    """
+    Build the database expression counting the elections set in a voting history.
+
+    Parameters:
+        field --> name of the VotingHistoryField
+
+    Returns:
+        Expression --> sum of the bits of the field
+    """
+    return reduce(operator.add, (F(field).bitrightshift(index).bitand(1)
+                                 for index in range(len(ELECTION_FIELDS))))
+
+
+def election_property(name):
+    """
+    Build a boolean property reading and writing one election's bit of voting_history.
+
+    Lets code and templates keep using voter.v22general, and Voter(v22general=True).
+    """
+    bit = ELECTION_BITS[name]
+
+    def getter(self):
+        return bool(self.voting_history & bit)
+
+    def setter(self, voted):
+        if voted:
+            self.voting_history |= bit
+        else:
+            self.voting_history &= ~bit
+
+    return property(getter, setter, doc=f'Whether the voter voted in {name} (bit {bit} of voting_history).')
@@ -0,0 +1,114 @@
+# File: voter_analytics/filters.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Parsing of the voter filter query string into a canonical form, and applying it to a QuerySet
+
+import hashlib
+import json
+from datetime import MAXYEAR, MINYEAR, date
+from urllib.parse import urlencode
+
+from .parsing import ELECTION_FIELDS
+from .search import normalize_search, search_filter
+
+
+def _parse_int(value):
+    """Return value as an int, or None if it is empty or not a number."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_year(value):
+    """Return value as a year, or None if it is empty or outside the range a date can hold."""
+    year = _parse_int(value)
+    return year if year is not None and MINYEAR <= year < MAXYEAR else None
+
+
+def parse_filters(params):
+    """
+    Read the voter filters from a query string.
+
+    Empty and malformed values are dropped, so two query strings that
+    select the same voters produce equal filter dictionaries.
+
+    Parameters:
+        params --> QueryDict (request.GET) or any mapping of parameter name to value
+
+    Returns:
+        dict --> 'party_affiliation' (str or None), 'min_birth_year', 'max_birth_year',
+                 'voter_score' (int or None), 'elections' (list of checked election fields),
+                 'search' (name/street search from the q parameter, or None)
+    """
+    return {
+        'party_affiliation': params.get('party_affiliation') or None,
+        'min_birth_year': _parse_year(params.get('min_birth_year')),
+        'max_birth_year': _parse_year(params.get('max_birth_year')),
+        'voter_score': _parse_int(params.get('voter_score')),
+        'elections': [field for field in ELECTION_FIELDS if params.get(field)],
+        'search': normalize_search(params.get('q')),
+    }
+
+
+def filter_query_string(filters):
+    """
+    Turn parsed filters back into a query string for links (without the leading '?').
+
+    Parameters:
+        filters --> dict from parse_filters
+    """
+    params = [(name, filters[name]) for name in ('party_affiliation', 'min_birth_year', 'max_birth_year', 'voter_score')
+              if filters[name] is not None]
+    params += [(field, 'on') for field in filters['elections']]
+    if filters['search'] is not None:
+        params.append(('q', filters['search']))
+    return urlencode(params)
+
+
+def filters_key(filters):
+    """
+    Return a short, stable string identifying a set of parsed filters, for use in cache keys.
+
+    Parameters:
+        filters --> dict from parse_filters
+    """
+    canonical = json.dumps(filters, sort_keys=True, separators=(',', ':'))
+    return hashlib.sha1(canonical.encode()).hexdigest()
+
+
+def filter_voters(queryset, filters):
+    """
+    Apply parsed voter filters to a QuerySet.
+
+    Parameters:
+        queryset --> QuerySet of Voter objects
+        filters --> dict from parse_filters
+
+    Returns:
+        QuerySet --> the filtered QuerySet
+    """
+    # Filter by party affiliation
+    if filters['party_affiliation'] is not None:
+        queryset = queryset.filter(party_affiliation=filters['party_affiliation'])
+
+    # Filter by birth year range, written as a plain date range so the
+    # date_of_birth indexes can be used (__year__ lookups wrap the column in a function)
+    if filters['min_birth_year'] is not None:
+        queryset = queryset.filter(date_of_birth__gte=date(filters['min_birth_year'], 1, 1))
+    if filters['max_birth_year'] is not None:
+        queryset = queryset.filter(date_of_birth__lt=date(filters['max_birth_year'] + 1, 1, 1))
+
+    # Filter by voter score
+    if filters['voter_score'] is not None:
+        queryset = queryset.filter(voter_score=filters['voter_score'])
+
+    # Filter by specific elections (voted in all of the checked ones)
+    if filters['elections']:
+        queryset = queryset.filter(voting_history__hasall=filters['elections'])
+
+    # Filter by name/street search
+    if filters['search'] is not None:
+        queryset = queryset.filter(search_filter(filters['search']))
+
+    return queryset
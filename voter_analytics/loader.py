@@ -0,0 +1,434 @@
+# File: voter_analytics/loader.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Streaming CSV loader that converts voter rows in batches and either replaces the
+#              Voter table with bulk_create or syncs it incrementally against a refreshed file
+
+import csv
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from .cube import refresh_cube
+from .metadata import get_filter_metadata
+from .models import Voter
+from .rollups import ROLLUP_SOURCE_FIELDS, refresh_rollups
+from .snapshot import build_snapshot
+from .versioning import bump_data_version
+from .warmup import enqueue_warmup
+from .parsing import (DEFAULT_CHUNK_BYTES, ROW_ERRORS, parse_byte_range, parse_voter_row,
+                      split_byte_ranges, unpack_row)
+
+
+DEFAULT_BATCH_SIZE = 5000
+
+# Only the first few rejected rows are kept in memory for reporting
+MAX_REPORTED_ERRORS = 20
+
+# Temporary table holding every voter_id read from the file so far
+STAGE_TABLE = 'voter_analytics_file_voter_ids'
+
+# voter_ids per IN (...) lookup against the staging table
+STAGE_LOOKUP_SIZE = 500
+
+
+def refresh_derived_data():
+    """
+    Bump the data version and rebuild everything derived from the Voter table.
+
+    Called once a load or sync has committed, so caches keyed on the old
+    version are dropped, and the columnar snapshot and filter metadata are
+    ready before the first request needs them. A warm-up job is queued to
+    render the popular graph pages (see voter_analytics.warmup).
+    """
+    version = bump_data_version()
+    build_snapshot(version)
+    get_filter_metadata(version)
+    enqueue_warmup(version)
+
+
+class LoadStats:
+    """
+    Running totals for a voter load, used for progress and summary reporting.
+    """
+
+    def __init__(self, rejects=None):
+        self.rows = 0
+        self.loaded = 0
+        self.rejected = 0
+        self.errors = []
+        self.rejects = rejects
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def reject(self, line_number, error, values):
+        """
+        Record a row that could not be converted.
+
+        Parameters:
+            line_number --> line of the CSV file the row came from
+            error --> the exception raised while converting the row
+            values --> raw column values, written to the rejects file if there is one
+        """
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, f"{type(error).__name__}: {error}"))
+        if self.rejects is not None:
+            self.rejects.writerow([line_number, str(error)] + list(values))
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        """Seconds spent so far (or in total once the load has finished)."""
+        end = self.finished if self.finished is not None else time.perf_counter()
+        return end - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+    def summary(self):
+        """Return a one-line human readable summary of the load."""
+        return (f"{self.loaded} voters loaded, {self.rejected} rows rejected "
+                f"in {self.elapsed:.2f}s ({self.rows_per_second:,.0f} rows/sec)")
+
+
+class SyncStats(LoadStats):
+    """
+    Totals for an incremental sync, including what changed in the table.
+    """
+
+    def __init__(self, rejects=None):
+        super().__init__(rejects)
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.field_changes = Counter()
+        # Precincts with an inserted, deleted or changed voter, whose rollups are refreshed
+        self.precincts = set()
+
+    @property
+    def written(self):
+        """Number of rows that were inserted, updated or deleted."""
+        return self.inserted + self.updated + self.deleted
+
+    def summary(self):
+        """Return a one-line human readable summary of the sync."""
+        return (f"{self.inserted} inserted, {self.updated} updated, {self.deleted} deleted, "
+                f"{self.unchanged} unchanged, {self.rejected} rows rejected "
+                f"in {self.elapsed:.2f}s ({self.rows_per_second:,.0f} rows/sec)")
+
+
+class VoterIdStage:
+    """
+    Temporary table of the voter_ids read from a file, used to reject
+    duplicate ids and to find the voters a sync should delete.
+
+    Keeping the ids in the database rather than in a Python set keeps
+    memory constant however large the file is. Use it as a context manager
+    inside the load's transaction; the table is dropped on exit.
+    """
+
+    def __init__(self, require_id=False):
+        """
+        Parameters:
+            require_id --> reject rows with no voter_id as well as duplicates
+        """
+        self.require_id = require_id
+
+    def __enter__(self):
+        self.cursor = connection.cursor()
+        self.cursor.execute(f'DROP TABLE IF EXISTS {STAGE_TABLE}')
+        self.cursor.execute(f'CREATE TEMPORARY TABLE {STAGE_TABLE} (voter_id VARCHAR(20) PRIMARY KEY)')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.cursor.execute(f'DROP TABLE IF EXISTS {STAGE_TABLE}')
+        self.cursor.close()
+
+    def validate(self, batch):
+        """
+        Reject the rows of a batch whose voter_id is missing (if required) or already seen, and stage the rest.
+
+        Runs one lookup per STAGE_LOOKUP_SIZE ids and one insert for the batch.
+
+        Parameters:
+            batch --> list of dicts of Voter field values
+
+        Returns:
+            dict --> index in batch -> ValueError, for each rejected row
+        """
+        rejected = {}
+        first_index = {}
+        for index, fields in enumerate(batch):
+            key = fields['voter_id']
+            if key is None:
+                if self.require_id:
+                    rejected[index] = ValueError('missing Voter ID Number')
+            elif key in first_index:
+                rejected[index] = ValueError(f'duplicate Voter ID Number {key!r}')
+            else:
+                first_index[key] = index
+
+        keys = list(first_index)
+        for start in range(0, len(keys), STAGE_LOOKUP_SIZE):
+            chunk = keys[start:start + STAGE_LOOKUP_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            self.cursor.execute(f'SELECT voter_id FROM {STAGE_TABLE} WHERE voter_id IN ({placeholders})', chunk)
+            for (key,) in self.cursor.fetchall():
+                rejected[first_index.pop(key)] = ValueError(f'duplicate Voter ID Number {key!r}')
+        self.cursor.executemany(f'INSERT INTO {STAGE_TABLE} (voter_id) VALUES (%s)',
+                                [(key,) for key in first_index])
+        return rejected
+
+    def unseen_voters(self):
+        """Return a QuerySet of the voters whose voter_id was not in the file."""
+        return Voter.objects.exclude(voter_id__in=RawSQL(f'SELECT voter_id FROM {STAGE_TABLE}', []))
+
+
+def _validated(rows, validate, stats):
+    """
+    Apply a batch validator and return the rows that pass.
+
+    Parameters:
+        rows --> list of (fields, line_number, raw values) tuples
+        validate --> callable given the list of fields, returning {index: error} for rejected rows
+        stats --> LoadStats receiving the rejected rows
+    """
+    rejected = validate([fields for fields, _, _ in rows])
+    valid = []
+    for index, (fields, line_number, values) in enumerate(rows):
+        if index in rejected:
+            stats.reject(line_number, rejected[index], values)
+        else:
+            valid.append(fields)
+    return valid
+
+
+def iter_row_batches(file, stats, batch_size=DEFAULT_BATCH_SIZE, validate=None):
+    """
+    Stream a voter CSV file and yield lists of converted rows.
+
+    Only one batch is held in memory at a time, so arbitrarily large files
+    can be processed in constant memory.
+
+    Parameters:
+        file --> open text file positioned at the header row
+        stats --> LoadStats instance updated as rows are read
+        batch_size --> number of rows per yielded batch
+        validate --> optional callable given each batch of converted rows, returning
+                     {index: error} for the rows to reject (see VoterIdStage.validate)
+
+    Yields:
+        list --> up to batch_size dicts of Voter field values
+    """
+    reader = csv.DictReader(file)
+    rows = []
+    for row in reader:
+        stats.rows += 1
+        try:
+            fields = parse_voter_row(row)
+        except ROW_ERRORS as e:
+            stats.reject(reader.line_num, e, row.values())
+            continue
+
+        rows.append((fields, reader.line_num, row.values()))
+        if len(rows) >= batch_size:
+            yield _validated(rows, validate, stats) if validate is not None else [fields for fields, _, _ in rows]
+            rows = []
+    if rows:
+        yield _validated(rows, validate, stats) if validate is not None else [fields for fields, _, _ in rows]
+
+
+def iter_parallel_row_batches(filename, stats, batch_size=DEFAULT_BATCH_SIZE, validate=None,
+                              workers=2, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Parse a voter CSV file in a process pool and yield lists of converted rows.
+
+    The file is split into byte ranges that worker processes parse and
+    validate independently. Results are consumed in file order by the
+    calling process, which stays the single writer. At most two ranges per
+    worker are in flight, so memory stays bounded by the chunk size.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        stats --> LoadStats instance updated as rows are read
+        batch_size --> number of rows per yielded batch
+        validate --> optional callable run in this process on each worker's rows
+                     (see iter_row_batches)
+        workers --> number of parser processes
+        chunk_bytes --> approximate size of the byte range given to each worker task
+
+    Yields:
+        list --> up to batch_size dicts of Voter field values
+    """
+    fieldnames, ranges = split_byte_ranges(filename, chunk_bytes)
+    ranges = iter(ranges)
+    pending = deque()
+    line_offset = 1  # the header line
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+
+        def submit_next():
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(parse_byte_range, filename, fieldnames, *next_range))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            packed, line_numbers, rejected, line_count = pending.popleft().result()
+            submit_next()
+            rows = [unpack_row(values) for values in packed]
+
+            stats.rows += len(rows) + len(rejected)
+            for line_number, error, values in rejected:
+                stats.reject(line_offset + line_number, error, values)
+            if validate is not None:
+                rows = _validated([(fields, line_offset + line_number, fields.values())
+                                   for fields, line_number in zip(rows, line_numbers)], validate, stats)
+            line_offset += line_count
+
+            for index in range(0, len(rows), batch_size):
+                yield rows[index:index + batch_size]
+
+
+def iter_file_batches(filename, stats, batch_size=DEFAULT_BATCH_SIZE, validate=None, workers=1):
+    """
+    Yield batches of converted rows from a voter CSV file, in a process pool if workers > 1.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        stats --> LoadStats instance updated as rows are read
+        batch_size --> number of rows per yielded batch
+        validate --> optional batch validator (see iter_row_batches)
+        workers --> number of parser processes (1, the default, parses in this process; more
+                    have not been measured to help, see benchmark_ingest)
+
+    Yields:
+        list --> up to batch_size dicts of Voter field values
+    """
+    if workers > 1:
+        yield from iter_parallel_row_batches(filename, stats, batch_size, validate, workers)
+        return
+    # utf-8-sig strips a byte order mark, as split_byte_ranges does for the parallel path
+    with open(filename, 'r', newline='', encoding='utf-8-sig') as file:
+        yield from iter_row_batches(file, stats, batch_size, validate)
+
+
+def load_voters(filename, batch_size=DEFAULT_BATCH_SIZE, rejects=None, progress=None, workers=1):
+    """
+    Replace the contents of the Voter table with the rows of a CSV file.
+
+    Rows repeating a voter_id already seen in the file are rejected.
+
+    The delete, all inserts and the rebuild of the aggregate cube and the
+    precinct/street rollups run inside a single transaction, so readers
+    keep seeing the previous data until the new file is fully loaded.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        batch_size --> rows per bulk_create statement
+        rejects --> optional csv.writer that receives every rejected row
+        progress --> optional callable invoked with the LoadStats after each batch
+        workers --> number of parser processes (1, the default, parses in this process; more
+                    have not been measured to help, see benchmark_ingest)
+
+    Returns:
+        LoadStats --> totals for the load
+    """
+    stats = LoadStats(rejects)
+    with transaction.atomic():
+        transaction.on_commit(refresh_derived_data)
+        Voter.objects.all().delete()
+        with VoterIdStage() as stage:
+            for batch in iter_file_batches(filename, stats, batch_size, stage.validate, workers):
+                Voter.objects.bulk_create([Voter(**fields) for fields in batch], batch_size=batch_size)
+                stats.loaded += len(batch)
+                if progress is not None:
+                    progress(stats)
+        refresh_cube()
+        refresh_rollups()
+    stats.finish()
+    return stats
+
+
+def sync_voters(filename, batch_size=DEFAULT_BATCH_SIZE, rejects=None, progress=None, workers=1):
+    """
+    Bring the Voter table in line with a refreshed CSV file without reloading it.
+
+    Voters are matched on voter_id (the file's "Voter ID Number"). Each batch
+    of the file is compared against the matching rows in the table, and only
+    new and changed voters are written. Voters missing from the file are
+    deleted at the end. Rollups are refreshed only for the precincts that
+    had a voter inserted, deleted or changed. Everything runs in one
+    transaction, so the table is never seen half-synced or empty.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        batch_size --> rows per comparison batch and bulk statement
+        rejects --> optional csv.writer that receives every rejected row
+        progress --> optional callable invoked with the SyncStats after each batch
+        workers --> number of parser processes (1, the default, parses in this process; more
+                    have not been measured to help, see benchmark_ingest)
+
+    Returns:
+        SyncStats --> what changed in the table
+    """
+    stats = SyncStats(rejects)
+
+    with transaction.atomic(), VoterIdStage(require_id=True) as stage:
+        for batch in iter_file_batches(filename, stats, batch_size, stage.validate, workers):
+            rows = {fields['voter_id']: fields for fields in batch}
+
+            existing = Voter.objects.in_bulk(list(rows), field_name='voter_id')
+            to_create = []
+            to_update = []
+            changed_fields = set()
+            for key, fields in rows.items():
+                voter = existing.get(key)
+                if voter is None:
+                    to_create.append(Voter(**fields))
+                    stats.precincts.add(fields['precinct_number'])
+                    continue
+
+                changed = [name for name, value in fields.items() if getattr(voter, name) != value]
+                if not changed:
+                    stats.unchanged += 1
+                    continue
+                if ROLLUP_SOURCE_FIELDS.intersection(changed):
+                    stats.precincts.update((voter.precinct_number, fields['precinct_number']))
+                for name in changed:
+                    setattr(voter, name, fields[name])
+                    stats.field_changes[name] += 1
+                changed_fields.update(changed)
+                to_update.append(voter)
+
+            Voter.objects.bulk_create(to_create, batch_size=batch_size)
+            if to_update:
+                Voter.objects.bulk_update(to_update, sorted(changed_fields), batch_size=batch_size)
+            stats.inserted += len(to_create)
+            stats.updated += len(to_update)
+            stats.loaded += len(rows)
+            if progress is not None:
+                progress(stats)
+
+        # Anything left in the table that the file did not mention is gone;
+        # both statements compare against the staged ids in the database
+        stale = stage.unseen_voters()
+        stats.precincts.update(stale.order_by().values_list('precinct_number', flat=True).distinct())
+        stats.deleted += stale.delete()[0]
+
+        if stats.written:
+            refresh_cube()
+            refresh_rollups(stats.precincts)
+            transaction.on_commit(refresh_derived_data)
+    stats.finish()
+    return stats
@@ -0,0 +1,73 @@
+# File: voter_analytics/management/commands/benchmark_bitmaps.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that times bitmap index lookups against SQL for every election filter combination
+
+import statistics
+import time
+from itertools import combinations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voter_analytics.filters import filter_voters, parse_filters
+from voter_analytics.models import Voter
+from voter_analytics.parsing import ELECTION_FIELDS
+from voter_analytics.snapshot import get_snapshot
+
+
+def _median_ms(function, repeat):
+    """Run function repeat times and return (median milliseconds, last result)."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings), result
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the bitmap index for all 32 combinations of the election checkboxes.
+
+    For each combination it reports the median latency of a bitmap count,
+    of resolving the matching ids in list order, and of the equivalent SQL
+    COUNT(*), optionally combined with a party or score filter.
+
+    Usage: python manage.py benchmark_bitmaps [--repeat N] [--party D] [--score 3]
+    """
+    help = 'Benchmark bitmap index counts and id lookups against SQL for every election flag combination.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per combination (default: 5)')
+        parser.add_argument('--party', help='Also filter on this party affiliation')
+        parser.add_argument('--score', help='Also filter on this voter score')
+
+    def handle(self, *args, **options):
+        snapshot = get_snapshot(build=True)
+        if snapshot is None:
+            raise CommandError('The bitmap index needs NumPy, which is not installed.')
+
+        repeat = options['repeat']
+        self.stdout.write(f"{len(snapshot):,} voters, median of {repeat} runs (ms)")
+        self.stdout.write(f"{'elections':<48} {'matches':>9} {'bitmap count':>13} {'bitmap ids':>11} {'sql count':>10}")
+
+        for size in range(len(ELECTION_FIELDS) + 1):
+            for elections in combinations(ELECTION_FIELDS, size):
+                params = {field: 'on' for field in elections}
+                if options['party']:
+                    params['party_affiliation'] = options['party']
+                if options['score']:
+                    params['voter_score'] = options['score']
+                filters = parse_filters(params)
+
+                count_ms, matches = _median_ms(lambda: snapshot.count(filters), repeat)
+                ids_ms, _ = _median_ms(lambda: snapshot.select_ids(filters), repeat)
+                sql_ms, sql_matches = _median_ms(
+                    lambda: filter_voters(Voter.objects.all(), filters).count(), repeat)
+                if sql_matches != matches:
+                    raise CommandError(f"Bitmap count {matches} differs from SQL count {sql_matches} "
+                                       f"for {', '.join(elections) or 'no elections'}")
+
+                label = '+'.join(elections) or '(none)'
+                self.stdout.write(f"{label:<48} {matches:>9,} {count_ms:>13.3f} {ids_ms:>11.3f} {sql_ms:>10.3f}")
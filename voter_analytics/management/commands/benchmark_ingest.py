@@ -0,0 +1,73 @@
+# File: voter_analytics/management/commands/benchmark_ingest.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that benchmarks voter CSV parsing and loading with different worker counts
+
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from voter_analytics.loader import LoadStats, iter_file_batches, load_voters
+from voter_analytics.synthetic import write_voter_csv
+
+
+class Command(BaseCommand):
+    """
+    Time the voter ingest pipeline on a generated file for several worker counts.
+
+    By default only parsing and validation are timed. With --write each run
+    also loads the rows into the Voter table inside a transaction that is
+    rolled back afterwards, so existing data is left untouched.
+
+    Usage: python manage.py benchmark_ingest [--rows N] [--workers 1 2 4 8] [--file PATH] [--write]
+    """
+    help = 'Benchmark voter CSV ingest throughput for 1, 2, 4 and 8 parser processes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2_000_000,
+                            help='Rows to generate if the benchmark file does not exist (default: 2,000,000)')
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                            help='Worker counts to compare (default: 1 2 4 8)')
+        parser.add_argument('--file', default='benchmark_voters.csv',
+                            help='Benchmark CSV file, generated if missing (default: benchmark_voters.csv)')
+        parser.add_argument('--write', action='store_true',
+                            help='Also write rows to the database (rolled back after each run)')
+
+    def handle(self, *args, **options):
+        filename = options['file']
+        if not os.path.exists(filename):
+            self.stdout.write(f"Generating {options['rows']:,} synthetic voters in {filename}...")
+            started = time.perf_counter()
+            write_voter_csv(filename, options['rows'])
+            self.stdout.write(f"  generated in {time.perf_counter() - started:.1f}s")
+
+        size_mb = os.path.getsize(filename) / (1024 * 1024)
+        # Extra workers can only pay off with spare CPUs, so record how many there were
+        self.stdout.write(f"Benchmarking {filename} ({size_mb:,.0f} MB) on {os.cpu_count()} CPU(s), "
+                          f"{'parse + write' if options['write'] else 'parse only'}")
+        self.stdout.write(f"{'workers':>8} {'rows':>12} {'seconds':>9} {'rows/sec':>12} {'speedup':>8}")
+
+        baseline = None
+        for workers in options['workers']:
+            if workers < 1:
+                raise CommandError('worker counts must be positive integers')
+            stats = self.run(filename, workers, options['write'])
+            baseline = baseline or stats.elapsed
+            self.stdout.write(f"{workers:>8} {stats.rows:>12,} {stats.elapsed:>9.2f} "
+                              f"{stats.rows_per_second:>12,.0f} {baseline / stats.elapsed:>7.2f}x")
+
+    def run(self, filename, workers, write):
+        """Run one timed pass over the file and return its LoadStats."""
+        if write:
+            with transaction.atomic():
+                stats = load_voters(filename, workers=workers)
+                transaction.set_rollback(True)
+            return stats
+
+        stats = LoadStats()
+        for batch in iter_file_batches(filename, stats, workers=workers):
+            stats.loaded += len(batch)
+        stats.finish()
+        return stats
@@ -0,0 +1,306 @@
+# File: voter_analytics/management/commands/benchmark_voters.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that benchmarks voter ingest, list pages, every filter combination and
+#              the graphs on a synthetic dataset, recording timings, query counts and peak memory as JSON
+
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from itertools import combinations
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from voter_analytics.filters import parse_filters
+from voter_analytics.loader import load_voters
+from voter_analytics.models import Voter
+from voter_analytics.pagination import NEXT, PREVIOUS, encode_cursor, voter_key
+from voter_analytics.result_cache import page_cache
+from voter_analytics.snapshot import SNAPSHOT_ORDERING
+from voter_analytics.synthetic import write_voter_csv
+from voter_analytics.views import VoterListView
+
+try:
+    import resource
+except ImportError:  # not available on Windows; ingest memory is then not reported
+    resource = None
+
+
+GROUPS = ['ingest', 'list', 'filters', 'graphs']
+
+# One representative value per filter; the filters group times every combination of them
+BENCHMARK_FILTERS = {
+    'party': {'party_affiliation': 'D '},
+    'min_birth_year': {'min_birth_year': '1960'},
+    'max_birth_year': {'max_birth_year': '1990'},
+    'score': {'voter_score': '3'},
+    'elections': {'v20state': 'on', 'v22general': 'on'},
+    'search': {'q': 'smi'},
+}
+
+# Page numbers the list is timed at (those past the last page are skipped)
+PAGE_DEPTHS = [1, 10, 100, 1000, 10000, 100000]
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts queries without keeping their SQL.
+
+    CaptureQueriesContext stores every statement, which for a multi-million
+    row ingest means gigabytes of bulk INSERT text.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _rss_bytes(who):
+    """Return the peak resident set size of this process or its children, in bytes."""
+    usage = resource.getrusage(who).ru_maxrss
+    return usage if platform.system() == 'Darwin' else usage * 1024
+
+
+class Command(BaseCommand):
+    """
+    Benchmark the voter_analytics pipeline end to end on a synthetic dataset.
+
+    The run happens in a throwaway test database, snapshot directory and
+    in-memory cache, so the real voter data and caches are untouched. The
+    page cache is bypassed, so page timings measure rendering rather than
+    cache hits.
+
+    Groups:
+        ingest --> load_voters on the file, including the derived data rebuilt after it
+        list --> the voter list at increasing page numbers, the same depths by cursor, and the last page
+        filters --> the list and graph data for every combination of BENCHMARK_FILTERS
+        graphs --> the graphs page
+
+    Each page is requested --repeat times; the median, minimum and maximum
+    times, the number of SQL queries and the response size are recorded,
+    and the peak Python memory is measured with tracemalloc on one extra
+    untimed request. Results are written as JSON; --compare prints the
+    change against an earlier results file.
+
+    Usage: python manage.py benchmark_voters [--rows N | --file PATH] [--repeat N] [--only list filters]
+                                             [--output results.json] [--compare old.json]
+    """
+    help = 'Benchmark voter ingest, list pages, filters and graphs on synthetic data and write JSON results.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000,
+                            help='Synthetic voters to generate (default: 100,000)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the synthetic file (default: 0)')
+        parser.add_argument('--file', help='Benchmark this voter CSV file instead of generating one')
+        parser.add_argument('--workers', type=int, default=1, help='Parser processes for the ingest (default: 1)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed requests per page (default: 5)')
+        parser.add_argument('--only', nargs='+', choices=GROUPS, default=GROUPS,
+                            help='Benchmark groups to run (default: all)')
+        parser.add_argument('--output', default='voter_benchmark.json',
+                            help='JSON results file (default: voter_benchmark.json)')
+        parser.add_argument('--compare', metavar='FILE', help='Earlier results file to compare against')
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1 or options['workers'] < 1 or options['rows'] < 1:
+            raise CommandError('--rows, --repeat and --workers must be positive integers')
+        previous = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as file:
+                    previous = json.load(file)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read the comparison file: {e}")
+
+        self.repeat = options['repeat']
+        self.results = {}
+        with tempfile.TemporaryDirectory() as workdir:
+            filename = options['file']
+            if filename is None:
+                filename = os.path.join(workdir, 'voters.csv')
+                self.stdout.write(f"Generating {options['rows']:,} synthetic voters...")
+                write_voter_csv(filename, options['rows'], options['seed'])
+            elif not os.path.exists(filename):
+                raise CommandError(f"{filename} does not exist")
+
+            isolated = override_settings(
+                VOTER_SNAPSHOT_DIR=os.path.join(workdir, 'snapshot'),
+                CACHES={alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+                        for alias in ('default', 'versions')},
+            )
+            with isolated:
+                old_name = connection.settings_dict['NAME']
+                if connection.vendor == 'sqlite':
+                    # A file rather than the in-memory default, so timings include real I/O
+                    connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'benchmark.sqlite3')
+                connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                page_cache.enabled = False
+                try:
+                    self.run_groups(filename, options)
+                finally:
+                    page_cache.enabled = True
+                    connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'file': options['file'] or f"synthetic, {options['rows']} rows, seed {options['seed']}",
+            'voters': self.voters,
+            'repeat': self.repeat,
+            'workers': options['workers'],
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': f'{connection.vendor} {connection.Database.sqlite_version}'
+                            if connection.vendor == 'sqlite' else connection.vendor,
+                'machine': platform.machine(),
+                'cpus': os.cpu_count(),
+            },
+            'results': self.results,
+        }
+        with open(options['output'], 'w') as file:
+            json.dump(report, file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {len(self.results)} results to {options['output']}"))
+
+        if previous is not None:
+            self.compare(previous)
+
+    def run_groups(self, filename, options):
+        """Load the file into the benchmark database (timed if requested) and run the page groups."""
+        self.stdout.write(f"{'benchmark':<58} {'median ms':>10} {'min ms':>9} {'queries':>8} {'peak KB':>9}")
+        if 'ingest' in options['only']:
+            self.bench_ingest(filename, options['workers'])
+        else:
+            load_voters(filename, workers=options['workers'])
+        self.voters = Voter.objects.count()
+
+        client = Client()
+        if 'list' in options['only']:
+            self.bench_list(client)
+        if 'filters' in options['only']:
+            self.bench_filters(client)
+        if 'graphs' in options['only']:
+            self.record('graphs page', self.measure(client, reverse('voter_analytics:graphs')))
+
+    def bench_ingest(self, filename, workers):
+        """Time one full load, counting its queries and reporting the peak resident memory."""
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            stats = load_voters(filename, workers=workers)
+            elapsed = time.perf_counter() - started
+        result = {
+            'median_ms': elapsed * 1000,
+            'min_ms': elapsed * 1000,
+            'max_ms': elapsed * 1000,
+            'queries': counter.count,
+            'rows': stats.rows,
+            'loaded': stats.loaded,
+            'rejected': stats.rejected,
+            'rows_per_second': stats.loaded / elapsed if elapsed else 0,
+        }
+        # tracemalloc would slow the ingest several times over, so report the process high-water mark instead
+        if resource is not None:
+            result['peak_rss_bytes'] = _rss_bytes(resource.RUSAGE_SELF)
+            result['peak_worker_rss_bytes'] = _rss_bytes(resource.RUSAGE_CHILDREN)
+        self.record(f'ingest ({workers} worker{"s" if workers > 1 else ""})', result)
+
+    def bench_list(self, client):
+        """Time the voter list at increasing depths, by page number and by cursor."""
+        url = reverse('voter_analytics:voters')
+        page_size = VoterListView.paginate_by
+        num_pages = max((self.voters + page_size - 1) // page_size, 1)
+        ordered = Voter.objects.order_by(*SNAPSHOT_ORDERING)
+        filters = parse_filters({})
+
+        for number in PAGE_DEPTHS:
+            if number > num_pages:
+                break
+            self.record(f'list page {number}', self.measure(client, f'{url}?page={number}'))
+            if number > 1:
+                # The cursor a reader paging forward would hold on reaching this page
+                previous_voter = ordered[(number - 1) * page_size - 1]
+                cursor = encode_cursor(filters, voter_key(previous_voter), NEXT)
+                self.record(f'list cursor page {number}', self.measure(client, url, {'cursor': cursor}))
+        cursor = encode_cursor(filters, None, PREVIOUS)
+        self.record('list last page (cursor)', self.measure(client, url, {'cursor': cursor}))
+
+    def bench_filters(self, client):
+        """Time the list's first page and the graph data for every combination of the benchmark filters."""
+        names = list(BENCHMARK_FILTERS)
+        for size in range(len(names) + 1):
+            for combination in combinations(names, size):
+                params = {}
+                for name in combination:
+                    params.update(BENCHMARK_FILTERS[name])
+                label = '+'.join(combination) or 'none'
+                self.record(f'filters {label} list', self.measure(client, reverse('voter_analytics:voters'), params))
+                self.record(f'filters {label} graphs.json', self.measure(client, reverse('voter_analytics:graphs_data'), params))
+
+    def measure(self, client, path, params=None):
+        """
+        Request a page repeatedly and summarise the cost.
+
+        Parameters:
+            client --> django.test.Client
+            path --> URL path
+            params --> query parameters
+
+        Returns:
+            dict --> median/min/max milliseconds, queries per request, response bytes and peak traced memory
+        """
+        timings = []
+        for _ in range(self.repeat):
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                started = time.perf_counter()
+                response = client.get(path, params)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{path} {params or ''} returned HTTP {response.status_code}")
+
+        tracemalloc.start()
+        client.get(path, params)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'median_ms': statistics.median(timings),
+            'min_ms': min(timings),
+            'max_ms': max(timings),
+            'queries': counter.count,
+            'response_bytes': len(response.content),
+            'peak_memory_bytes': peak,
+        }
+
+    def record(self, name, result):
+        self.results[name] = result
+        peak = result.get('peak_memory_bytes', result.get('peak_rss_bytes'))
+        peak_kb = f"{peak / 1024:>9,.0f}" if peak is not None else f"{'-':>9}"
+        self.stdout.write(f"{name:<58} {result['median_ms']:>10.1f} {result['min_ms']:>9.1f} "
+                          f"{result['queries']:>8} {peak_kb}")
+
+    def compare(self, previous):
+        """Print the change in median time and queries for every benchmark present in both runs."""
+        self.stdout.write(f"\nCompared with {previous.get('created', 'the earlier run')} "
+                          f"({previous.get('voters', '?')} voters):")
+        self.stdout.write(f"{'benchmark':<58} {'before ms':>10} {'after ms':>9} {'change':>8} {'queries':>9}")
+        for name, result in self.results.items():
+            before = previous.get('results', {}).get(name)
+            if before is None:
+                continue
+            change = result['median_ms'] / before['median_ms'] if before['median_ms'] else float('inf')
+            queries = f"{before['queries']}->{result['queries']}"
+            self.stdout.write(f"{name:<58} {before['median_ms']:>10.1f} {result['median_ms']:>9.1f} "
+                              f"{change:>7.2f}x {queries:>9}")
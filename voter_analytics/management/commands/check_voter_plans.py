@@ -0,0 +1,59 @@
+# File: voter_analytics/management/commands/check_voter_plans.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that checks the query plans of the voter list filters use the expected indexes
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voter_analytics.filters import filter_voters, parse_filters
+from voter_analytics.models import Voter
+
+
+# (description, filter query string, {query kind: expected index}) for the list page queries.
+# 'list' is the first page as rendered (sorted, limited), 'count' is the paginator's count.
+PLAN_CHECKS = [
+    ('unfiltered list page', {}, {'list': 'voter_name_idx'}),
+    ('party filter', {'party_affiliation': 'D '},
+     {'list': 'voter_party_dob_idx', 'count': 'voter_party_dob_idx'}),
+    ('birth year range', {'min_birth_year': '1950', 'max_birth_year': '1970'},
+     {'list': 'voter_dob_idx', 'count': 'voter_dob_idx'}),
+    # An open-ended range may match most voters, so walking the sort index is a fair list plan
+    ('minimum birth year only', {'min_birth_year': '1990'}, {'count': 'voter_dob_idx'}),
+    ('party and birth year range', {'party_affiliation': 'D ', 'min_birth_year': '1950', 'max_birth_year': '1960'},
+     {'list': 'voter_party_dob_idx', 'count': 'voter_party_dob_idx'}),
+    ('voter score', {'voter_score': '3'},
+     {'list': 'voter_score_name_idx', 'count': 'voter_score_name_idx'}),
+    ('election checkboxes', {'v20state': 'on', 'v22general': 'on'}, {'count': 'voter_history_idx'}),
+]
+
+
+class Command(BaseCommand):
+    """
+    EXPLAIN the voter list queries and fail if any of them stops using its index.
+
+    voter_analytics.tests runs the same checks against fixture voters; this
+    command repeats them against a real database (ideally with the full
+    voter file loaded), where the planner's statistics may differ.
+
+    Usage: python manage.py check_voter_plans
+    """
+    help = 'Fail if the voter filter queries no longer use the expected indexes.'
+
+    def handle(self, *args, **options):
+        failures = []
+        for description, params, expected in PLAN_CHECKS:
+            queryset = filter_voters(Voter.objects.all(), parse_filters(params))
+            queries = {'list': queryset[:100], 'count': queryset.order_by()}
+
+            for kind, index in expected.items():
+                plan = queries[kind].explain()
+                if index in plan:
+                    self.stdout.write(f"ok    {description} ({kind}): {index}")
+                else:
+                    failures.append(f"{description} ({kind})")
+                    self.stdout.write(self.style.ERROR(f"FAIL  {description} ({kind}): expected {index}"))
+                    self.stdout.write('      ' + plan.replace('\n', '\n      '))
+
+        if failures:
+            raise CommandError(f"{len(failures)} query plan(s) no longer use their index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All voter query plans use their indexes.'))
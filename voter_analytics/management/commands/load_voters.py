@@ -0,0 +1,80 @@
+# File: voter_analytics/management/commands/load_voters.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that bulk loads a voter CSV file into the Voter table
+
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voter_analytics.loader import DEFAULT_BATCH_SIZE, load_voters, sync_voters
+from voter_analytics.warmup import run_pending_warmups
+
+
+class Command(BaseCommand):
+    """
+    Load a voter CSV file, replacing the current contents of the Voter table,
+    or (with --sync) apply only the differences between the file and the table.
+    Afterwards the popular graph pages are rendered into the shared cache
+    (see warm_voter_dashboards) unless --no-warmup is given.
+
+    Usage: python manage.py load_voters newton_voters.csv [--sync] [--workers N] [--batch-size N] [--rejects FILE]
+                                                          [--no-warmup]
+    """
+    help = 'Bulk load voters from a CSV file, replacing the existing Voter table or syncing it with --sync.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('filename', nargs='?', default='newton_voters.csv',
+                            help='Path to the voter CSV file (default: newton_voters.csv)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help=f'Rows per bulk insert (default: {DEFAULT_BATCH_SIZE})')
+        parser.add_argument('--rejects', metavar='FILE',
+                            help='Write rejected rows (with line number and error) to this CSV file')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Parse the file in this many processes (default: 1, no process pool). '
+                                 'No speedup from more workers has been measured yet, and on a single CPU '
+                                 'they are slower; check with benchmark_ingest on the loading machine first')
+        parser.add_argument('--sync', action='store_true',
+                            help='Match voters on Voter ID Number and only insert, update and delete what changed')
+        parser.add_argument('--no-warmup', action='store_true',
+                            help='Leave the queued graph warm-up job for warm_voter_dashboards to run')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer')
+        if options['workers'] < 1:
+            raise CommandError('--workers must be a positive integer')
+
+        verbosity = options['verbosity']
+
+        def progress(stats):
+            if verbosity > 1:
+                self.stdout.write(f"  {stats.rows:,} rows read ({stats.rows_per_second:,.0f} rows/sec)")
+
+        reject_file = open(options['rejects'], 'w', newline='') if options['rejects'] else None
+        try:
+            rejects = csv.writer(reject_file) if reject_file else None
+            loader = sync_voters if options['sync'] else load_voters
+            stats = loader(options['filename'], options['batch_size'], rejects, progress, options['workers'])
+        except FileNotFoundError as e:
+            raise CommandError(f"Could not open voter file: {e}")
+        finally:
+            if reject_file:
+                reject_file.close()
+
+        for line_number, error in stats.errors:
+            self.stderr.write(f"Rejected line {line_number}: {error}")
+        if stats.rejected > len(stats.errors):
+            self.stderr.write(f"... and {stats.rejected - len(stats.errors)} more rejected rows")
+
+        if options['sync'] and stats.field_changes:
+            changes = ', '.join(f"{name}={count}" for name, count in stats.field_changes.most_common())
+            self.stdout.write(f"Changed fields: {changes}")
+        if options['sync'] and stats.written:
+            self.stdout.write(f"Rollups refreshed for precincts: {', '.join(sorted(stats.precincts))}")
+        self.stdout.write(self.style.SUCCESS(stats.summary()))
+
+        if not options['no_warmup']:
+            job = run_pending_warmups()
+            if job is not None:
+                self.stdout.write(f"Warmed {job.completed}/{job.total} graph pages in {job.get_duration():.1f}s")
@@ -0,0 +1,33 @@
+# File: voter_analytics/management/commands/voter_cache_stats.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that reports hit/miss counters for the rendered voter page cache
+
+from django.core.management.base import BaseCommand
+
+from voter_analytics.result_cache import page_cache
+
+
+class Command(BaseCommand):
+    """
+    Print the voter page cache's hits, misses and evictions summed over all processes.
+
+    Each process adds its counts to the totals every STATS_FLUSH_SECONDS, so
+    the most recent lookups may not be included yet.
+
+    Usage: python manage.py voter_cache_stats [--reset]
+    """
+    help = 'Show hit/miss counters for the voter list and graphs page cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Clear the counters after printing them')
+
+    def handle(self, *args, **options):
+        stats = page_cache.shared_stats()
+        lookups = stats['hits'] + stats['misses']
+        hit_rate = stats['hits'] / lookups * 100 if lookups else 0
+        self.stdout.write(f"Hits: {stats['hits']}  Misses: {stats['misses']}  "
+                          f"Evictions: {stats['evictions']}  Hit rate: {hit_rate:.1f}%")
+        if options['reset']:
+            page_cache.reset_shared_stats()
+            self.stdout.write('Counters reset.')
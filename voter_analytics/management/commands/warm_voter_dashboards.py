@@ -0,0 +1,95 @@
+# File: voter_analytics/management/commands/warm_voter_dashboards.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Management command that runs the queued graph warm-up job and reports warm-up progress and timing
+
+from django.core.management.base import BaseCommand, CommandError
+
+from voter_analytics.models import GraphRequestLog, WarmupJob
+from voter_analytics.snapshot import get_snapshot
+from voter_analytics.versioning import get_data_version
+from voter_analytics.warmup import DEFAULT_TOP, DEFAULT_WORKERS, enqueue_warmup, run_pending_warmups
+
+
+class Command(BaseCommand):
+    """
+    Render the default and most-requested graph pages into the shared cache.
+
+    The loader queues a job after every load; this command runs it (load_voters
+    also runs it straight away unless given --no-warmup). With --force a job
+    is queued for the current data even if none is pending. The columnar
+    snapshot is built first if no snapshot matches the current data. --status
+    shows recent jobs with their progress and timing, and the most-requested
+    filters.
+
+    Usage: python manage.py warm_voter_dashboards [--workers N] [--top N] [--force] [--status]
+    """
+    help = 'Precompute popular voter graph pages into the shared cache, or show warm-up job status.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                            help=f'Pages rendered at once (default: {DEFAULT_WORKERS})')
+        parser.add_argument('--top', type=int, default=DEFAULT_TOP,
+                            help=f'Most-requested filter combinations to warm (default: {DEFAULT_TOP})')
+        parser.add_argument('--force', action='store_true',
+                            help='Queue a job for the current data even if none is pending')
+        parser.add_argument('--status', action='store_true',
+                            help='Show recent warm-up jobs instead of running one')
+
+    def handle(self, *args, **options):
+        if options['status']:
+            self.show_status()
+            return
+        if options['workers'] < 1 or options['top'] < 0:
+            raise CommandError('--workers must be positive and --top must not be negative')
+
+        # Requests never build the snapshot, so make sure one exists before rendering
+        get_snapshot(build=True)
+        if options['force']:
+            enqueue_warmup(get_data_version())
+        job = run_pending_warmups(options['workers'], options['top'], self.progress_callback(options))
+        if job is None:
+            self.stdout.write('No warm-up job is queued for the current data (use --force to run one anyway).')
+            return
+        self.report(job)
+
+    def progress_callback(self, options):
+        """Return a callable printing each finished page at verbosity 2 and above."""
+        if options['verbosity'] < 2:
+            return None
+
+        def progress(job):
+            self.stdout.write(f"  {job.completed + job.failed}/{job.total} pages")
+        return progress
+
+    def report(self, job):
+        """Print the outcome of a job that has just run."""
+        duration = job.get_duration() or 0
+        summary = (f"Warm-up {job.pk} {job.status}: {job.completed}/{job.total} pages "
+                   f"in {duration:.1f}s with {job.failed} failures")
+        style = self.style.SUCCESS if job.status == WarmupJob.DONE else self.style.WARNING
+        self.stdout.write(style(summary))
+        for label, milliseconds in job.timings[:5]:
+            self.stdout.write(f"  {milliseconds:>9.1f} ms  {label}")
+        if job.error:
+            self.stderr.write(job.error.rstrip())
+
+    def show_status(self):
+        """Print the most recent jobs and the most-requested graph filters."""
+        version = get_data_version()
+        self.stdout.write(f"{'job':>5} {'status':<11} {'pages':>9} {'failed':>7} {'started':<20} "
+                          f"{'seconds':>8} {'ms/page':>8}  data")
+        for job in WarmupJob.objects.all()[:10]:
+            duration = job.get_duration()
+            done = job.completed + job.failed
+            started = job.started.strftime('%Y-%m-%d %H:%M:%S') if job.started else '-'
+            seconds = f"{duration:.1f}" if duration is not None else '-'
+            per_page = f"{duration * 1000 / done:.0f}" if duration and done else '-'
+            current = 'current' if job.data_version == version else 'old'
+            self.stdout.write(f"{job.pk:>5} {job.status:<11} {f'{done}/{job.total}':>9} {job.failed:>7} "
+                              f"{started:<20} {seconds:>8} {per_page:>8}  {current}")
+
+        self.stdout.write('\nMost-requested graph filters:')
+        for entry in GraphRequestLog.objects.all()[:DEFAULT_TOP]:
+            active = {name: value for name, value in entry.filters.items() if value not in (None, [])}
+            self.stdout.write(f"  {entry.requests:>7}  {active or '(no filters)'}")
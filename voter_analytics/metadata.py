@@ -0,0 +1,76 @@
+# File: voter_analytics/metadata.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Cached metadata (parties, birth-year bounds, score range) used to draw the voter filter forms
+
+from django.core.cache import cache
+from django.db.models import Max, Min
+
+from .models import Voter
+from .versioning import get_data_version
+
+
+FILTER_METADATA_KEY = 'voter_analytics:filter_metadata'
+
+# Used when there are no voters loaded
+DEFAULT_BIRTH_YEARS = (1900, 2024)
+DEFAULT_SCORES = (0, 5)
+
+
+def compute_filter_metadata():
+    """
+    Query the Voter table for the values the filter dropdowns offer.
+
+    Returns:
+        dict --> 'parties' (sorted list), 'min_birth_year', 'max_birth_year',
+                 'min_score', 'max_score'
+    """
+    bounds = Voter.objects.aggregate(
+        first_birth=Min('date_of_birth'),
+        last_birth=Max('date_of_birth'),
+        min_score=Min('voter_score'),
+        max_score=Max('voter_score'),
+    )
+    parties = list(Voter.objects.order_by('party_affiliation')
+                   .values_list('party_affiliation', flat=True).distinct())
+
+    if bounds['first_birth'] is None:
+        min_year, max_year = DEFAULT_BIRTH_YEARS
+        min_score, max_score = DEFAULT_SCORES
+    else:
+        min_year, max_year = bounds['first_birth'].year, bounds['last_birth'].year
+        min_score, max_score = bounds['min_score'], bounds['max_score']
+
+    return {
+        'parties': parties,
+        'min_birth_year': min_year,
+        'max_birth_year': max_year,
+        'min_score': min_score,
+        'max_score': max_score,
+    }
+
+
+def get_filter_metadata(version=None):
+    """
+    Return the filter metadata for the current voter data.
+
+    The metadata is computed once per data version and kept in the shared
+    cache, so every process serves the filter forms without any queries
+    until the loader changes the data.
+
+    Parameters:
+        version --> data version to use (defaults to the current one)
+
+    Returns:
+        dict --> see compute_filter_metadata
+    """
+    if version is None:
+        version = get_data_version()
+
+    cached = cache.get(FILTER_METADATA_KEY)
+    if cached is not None and cached['version'] == version:
+        return cached['metadata']
+
+    metadata = compute_filter_metadata()
+    cache.set(FILTER_METADATA_KEY, {'version': version, 'metadata': metadata}, timeout=None)
+    return metadata
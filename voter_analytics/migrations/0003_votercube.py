@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:06
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractYear
+
+
+def build_cube(apps, schema_editor):
+    """Populate the cube from voters loaded before it existed."""
+    Voter = apps.get_model('voter_analytics', 'Voter')
+    VoterCube = apps.get_model('voter_analytics', 'VoterCube')
+    dimensions = ['party_affiliation', 'birth_year', 'voter_score',
+                  'v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
+    cells = (Voter.objects.order_by()
+             .annotate(birth_year=ExtractYear('date_of_birth'))
+             .values(*dimensions)
+             .annotate(num_voters=Count('id')))
+    VoterCube.objects.bulk_create((VoterCube(**cell) for cell in cells.iterator()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voter_analytics', '0002_voter_voter_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoterCube',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('party_affiliation', models.CharField(max_length=2)),
+                ('birth_year', models.IntegerField()),
+                ('voter_score', models.IntegerField()),
+                ('v20state', models.BooleanField()),
+                ('v21town', models.BooleanField()),
+                ('v21primary', models.BooleanField()),
+                ('v22general', models.BooleanField()),
+                ('v23town', models.BooleanField()),
+                ('num_voters', models.IntegerField()),
+            ],
+        ),
+        migrations.RunPython(build_cube, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,75 @@
+# Full-text search index over voter names and streets (SQLite FTS5)
+
+from django.db import migrations
+
+
+# External-content FTS5 table: it stores only the index and reads column
+# values from voter_analytics_voter; triggers keep it in step with the table.
+# Prefix indexes make "smi*"-style queries as fast as whole-word ones.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE voter_search USING fts5(
+        last_name, first_name, street_name, street_number,
+        content='voter_analytics_voter', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    # Rank matches by BM25, weighting names above the street
+    "INSERT INTO voter_search(voter_search, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 1.0)')",
+    """
+    CREATE TRIGGER voter_search_insert AFTER INSERT ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(rowid, last_name, first_name, street_name, street_number)
+        VALUES (new.id, new.last_name, new.first_name, new.street_name, new.street_number);
+    END
+    """,
+    """
+    CREATE TRIGGER voter_search_delete AFTER DELETE ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(voter_search, rowid, last_name, first_name, street_name, street_number)
+        VALUES ('delete', old.id, old.last_name, old.first_name, old.street_name, old.street_number);
+    END
+    """,
+    """
+    CREATE TRIGGER voter_search_update AFTER UPDATE OF last_name, first_name, street_name, street_number
+    ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(voter_search, rowid, last_name, first_name, street_name, street_number)
+        VALUES ('delete', old.id, old.last_name, old.first_name, old.street_name, old.street_number);
+        INSERT INTO voter_search(rowid, last_name, first_name, street_name, street_number)
+        VALUES (new.id, new.last_name, new.first_name, new.street_name, new.street_number);
+    END
+    """,
+    # Index voters loaded before the table existed
+    "INSERT INTO voter_search(voter_search) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS voter_search_insert',
+    'DROP TRIGGER IF EXISTS voter_search_delete',
+    'DROP TRIGGER IF EXISTS voter_search_update',
+    'DROP TABLE IF EXISTS voter_search',
+]
+
+
+def create_search_index(apps, schema_editor):
+    """Create the FTS5 index; other databases fall back to LIKE searches."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voter_analytics', '0004_voter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:18
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+ELECTION_FIELDS = ['v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
+
+
+def build_rollups(apps, schema_editor):
+    """Populate the rollups from voters loaded before they existed."""
+    Voter = apps.get_model('voter_analytics', 'Voter')
+    PrecinctRollup = apps.get_model('voter_analytics', 'PrecinctRollup')
+    StreetRollup = apps.get_model('voter_analytics', 'StreetRollup')
+
+    def new_totals():
+        return {'num_voters': 0, 'party_counts': defaultdict(int), 'score_total': 0,
+                **{field: 0 for field in ELECTION_FIELDS}}
+
+    groups = (Voter.objects.order_by()
+              .values('precinct_number', 'street_name', 'party_affiliation')
+              .annotate(num_voters=Count('id'), score_total=Sum('voter_score'),
+                        **{field: Count('id', filter=Q(**{field: True})) for field in ELECTION_FIELDS}))
+    by_precinct = defaultdict(new_totals)
+    by_street = defaultdict(new_totals)
+    for group in groups.iterator():
+        for totals in (by_precinct[group['precinct_number']],
+                       by_street[group['precinct_number'], group['street_name']]):
+            totals['num_voters'] += group['num_voters']
+            totals['party_counts'][group['party_affiliation']] += group['num_voters']
+            totals['score_total'] += group['score_total']
+            for field in ELECTION_FIELDS:
+                totals[field] += group[field]
+
+    def fields(totals):
+        return {
+            'num_voters': totals['num_voters'],
+            'party_counts': dict(totals['party_counts']),
+            'avg_voter_score': totals['score_total'] / totals['num_voters'],
+            **{field: totals[field] for field in ELECTION_FIELDS},
+        }
+
+    PrecinctRollup.objects.bulk_create(
+        PrecinctRollup(precinct_number=precinct, **fields(totals)) for precinct, totals in by_precinct.items())
+    StreetRollup.objects.bulk_create(
+        (StreetRollup(precinct_number=precinct, street_name=street, **fields(totals))
+         for (precinct, street), totals in by_street.items()), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voter_analytics', '0005_voter_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PrecinctRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_voters', models.IntegerField()),
+                ('party_counts', models.JSONField(default=dict)),
+                ('avg_voter_score', models.FloatField()),
+                ('v20state', models.IntegerField()),
+                ('v21town', models.IntegerField()),
+                ('v21primary', models.IntegerField()),
+                ('v22general', models.IntegerField()),
+                ('v23town', models.IntegerField()),
+                ('precinct_number', models.CharField(max_length=10, unique=True)),
+            ],
+            options={
+                'ordering': ['precinct_number'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StreetRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('num_voters', models.IntegerField()),
+                ('party_counts', models.JSONField(default=dict)),
+                ('avg_voter_score', models.FloatField()),
+                ('v20state', models.IntegerField()),
+                ('v21town', models.IntegerField()),
+                ('v21primary', models.IntegerField()),
+                ('v22general', models.IntegerField()),
+                ('v23town', models.IntegerField()),
+                ('precinct_number', models.CharField(max_length=10)),
+                ('street_name', models.CharField(max_length=100)),
+            ],
+            options={
+                'ordering': ['precinct_number', 'street_name'],
+                'constraints': [models.UniqueConstraint(fields=('precinct_number', 'street_name'), name='street_rollup_unique')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,149 @@
+# Pack the five election booleans into one voting_history bitmask and derive voter_score from it
+
+from django.db import migrations, models
+from django.db.models import Case, Count, F, IntegerField, Value, When
+from django.db.models.functions import Cast, ExtractYear
+
+import voter_analytics.fields
+
+
+ELECTION_FIELDS = ['v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
+
+# The search index triggers from 0005_voter_search, which SQLite drops when Django rebuilds the voter table
+SEARCH_TRIGGER_SQL = [
+    'DROP TRIGGER IF EXISTS voter_search_insert',
+    'DROP TRIGGER IF EXISTS voter_search_delete',
+    'DROP TRIGGER IF EXISTS voter_search_update',
+    """
+    CREATE TRIGGER voter_search_insert AFTER INSERT ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(rowid, last_name, first_name, street_name, street_number)
+        VALUES (new.id, new.last_name, new.first_name, new.street_name, new.street_number);
+    END
+    """,
+    """
+    CREATE TRIGGER voter_search_delete AFTER DELETE ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(voter_search, rowid, last_name, first_name, street_name, street_number)
+        VALUES ('delete', old.id, old.last_name, old.first_name, old.street_name, old.street_number);
+    END
+    """,
+    """
+    CREATE TRIGGER voter_search_update AFTER UPDATE OF last_name, first_name, street_name, street_number
+    ON voter_analytics_voter BEGIN
+        INSERT INTO voter_search(voter_search, rowid, last_name, first_name, street_name, street_number)
+        VALUES ('delete', old.id, old.last_name, old.first_name, old.street_name, old.street_number);
+        INSERT INTO voter_search(rowid, last_name, first_name, street_name, street_number)
+        VALUES (new.id, new.last_name, new.first_name, new.street_name, new.street_number);
+    END
+    """,
+]
+
+
+def voter_score_expression():
+    return (F('voting_history').bitrightshift(0).bitand(1) + F('voting_history').bitrightshift(1).bitand(1) +
+            F('voting_history').bitrightshift(2).bitand(1) + F('voting_history').bitrightshift(3).bitand(1) +
+            F('voting_history').bitrightshift(4).bitand(1))
+
+
+def pack_history(apps, schema_editor):
+    """Set voting_history from the election booleans in one UPDATE."""
+    Voter = apps.get_model('voter_analytics', 'Voter')
+    history = sum(Cast(F(field), IntegerField()) * (1 << index) for index, field in enumerate(ELECTION_FIELDS))
+    Voter.objects.update(voting_history=history)
+
+
+def unpack_history(apps, schema_editor):
+    """Set the election booleans and voter_score back from voting_history."""
+    Voter = apps.get_model('voter_analytics', 'Voter')
+    Voter.objects.update(
+        voter_score=voter_score_expression(),
+        **{field: Case(When(voting_history__hasall=1 << index, then=Value(True)), default=Value(False))
+           for index, field in enumerate(ELECTION_FIELDS)}
+    )
+
+
+def rebuild_cube(apps, schema_editor):
+    """Refill the cube on its new (party, birth year, voting history) dimensions."""
+    Voter = apps.get_model('voter_analytics', 'Voter')
+    VoterCube = apps.get_model('voter_analytics', 'VoterCube')
+    cells = (Voter.objects.order_by()
+             .annotate(birth_year=ExtractYear('date_of_birth'))
+             .values('party_affiliation', 'birth_year', 'voting_history')
+             .annotate(num_voters=Count('id')))
+    VoterCube.objects.all().delete()
+    VoterCube.objects.bulk_create((VoterCube(**cell) for cell in cells.iterator()), batch_size=1000)
+
+
+def clear_cube(apps, schema_editor):
+    """Empty the cube so its old columns can be restored; the loader rebuilds it."""
+    apps.get_model('voter_analytics', 'VoterCube').objects.all().delete()
+
+
+def recreate_search_triggers(apps, schema_editor):
+    """SQLite drops a table's triggers when Django rebuilds it, so put the search triggers back."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in SEARCH_TRIGGER_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voter_analytics', '0006_rollups'),
+    ]
+
+    operations = [
+        # Runs last when unapplying, after the voter table has been rebuilt
+        migrations.RunPython(migrations.RunPython.noop, recreate_search_triggers),
+        migrations.AddField(
+            model_name='voter',
+            name='voting_history',
+            field=voter_analytics.fields.VotingHistoryField(default=0),
+        ),
+        migrations.RunPython(pack_history, unpack_history),
+        migrations.RemoveIndex(
+            model_name='voter',
+            name='voter_score_name_idx',
+        ),
+        migrations.RemoveField(model_name='voter', name='voter_score'),
+        migrations.RemoveField(model_name='voter', name='v20state'),
+        migrations.RemoveField(model_name='voter', name='v21town'),
+        migrations.RemoveField(model_name='voter', name='v21primary'),
+        migrations.RemoveField(model_name='voter', name='v22general'),
+        migrations.RemoveField(model_name='voter', name='v23town'),
+        migrations.AddField(
+            model_name='voter',
+            name='voter_score',
+            field=models.GeneratedField(db_persist=True, expression=voter_score_expression(),
+                                        output_field=models.IntegerField()),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['voter_score', 'last_name', 'first_name', 'id'], name='voter_score_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voter',
+            index=models.Index(fields=['voting_history'], name='voter_history_idx'),
+        ),
+        migrations.RunPython(recreate_search_triggers, migrations.RunPython.noop),
+
+        migrations.RemoveField(model_name='votercube', name='voter_score'),
+        migrations.RemoveField(model_name='votercube', name='v20state'),
+        migrations.RemoveField(model_name='votercube', name='v21town'),
+        migrations.RemoveField(model_name='votercube', name='v21primary'),
+        migrations.RemoveField(model_name='votercube', name='v22general'),
+        migrations.RemoveField(model_name='votercube', name='v23town'),
+        migrations.AddField(
+            model_name='votercube',
+            name='voting_history',
+            field=voter_analytics.fields.VotingHistoryField(default=0),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='votercube',
+            name='voter_score',
+            field=models.GeneratedField(db_persist=True, expression=voter_score_expression(),
+                                        output_field=models.IntegerField()),
+        ),
+        migrations.RunPython(rebuild_cube, clear_cube),
+    ]
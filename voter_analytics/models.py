@@ -4,7 +4,10 @@
 # Description: Models for voter analytics application with voter model and data loading function 
 
 from django.db import models
+from django.utils import timezone
 from datetime import datetime
+from .fields import VotingHistoryField, election_property, voter_score_expression
+from .parsing import ELECTION_FIELDS
 # Create your models here.
 
 class Voter(models.Model):
@@ -14,6 +17,9 @@ class Voter(models.Model):
     Fields store voter identification, address, registration details,
     and voting history across recent elections.
     """
+    # Natural key from the state voter file, used to sync refreshed files
+    voter_id = models.CharField(max_length=20, unique=True, blank=True, null=True)
+    
     # Personal Information
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
@@ -30,13 +36,19 @@ class Voter(models.Model):
     party_affiliation = models.CharField(max_length=2)
     precinct_number = models.CharField(max_length=10)
     
-    # Voting History
-    v20state = models.BooleanField(default=False)
-    v21town = models.BooleanField(default=False)
-    v21primary = models.BooleanField(default=False)
-    v22general = models.BooleanField(default=False)
-    v23town = models.BooleanField(default=False)
-    voter_score = models.IntegerField(default=0)
+    # Voting History: one bit per election, and the number of elections voted in
+    voting_history = VotingHistoryField(default=0)
+    voter_score = models.GeneratedField(
+        expression=voter_score_expression(),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    
+    v20state = election_property('v20state')
+    v21town = election_property('v21town')
+    v21primary = election_property('v21primary')
+    v22general = election_property('v22general')
+    v23town = election_property('v23town')
     
     def __str__(self):
         """
@@ -48,53 +60,230 @@ class Voter(models.Model):
         return f"{self.first_name} {self.last_name} - {self.street_number} {self.street_name}"
     
     class Meta:
-        ordering = ['last_name', 'first_name']
+        ordering = ['last_name', 'first_name', 'id']
+        indexes = [
+            # List view sort order (and keyset position)
+            models.Index(fields=['last_name', 'first_name', 'id'], name='voter_name_idx'),
+            # Party and birth-year filters, alone or together
+            models.Index(fields=['party_affiliation', 'date_of_birth'], name='voter_party_dob_idx'),
+            models.Index(fields=['date_of_birth'], name='voter_dob_idx'),
+            # Score filter, already in list order
+            models.Index(fields=['voter_score', 'last_name', 'first_name', 'id'], name='voter_score_name_idx'),
+            # Election filters (hasall/hasany become an IN list over this column)
+            models.Index(fields=['voting_history'], name='voter_history_idx'),
+        ]
+
+
+class VoterCube(models.Model):
+    """
+    Materialised count of voters for every combination of the graph filter dimensions.
+    
+    One row per (party, birth year, voting history) combination that
+    occurs in the Voter table. Rebuilt by the loader in the same transaction
+    as the voter data, so it is always consistent with it.
+    """
+    party_affiliation = models.CharField(max_length=2)
+    birth_year = models.IntegerField()
+    voting_history = VotingHistoryField()
+    voter_score = models.GeneratedField(
+        expression=voter_score_expression(),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
+    num_voters = models.IntegerField()
+    
+    def __str__(self):
+        """
+        String representation of a VoterCube cell.
+        
+        Returns:
+            str: The cell's party, birth year, score and voter count
+        """
+        return f"{self.party_affiliation.strip()} {self.birth_year} score {self.voter_score}: {self.num_voters} voters"
+
+
+class Rollup(models.Model):
+    """
+    Voter counts, party breakdown, average score and turnout for a group of voters.
+    
+    Abstract base of the precinct and street rollups, which the loader
+    keeps up to date (see voter_analytics.rollups).
+    """
+    num_voters = models.IntegerField()
+    # Party affiliation -> number of voters
+    party_counts = models.JSONField(default=dict)
+    avg_voter_score = models.FloatField()
+    
+    # Number of voters who voted in each election
+    v20state = models.IntegerField()
+    v21town = models.IntegerField()
+    v21primary = models.IntegerField()
+    v22general = models.IntegerField()
+    v23town = models.IntegerField()
+    
+    class Meta:
+        abstract = True
+    
+    def get_turnout(self):
+        """
+        Get turnout for every election.
+        
+        Returns:
+            list: (election field, voters who voted, percentage of num_voters) tuples
+        """
+        return [(field, getattr(self, field), 100 * getattr(self, field) / self.num_voters if self.num_voters else 0)
+                for field in ELECTION_FIELDS]
+    
+    def get_party_counts(self):
+        """
+        Get the party breakdown, largest party first.
+        
+        Returns:
+            list: (party, number of voters) tuples
+        """
+        return sorted(self.party_counts.items(), key=lambda item: (-item[1], item[0]))
+
+
+class PrecinctRollup(Rollup):
+    """
+    Summary of the voters in one precinct.
+    """
+    precinct_number = models.CharField(max_length=10, unique=True)
+    
+    def __str__(self):
+        """
+        String representation of a PrecinctRollup.
+        
+        Returns:
+            str: The precinct and its number of voters
+        """
+        return f"Precinct {self.precinct_number}: {self.num_voters} voters"
+    
+    class Meta:
+        ordering = ['precinct_number']
+
+
+class StreetRollup(Rollup):
+    """
+    Summary of the voters on one street within a precinct.
+    
+    Streets that cross a precinct boundary have one row per precinct, so a
+    precinct's streets can be refreshed on their own.
+    """
+    precinct_number = models.CharField(max_length=10)
+    street_name = models.CharField(max_length=100)
+    
+    def __str__(self):
+        """
+        String representation of a StreetRollup.
+        
+        Returns:
+            str: The street, its precinct and its number of voters
+        """
+        return f"{self.street_name} (precinct {self.precinct_number}): {self.num_voters} voters"
+    
+    class Meta:
+        ordering = ['precinct_number', 'street_name']
+        constraints = [
+            models.UniqueConstraint(fields=['precinct_number', 'street_name'], name='street_rollup_unique'),
+        ]
 
 
 def load_data():
     """
     Load voter data from newton_voters.csv file into the database.
     
-    This function reads the CSV file, creates Voter objects for each row,
-    and saves them to the database. It skips the header row and handles
-    data type conversions for dates and boolean values.
+    This function replaces the existing Voter records with the rows of the
+    CSV file. Rows are streamed and written in batches inside a single
+    transaction (see voter_analytics.loader and the load_voters command).
+    """
+    from .loader import load_voters
+    
+    stats = load_voters('newton_voters.csv')
+    
+    print(f"Successfully loaded {stats.loaded} voters ({stats.rejected} rows rejected).")
+
+
+class GraphRequestLog(models.Model):
+    """
+    How often one set of graph filters has been requested.
+    
+    The graphs page and its JSON endpoint count every request, cached or
+    not, and periodically add the counts here (see warmup.flush_graph_requests),
+    so the warm-up job knows which dashboards to prepare after a load.
+    """
+    # voter_analytics.filters.filters_key of the filters
+    filters_key = models.CharField(max_length=40, unique=True)
+    filters = models.JSONField()
+    requests = models.PositiveIntegerField(default=0)
+    last_requested = models.DateTimeField()
+    
+    def __str__(self):
+        """
+        String representation of a GraphRequestLog entry.
+        
+        Returns:
+            str: The filters and how often they were requested
+        """
+        return f"{self.filters}: {self.requests} requests"
+    
+    class Meta:
+        ordering = ['-requests', '-last_requested']
+
+
+class WarmupJob(models.Model):
+    """
+    Precomputation of the popular graph pages for one version of the voter data.
+    
+    The loader queues a job after every committed load or sync, and
+    voter_analytics.warmup renders the pages into the shared cache.
     """
-    import csv
-    from datetime import datetime
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    SUPERSEDED = 'superseded'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (SUPERSEDED, 'Superseded by a newer load'),
+    ]
     
-    # Delete existing records to avoid duplicates
-    Voter.objects.all().delete()
+    data_version = models.CharField(max_length=32)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    # Pages to render, pages rendered, and pages whose rendering raised an error
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    # [page label, milliseconds] for every rendered page, slowest first
+    timings = models.JSONField(default=list)
+    error = models.TextField(blank=True)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
     
-    filename = 'newton_voters.csv'
+    def __str__(self):
+        """
+        String representation of a WarmupJob.
+        
+        Returns:
+            str: The job, its status and progress
+        """
+        return f"Warm-up {self.pk} ({self.status}): {self.completed}/{self.total} pages"
     
-    with open(filename, 'r') as file:
-        reader = csv.DictReader(file)
+    def get_duration(self):
+        """
+        Get how long the job ran, or has been running.
         
-        for row in reader:
-            try:
-                # Create a new Voter object
-                voter = Voter(
-                    first_name=row['First Name'].strip(),
-                    last_name=row['Last Name'].strip(),
-                    street_number=row['Residential Address - Street Number'].strip(),
-                    street_name=row['Residential Address - Street Name'].strip(),
-                    apartment_number=row['Residential Address - Apartment Number'].strip() if row['Residential Address - Apartment Number'].strip() else None,
-                    zip_code=row['Residential Address - Zip Code'].strip(),
-                    date_of_birth=datetime.strptime(row['Date of Birth'], '%Y-%m-%d').date(),
-                    date_of_registration=datetime.strptime(row['Date of Registration'], '%Y-%m-%d').date(),
-                    party_affiliation=row['Party Affiliation'],  # Keep as-is (2 chars with potential trailing space)
-                    precinct_number=row['Precinct Number'].strip(),
-                    v20state=row['v20state'].strip().upper() == 'TRUE',
-                    v21town=row['v21town'].strip().upper() == 'TRUE',
-                    v21primary=row['v21primary'].strip().upper() == 'TRUE',
-                    v22general=row['v22general'].strip().upper() == 'TRUE',
-                    v23town=row['v23town'].strip().upper() == 'TRUE',
-                    voter_score=int(row['voter_score'])
-                )
-                voter.save()
-                
-            except Exception as e:
-                print(f"Error processing row: {e}")
-                continue
-    
-    print(f"Successfully loaded {Voter.objects.count()} voters.")
\ No newline at end of file
+        Returns:
+            float or None: Seconds, or None if the job has not started
+        """
+        if self.started is None:
+            return None
+        end = self.finished or timezone.now()
+        return (end - self.started).total_seconds()
+    
+    class Meta:
+        ordering = ['-created']
@@ -0,0 +1,139 @@
+# File: voter_analytics/pagination.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Keyset (seek) pagination for the voter list, with opaque cursor tokens and cached totals
+
+from django.core import signing
+from django.core.cache import cache
+from django.db.models import Q
+
+from .filters import filters_key
+from .snapshot import get_snapshot, snapshot_supports
+from .versioning import get_data_version
+
+
+CURSOR_SALT = 'voter_analytics.cursor'
+
+# Cursor directions: rows after the key, or rows before it
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(filters, key, direction):
+    """
+    Build an opaque, tamper-proof cursor token.
+
+    Parameters:
+        filters --> dict from voter_analytics.filters.parse_filters
+        key --> (last_name, first_name, id) of the voter to seek from, or None for an end of the list
+        direction --> NEXT for the rows after key, PREVIOUS for the rows before it
+
+    Returns:
+        str --> URL-safe token
+    """
+    return signing.dumps({'f': filters, 'k': key, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    """
+    Read a cursor token built by encode_cursor.
+
+    Returns:
+        dict or None --> 'filters', 'key' and 'direction', or None if the token is invalid
+    """
+    try:
+        payload = signing.loads(token, salt=CURSOR_SALT)
+        # Cursors issued before the search filter existed have no 'search' entry
+        filters = {'search': None, **payload['f']}
+        return {'filters': filters, 'key': payload['k'], 'direction': payload['d']}
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def voter_key(voter):
+    """Return the sort key of a voter as stored in a cursor."""
+    return [voter.last_name, voter.first_name, voter.pk]
+
+
+def seek(queryset, key, direction):
+    """
+    Restrict a QuerySet to the voters strictly after (or before) a sort key.
+
+    The leading last_name range is redundant with the OR below but lets the
+    database seek straight into the (last_name, first_name, id) index.
+    """
+    last_name, first_name, pk = key
+    if direction == NEXT:
+        return queryset.filter(
+            Q(last_name__gte=last_name),
+            Q(last_name__gt=last_name) | Q(last_name=last_name, first_name__gt=first_name) |
+            Q(last_name=last_name, first_name=first_name, id__gt=pk)
+        )
+    return queryset.filter(
+        Q(last_name__lte=last_name),
+        Q(last_name__lt=last_name) | Q(last_name=last_name, first_name__lt=first_name) |
+        Q(last_name=last_name, first_name=first_name, id__lt=pk)
+    )
+
+
+class KeysetPage:
+    """
+    One page of voters fetched by seeking from a cursor instead of an OFFSET.
+
+    Costs the same however deep into the list it is, because the database
+    starts reading at the cursor's position in the sort index.
+    """
+
+    def __init__(self, queryset, cursor, page_size):
+        self.filters = cursor['filters']
+        direction = cursor['direction']
+        key = cursor['key']
+
+        if direction == NEXT:
+            ordered = queryset.order_by('last_name', 'first_name', 'id')
+        else:
+            ordered = queryset.order_by('-last_name', '-first_name', '-id')
+        if key is not None:
+            ordered = seek(ordered, key, direction)
+
+        # One extra row tells us whether there is another page in this direction
+        rows = list(ordered[:page_size + 1])
+        more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if direction == NEXT:
+            self.object_list = rows
+            self.has_next = more
+            self.has_previous = key is not None
+        else:
+            self.object_list = rows[::-1]
+            self.has_previous = more
+            self.has_next = key is not None
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def next_cursor(self):
+        return encode_cursor(self.filters, voter_key(self.object_list[-1]), NEXT) if self.object_list else None
+
+    def previous_cursor(self):
+        return encode_cursor(self.filters, voter_key(self.object_list[0]), PREVIOUS) if self.object_list else None
+
+
+def total_count(queryset, filters):
+    """
+    Return the number of voters matching the filters without recounting on every page.
+
+    Counts come straight from the snapshot's bitmap index when it can answer
+    the filters, and otherwise from a COUNT(*) cached for the current data version.
+
+    Parameters:
+        queryset --> filtered QuerySet of voters
+        filters --> the dict from parse_filters that produced queryset
+    """
+    snapshot = get_snapshot()
+    if snapshot is not None and snapshot_supports(filters):
+        return snapshot.count(filters)
+
+    key = f"voter_analytics:count:{get_data_version()}:{filters_key(filters)}"
+    return cache.get_or_set(key, lambda: queryset.order_by().count(), timeout=24 * 60 * 60)
@@ -0,0 +1,165 @@
+# File: voter_analytics/parsing.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Django-free voter CSV parsing, including the byte-range chunking used by the
+#              multi-process loader (worker processes import only this module)
+
+import csv
+import io
+import os
+from datetime import date
+
+
+# Boolean election columns, in the order they appear in the CSV file
+ELECTION_FIELDS = ['v20state', 'v21town', 'v21primary', 'v22general', 'v23town']
+
+# Bit for each election in a packed voting history; add new elections at the end
+ELECTION_BITS = {field: 1 << index for index, field in enumerate(ELECTION_FIELDS)}
+
+# Errors that mean a row is malformed rather than that the loader is broken
+ROW_ERRORS = (KeyError, ValueError, TypeError, AttributeError)
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+# Field order of the compact tuples that worker processes send back (see pack_row)
+VOTER_FIELDS = [
+    'voter_id', 'first_name', 'last_name', 'street_number', 'street_name', 'apartment_number',
+    'zip_code', 'date_of_birth', 'date_of_registration', 'party_affiliation', 'precinct_number',
+    'voting_history',
+]
+DATE_FIELDS = ['date_of_birth', 'date_of_registration']
+
+
+def election_mask(fields):
+    """
+    Pack a list of election field names into a voting history bitmask.
+
+    Parameters:
+        fields --> iterable of names from ELECTION_FIELDS
+    """
+    mask = 0
+    for field in fields:
+        mask |= ELECTION_BITS[field]
+    return mask
+
+
+def parse_voter_row(row):
+    """
+    Convert one CSV row into a dictionary of Voter field values.
+
+    Parameters:
+        row --> dict of column name to raw string value (from csv.DictReader)
+
+    The election columns are packed into voting_history; the file's
+    voter_score column is not read, since the score is derived from them.
+
+    Returns:
+        dict --> Keyword arguments suitable for Voter(**fields)
+
+    Raises:
+        KeyError, ValueError --> if a column is missing or cannot be converted
+    """
+    apartment = row['Residential Address - Apartment Number'].strip()
+    voter_id = (row.get('Voter ID Number') or '').strip()
+    fields = {
+        'voter_id': voter_id or None,
+        'first_name': row['First Name'].strip(),
+        'last_name': row['Last Name'].strip(),
+        'street_number': row['Residential Address - Street Number'].strip(),
+        'street_name': row['Residential Address - Street Name'].strip(),
+        'apartment_number': apartment or None,
+        'zip_code': row['Residential Address - Zip Code'].strip(),
+        'date_of_birth': date.fromisoformat(row['Date of Birth'].strip()),
+        'date_of_registration': date.fromisoformat(row['Date of Registration'].strip()),
+        'party_affiliation': row['Party Affiliation'],  # Keep as-is (2 chars with potential trailing space)
+        'precinct_number': row['Precinct Number'].strip(),
+        'voting_history': election_mask(field for field in ELECTION_FIELDS
+                                        if row[field].strip().upper() == 'TRUE'),
+    }
+    return fields
+
+
+def pack_row(fields):
+    """
+    Turn a parsed row into a compact tuple for sending between processes.
+
+    Pickling date objects costs as much as parsing them, so dates travel
+    as proleptic ordinals and are rebuilt by unpack_row.
+    """
+    values = [fields[name] for name in VOTER_FIELDS]
+    for index in _DATE_INDEXES:
+        values[index] = values[index].toordinal()
+    return tuple(values)
+
+
+def unpack_row(values):
+    """Rebuild the field dictionary produced by parse_voter_row from a pack_row tuple."""
+    fields = dict(zip(VOTER_FIELDS, values))
+    for name in DATE_FIELDS:
+        fields[name] = date.fromordinal(fields[name])
+    return fields
+
+
+_DATE_INDEXES = [VOTER_FIELDS.index(name) for name in DATE_FIELDS]
+
+
+def split_byte_ranges(filename, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Split a CSV file into byte ranges that each start and end on a line boundary.
+
+    The voter file never has quoted newlines inside a field, so every line
+    is a complete row and the ranges can be parsed independently.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        chunk_bytes --> approximate size of each range
+
+    Returns:
+        tuple --> (list of header column names, list of (start, end) byte offsets)
+    """
+    size = os.path.getsize(filename)
+    with open(filename, 'rb') as file:
+        header = file.readline()
+        fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+
+        ranges = []
+        start = file.tell()
+        while start < size:
+            file.seek(min(start + chunk_bytes, size))
+            file.readline()  # advance to the start of the next line
+            end = min(file.tell(), size)
+            ranges.append((start, end))
+            start = end
+    return fieldnames, ranges
+
+
+def parse_byte_range(filename, fieldnames, start, end):
+    """
+    Parse and validate the rows in one byte range of a voter CSV file.
+
+    This runs in a worker process, so it only returns plain picklable data.
+
+    Parameters:
+        filename --> path to the voter CSV file
+        fieldnames --> header column names from split_byte_ranges
+        start, end --> byte offsets of the range
+
+    Returns:
+        tuple --> (list of pack_row tuples, line within the range of each of those rows,
+                   list of (line within range, error, raw values), number of lines in the range)
+    """
+    with open(filename, 'rb') as file:
+        file.seek(start)
+        data = file.read(end - start)
+
+    rows = []
+    line_numbers = []
+    rejected = []
+    reader = csv.DictReader(io.StringIO(data.decode('utf-8'), newline=''), fieldnames=fieldnames)
+    for row in reader:
+        try:
+            rows.append(pack_row(parse_voter_row(row)))
+            line_numbers.append(reader.line_num)
+        except ROW_ERRORS as e:
+            rejected.append((reader.line_num, e, list(row.values())))
+    return rows, line_numbers, rejected, data.count(b'\n')
@@ -0,0 +1,184 @@
+# File: voter_analytics/result_cache.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Size-bounded, data-versioned cache for rendered voter pages, with hit/miss counters
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+STATS_NAMES = ('hits', 'misses', 'evictions')
+
+# Seconds between adding a process's counts to the shared totals
+STATS_FLUSH_SECONDS = 30
+
+
+class ResultCache:
+    """
+    Two-level cache for results that only change when the voter data does.
+
+    Each process keeps a least-recently-used dictionary bounded by the total
+    size of its values. Misses fall through to the shared Django cache, so a
+    result computed by one worker process is reused by the others. Every
+    entry is stamped with the data version it was computed for and counts as
+    a miss once the loader has moved the version on.
+
+    Hits, misses and evictions are counted per process (self.hits etc.) and
+    added to totals in the shared cache at most every STATS_FLUSH_SECONDS,
+    where the voter_cache_stats command reads them; a lookup never waits on
+    a shared cache write just to be counted.
+    Setting enabled to False bypasses both levels without counting, so
+    benchmarks can time the work the cache would otherwise hide.
+    """
+
+    def __init__(self, name, revision, max_bytes, shared_max_entry_bytes):
+        """
+        Parameters:
+            name --> short name used in cache keys and statistics
+            revision --> bumped whenever the cached output changes shape, to retire old entries
+            max_bytes --> total size of the values kept in this process
+            shared_max_entry_bytes --> larger values are only cached in this process
+        """
+        self.name = name
+        self.revision = revision
+        self.max_bytes = max_bytes
+        self.shared_max_entry_bytes = shared_max_entry_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._unflushed = dict.fromkeys(STATS_NAMES, 0)
+        self._flushed_at = time.monotonic()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def make_key(self, *parts):
+        """Build a cache key from JSON-serialisable parts (e.g. parsed filters and a page number)."""
+        digest = hashlib.sha1(json.dumps(parts, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+        return f'voter_analytics:{self.name}:{self.revision}:{digest}'
+
+    def get(self, key, version):
+        """
+        Return the value cached under key for this data version, or None.
+
+        Parameters:
+            key --> key from make_key
+            version --> current data version
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._count('hits')
+                value = entry[1]
+            else:
+                value = None
+        if value is not None:
+            self._flush_if_due()
+            return value
+
+        shared = cache.get(key)
+        if shared is not None and shared[0] == version:
+            self._store_local(key, version, shared[1])
+            with self._lock:
+                self._count('hits')
+            self._flush_if_due()
+            return shared[1]
+
+        with self._lock:
+            self._count('misses')
+        self._flush_if_due()
+        return None
+
+    def set(self, key, version, value):
+        """
+        Cache a bytes value for this data version.
+
+        Parameters:
+            key --> key from make_key
+            version --> data version the value was computed for
+            value --> bytes to cache
+        """
+        if not self.enabled:
+            return
+        self._store_local(key, version, value)
+        if len(value) <= self.shared_max_entry_bytes:
+            cache.set(key, (version, value), timeout=24 * 60 * 60)
+
+    def stats(self):
+        """Return this process's counters and current size."""
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                    'entries': len(self._entries), 'bytes': self._bytes}
+
+    def shared_stats(self):
+        """Return the counters summed over every process, from the shared cache."""
+        self.flush_stats()
+        return {name: cache.get(self._stats_key(name), 0) for name in STATS_NAMES}
+
+    def reset_shared_stats(self):
+        with self._lock:
+            self._unflushed = dict.fromkeys(STATS_NAMES, 0)
+        cache.delete_many([self._stats_key(name) for name in STATS_NAMES])
+
+    def _store_local(self, key, version, value):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old[1])
+            self._entries[key] = (version, value)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._count('evictions')
+
+    def _stats_key(self, name):
+        return f'voter_analytics:{self.name}:stats:{name}'
+
+    def _count(self, name):
+        """Count one hit, miss or eviction in this process; the caller holds self._lock."""
+        setattr(self, name, getattr(self, name) + 1)
+        self._unflushed[name] += 1
+
+    def _flush_if_due(self):
+        if time.monotonic() - self._flushed_at >= STATS_FLUSH_SECONDS:
+            self.flush_stats()
+
+    def flush_stats(self):
+        """Add the counts made in this process since the last flush to the shared totals."""
+        with self._lock:
+            counts, self._unflushed = self._unflushed, dict.fromkeys(STATS_NAMES, 0)
+            self._flushed_at = time.monotonic()
+        for name, count in counts.items():
+            if not count:
+                continue
+            key = self._stats_key(name)
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                # Another process may create the key between the two calls
+                if not cache.add(key, count, timeout=None):
+                    cache.incr(key, count)
+
+
+# Rendered voter list, graphs and JSON pages; the revision is bumped whenever
+# their markup or JSON changes
+page_cache = ResultCache(
+    'pages',
+    revision=7,
+    max_bytes=settings.VOTER_RESULT_CACHE_MAX_BYTES,
+    shared_max_entry_bytes=settings.VOTER_RESULT_CACHE_SHARED_MAX_ENTRY_BYTES,
+)
@@ -0,0 +1,104 @@
+# File: voter_analytics/rollups.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Materialised precinct and street summaries of the Voter table, rebuilt by the loader
+#              for the precincts a load or sync touched
+
+from collections import defaultdict
+
+from django.db.models import Count, Q, Sum
+
+from .models import PrecinctRollup, StreetRollup, Voter
+from .parsing import ELECTION_BITS, ELECTION_FIELDS
+
+
+# Voter fields that feed the rollups; a change to any of them means the voter's precinct needs refreshing
+ROLLUP_SOURCE_FIELDS = {'precinct_number', 'street_name', 'party_affiliation', 'voting_history'}
+
+
+def _new_totals():
+    return {'num_voters': 0, 'party_counts': defaultdict(int), 'score_total': 0,
+            **{field: 0 for field in ELECTION_FIELDS}}
+
+
+def _add(totals, group):
+    totals['num_voters'] += group['num_voters']
+    totals['party_counts'][group['party_affiliation']] += group['num_voters']
+    totals['score_total'] += group['score_total']
+    for field in ELECTION_FIELDS:
+        totals[field] += group[field]
+
+
+def _rollup_fields(totals):
+    """Turn running totals into the field values of a Rollup model."""
+    num_voters = totals['num_voters']
+    return {
+        'num_voters': num_voters,
+        'party_counts': dict(totals['party_counts']),
+        'avg_voter_score': totals['score_total'] / num_voters if num_voters else 0.0,
+        **{field: totals[field] for field in ELECTION_FIELDS},
+    }
+
+
+def refresh_rollups(precincts=None):
+    """
+    Rebuild the precinct and street rollups from the Voter table.
+
+    A single GROUP BY query over (precinct, street, party) feeds both
+    levels. Call inside the transaction that changed the voter data, so the
+    rollups are never out of step with it.
+
+    Parameters:
+        precincts --> precinct numbers to refresh, or None to rebuild every precinct
+
+    Returns:
+        int --> number of precinct rollups written
+    """
+    voters = Voter.objects.order_by()
+    precinct_rollups = PrecinctRollup.objects.all()
+    street_rollups = StreetRollup.objects.all()
+    if precincts is not None:
+        precincts = sorted(precincts)
+        if not precincts:
+            return 0
+        voters = voters.filter(precinct_number__in=precincts)
+        precinct_rollups = precinct_rollups.filter(precinct_number__in=precincts)
+        street_rollups = street_rollups.filter(precinct_number__in=precincts)
+
+    groups = (voters
+              .values('precinct_number', 'street_name', 'party_affiliation')
+              .annotate(num_voters=Count('id'), score_total=Sum('voter_score'),
+                        **{field: Count('id', filter=Q(voting_history__hasall=bit))
+                           for field, bit in ELECTION_BITS.items()}))
+
+    by_precinct = defaultdict(_new_totals)
+    by_street = defaultdict(_new_totals)
+    for group in groups.iterator():
+        _add(by_precinct[group['precinct_number']], group)
+        _add(by_street[group['precinct_number'], group['street_name']], group)
+
+    precinct_rollups.delete()
+    street_rollups.delete()
+    PrecinctRollup.objects.bulk_create(
+        PrecinctRollup(precinct_number=precinct, **_rollup_fields(totals))
+        for precinct, totals in by_precinct.items())
+    StreetRollup.objects.bulk_create(
+        (StreetRollup(precinct_number=precinct, street_name=street, **_rollup_fields(totals))
+         for (precinct, street), totals in by_street.items()), batch_size=1000)
+    return len(by_precinct)
+
+
+def rollup_dict(rollup):
+    """
+    Serialise a precinct or street rollup for the JSON endpoint.
+
+    Returns:
+        dict --> counts, party breakdown, average score and turnout per election
+    """
+    return {
+        'num_voters': rollup.num_voters,
+        'party_counts': dict(rollup.get_party_counts()),
+        'avg_voter_score': round(rollup.avg_voter_score, 3),
+        'turnout': {field: {'voted': voted, 'percent': round(percent, 2)}
+                    for field, voted, percent in rollup.get_turnout()},
+    }
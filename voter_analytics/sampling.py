@@ -0,0 +1,190 @@
+# File: voter_analytics/sampling.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Uniform voter sample kept with the columnar snapshot, and approximate graph counts with
+#              confidence intervals estimated from it
+
+import math
+from statistics import NormalDist
+
+from django.conf import settings
+
+from .parsing import ELECTION_BITS, election_mask
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it graphs are always exact
+    np = None
+
+
+# Confidence level of the reported intervals
+CONFIDENCE = 0.95
+
+
+class Reservoir:
+    """
+    Fixed-size uniform sample of a stream of rows, chosen without knowing the stream's length.
+
+    Every row gets a random key and the reservoir keeps the rows with the
+    smallest keys (bottom-k sampling), so each subset of the stream is
+    equally likely to end up in it. Chunks are added with NumPy, so
+    sampling a multi-million row table costs a few array operations per chunk.
+    """
+
+    def __init__(self, size, seed=None):
+        """
+        Parameters:
+            size --> number of rows to keep
+            seed --> random seed (None for a fresh sample every time)
+        """
+        self.size = size
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+        self.keys = np.zeros(0)
+        self.positions = np.zeros(0, dtype='int64')
+
+    def add(self, count):
+        """Offer the next count rows of the stream."""
+        keys = np.concatenate([self.keys, self.rng.random(count)])
+        positions = np.concatenate([self.positions, np.arange(self.seen, self.seen + count, dtype='int64')])
+        self.seen += count
+        if len(keys) > self.size:
+            keep = np.argpartition(keys, self.size)[:self.size]
+            keys, positions = keys[keep], positions[keep]
+        self.keys, self.positions = keys, positions
+
+    def sample(self):
+        """Return the positions of the sampled rows, in stream order."""
+        return np.sort(self.positions)
+
+
+def sample_mask(columns, party_codes, filters):
+    """
+    Build a boolean mask of the sampled voters matching a set of filters.
+
+    Parameters:
+        columns --> dict of sampled snapshot columns ('birth_year', 'party', 'score', 'elections')
+        party_codes --> party affiliation -> code in the party column
+        filters --> dict from voter_analytics.filters.parse_filters (without a search)
+
+    Returns:
+        ndarray --> boolean array with one entry per sampled voter
+    """
+    mask = np.ones(len(columns['party']), dtype=bool)
+    if filters['party_affiliation'] is not None:
+        code = party_codes.get(filters['party_affiliation'])
+        if code is None:
+            return np.zeros_like(mask)
+        mask &= columns['party'] == code
+    if filters['voter_score'] is not None:
+        mask &= columns['score'] == filters['voter_score']
+    if filters['elections']:
+        required = election_mask(filters['elections'])
+        mask &= (columns['elections'] & required) == required
+    if filters['min_birth_year'] is not None:
+        mask &= columns['birth_year'] >= filters['min_birth_year']
+    if filters['max_birth_year'] is not None:
+        mask &= columns['birth_year'] <= filters['max_birth_year']
+    return mask
+
+
+def estimate(hits, sample, population, confidence=CONFIDENCE):
+    """
+    Estimate how many voters in the population have a property seen in hits sampled voters.
+
+    The interval is the Wilson score interval for the proportion, scaled to
+    the population. The finite population correction (a sample of half the
+    voters is more precise than one of a thousandth) enters as a larger
+    effective sample size, so the interval still reaches 0 or 1 when no
+    sampled voter, or every one, has the property.
+
+    Parameters:
+        hits --> sampled voters with the property
+        sample --> size of the sample
+        population --> number of voters the sample was drawn from
+        confidence --> confidence level of the interval
+
+    Returns:
+        tuple --> (estimated count, interval low, interval high), rounded to whole voters
+    """
+    if sample >= population:
+        return (hits, hits, hits)  # a census, so the count is exact
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    proportion = hits / sample
+    effective = sample * (population - 1) / (population - sample)
+    denominator = 1 + z * z / effective
+    centre = (proportion + z * z / (2 * effective)) / denominator
+    half_width = z * math.sqrt(proportion * (1 - proportion) / effective
+                               + z * z / (4 * effective * effective)) / denominator
+    low = max(centre - half_width, 0.0)
+    high = min(centre + half_width, 1.0)
+    return (round(proportion * population), math.floor(low * population), math.ceil(high * population))
+
+
+def approximate_graph_counts(snapshot, filters, min_voters=None):
+    """
+    Estimate the counts behind the voter graphs from the snapshot's sample.
+
+    Parameters:
+        snapshot --> VoterSnapshot
+        filters --> dict from voter_analytics.filters.parse_filters (without a search)
+        min_voters --> below this estimated number of matching voters, return None so the
+                       caller computes exact counts (defaults to VOTER_APPROXIMATE_MIN_VOTERS)
+
+    Returns:
+        dict or None --> the structure of voter_analytics.aggregates.graph_counts, with estimated
+                         counts and an extra 'approximate' entry holding the sample size, the
+                         confidence level and an interval for the total and every count; or None
+                         when exact counts should be used instead
+    """
+    if np is None:
+        return None
+    if min_voters is None:
+        min_voters = settings.VOTER_APPROXIMATE_MIN_VOTERS
+    population = len(snapshot)
+    columns = snapshot.sample_columns()
+    sample = len(columns['party'])
+    if sample == 0 or sample >= population:
+        return None  # the sample is the whole table, so exact counts cost the same
+
+    mask = sample_mask(columns, snapshot.party_codes, filters)
+    matches = int(np.count_nonzero(mask))
+    total = estimate(matches, sample, population)
+    if total[0] < min_voters:
+        return None
+
+    birth_year = columns['birth_year'][mask]
+    party = columns['party'][mask]
+    elections = columns['elections'][mask]
+
+    birth_years = []
+    if len(birth_year):
+        first_year = int(birth_year.min())
+        for offset, hits in enumerate(np.bincount(birth_year - first_year)):
+            if hits:
+                birth_years.append((first_year + offset, estimate(int(hits), sample, population)))
+
+    party_hits = np.bincount(party, minlength=len(snapshot.parties))
+    parties = sorted(((snapshot.parties[code], estimate(int(hits), sample, population))
+                      for code, hits in enumerate(party_hits) if hits),
+                     key=lambda item: (-item[1][0], item[0]))
+
+    election_estimates = {field: estimate(int(np.count_nonzero(elections & bit)), sample, population)
+                          for field, bit in ELECTION_BITS.items()}
+
+    return {
+        'total': total[0],
+        'birth_years': [(year, value[0]) for year, value in birth_years],
+        'parties': [(name, value[0]) for name, value in parties],
+        'elections': {field: value[0] for field, value in election_estimates.items()},
+        'approximate': {
+            'sample_size': sample,
+            'population': population,
+            'sample_matches': matches,
+            'confidence': CONFIDENCE,
+            'total': total[1:],
+            'birth_years': [value[1:] for _, value in birth_years],
+            'parties': [value[1:] for _, value in parties],
+            'elections': {field: value[1:] for field, value in election_estimates.items()},
+        },
+    }
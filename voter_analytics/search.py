@@ -0,0 +1,133 @@
+# File: voter_analytics/search.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Name and street search over voters, backed by the SQLite FTS5 index voter_search
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+# Columns covered by the search index (see migration 0005_voter_search)
+SEARCH_FIELDS = ['last_name', 'first_name', 'street_name', 'street_number']
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize_search(value):
+    """
+    Reduce a search box value to lowercase words separated by single spaces.
+
+    Returns:
+        str or None --> the normalised search, or None if it has no words
+    """
+    words = _TOKEN_RE.findall((value or '').lower())
+    return ' '.join(words) or None
+
+
+def has_search_index():
+    """Return True if the database has the FTS5 index (it is only created on SQLite)."""
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(search):
+    """
+    Build an FTS5 MATCH expression requiring every word as a prefix.
+
+    Parameters:
+        search --> normalised search from normalize_search
+    """
+    return ' '.join(f'"{word}"*' for word in search.split())
+
+
+def search_filter(search):
+    """
+    Build a Q object matching voters whose name or street contains every search word.
+
+    Uses the full-text index where there is one (word prefixes), and
+    case-insensitive substring matches otherwise.
+
+    Parameters:
+        search --> normalised search from normalize_search
+    """
+    if has_search_index():
+        return Q(id__in=RawSQL('SELECT rowid FROM voter_search WHERE voter_search MATCH %s',
+                               [match_expression(search)]))
+
+    condition = Q()
+    for word in search.split():
+        any_field = Q()
+        for field in SEARCH_FIELDS:
+            any_field |= Q(**{f'{field}__icontains': word})
+        condition &= any_field
+    return condition
+
+
+def ranked_search_ids(queryset, search, offset=0, limit=None):
+    """
+    Return the ids of one slice of the voters in a QuerySet that match a search, best match first.
+
+    With the full-text index, matches are ranked by BM25 (names weigh more
+    than streets) and the database sorts and slices them, so only the ids
+    on the requested page are returned; otherwise they are in list order.
+
+    Parameters:
+        queryset --> QuerySet of voters filtered by everything except the search
+        search --> normalised search from normalize_search
+        offset --> number of best matches to skip
+        limit --> most ids to return, or None for all of them
+
+    Returns:
+        list --> matching voter ids
+    """
+    if not has_search_index():
+        ids = queryset.filter(search_filter(search)).values_list('id', flat=True)
+        return list(ids[offset:None if limit is None else offset + limit])
+
+    sql = 'SELECT rowid FROM voter_search WHERE voter_search MATCH %s'
+    params = [match_expression(search)]
+    if queryset.query.where:
+        subquery, subquery_params = queryset.order_by().values('id').query.sql_with_params()
+        # Unary + stops SQLite re-running the MATCH once per filtered id
+        sql += f' AND +rowid IN ({subquery})'
+        params += list(subquery_params)
+    sql += ' ORDER BY rank, rowid LIMIT %s OFFSET %s'
+    params += [-1 if limit is None else limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [row[0] for row in cursor.fetchall()]
+
+
+class RankedSearchResults:
+    """
+    Sequence of Voters matching a search, best match first, fetched one slice at a time.
+
+    Lets a Paginator page through search results like snapshot.SnapshotResults:
+    its length is a count worked out separately (see pagination.total_count),
+    and each page is one ranked LIMIT/OFFSET query plus a lookup of its voters.
+    """
+
+    def __init__(self, queryset, search, count):
+        """
+        Parameters:
+            queryset --> QuerySet of voters filtered by everything except the search
+            search --> normalised search from normalize_search
+            count --> number of voters in queryset matching the search
+        """
+        self.queryset = queryset
+        self.search = search
+        self.total = count
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop, _ = index.indices(self.total)
+        page_ids = ranked_search_ids(self.queryset, self.search, start, max(stop - start, 0))
+        voters = self.queryset.model.objects.in_bulk(page_ids)
+        return [voters[pk] for pk in page_ids if pk in voters]
@@ -0,0 +1,415 @@
+# File: voter_analytics/snapshot.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Read-only columnar NumPy snapshot of the Voter table, memory-mapped from disk and
+#              used to filter and aggregate voters with vectorised operations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models.functions import ExtractYear
+
+from .bitmaps import BitmapIndex, party_key, score_key
+from .models import Voter
+from .parsing import ELECTION_BITS
+from .sampling import Reservoir
+from .versioning import get_data_version
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; without it the views query the database directly
+    np = None
+
+
+# Column name -> dtype of each .npy file in a snapshot
+COLUMNS = {
+    'ids': 'int64',
+    'birth_year': 'int16',
+    'party': 'uint8',
+    'score': 'int8',
+    'elections': 'uint8',  # Voter.voting_history, same bit layout
+    'registration_year': 'int16',
+    'precinct': 'uint16',
+    'zip_code': 'uint16',
+}
+
+# Coded columns -> meta key listing the value of each code
+CODED_COLUMNS = {'party': 'parties', 'precinct': 'precincts', 'zip_code': 'zip_codes'}
+
+# Bumped when the columns change, so snapshots written by older code are rebuilt
+SNAPSHOT_FORMAT = 3
+
+# Filters (from voter_analytics.filters.parse_filters) the snapshot can answer; text
+# search needs the database's full-text index
+SNAPSHOT_FILTERS = {'party_affiliation', 'min_birth_year', 'max_birth_year', 'voter_score', 'elections'}
+
+# Rows are in the list view's order, so a filtered id array is already sorted for display
+SNAPSHOT_ORDERING = ['last_name', 'first_name', 'id']
+
+META_FILENAME = 'current.json'
+BITMAPS_FILENAME = 'bitmaps.npz'
+SAMPLE_FILENAME = 'sample.npy'
+
+# Sampled columns used for approximate graphs (see voter_analytics.sampling)
+SAMPLE_COLUMNS = ['birth_year', 'party', 'score', 'elections']
+CHUNK_SIZE = 20000
+
+# Snapshot currently mapped by this process
+_loaded = None
+
+# Held while this process rebuilds a missing snapshot in the background;
+# versions it has already started a rebuild for are not retried
+_rebuild_lock = threading.Lock()
+_rebuilt_versions = set()
+
+logger = logging.getLogger(__name__)
+
+
+class VoterSnapshot:
+    """
+    Columnar view of the Voter table held in memory-mapped NumPy arrays.
+
+    Row i of every column describes the same voter; rows are sorted by last
+    name, first name and id. Party affiliations, precincts and zip codes are
+    stored as small integer codes into self.parties, self.precincts and
+    self.zip_codes. Party, score and election filters are answered from a
+    bitmap index over the same rows. self.sample holds the row numbers of a
+    uniform sample of the voters, drawn when the snapshot was built.
+    """
+
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.version = meta['version']
+        self.parties = meta['parties']
+        self.precincts = meta['precincts']
+        self.zip_codes = meta['zip_codes']
+        self.party_codes = {party: code for code, party in enumerate(self.parties)}
+        for name in COLUMNS:
+            setattr(self, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+        self.bitmaps = BitmapIndex.load(os.path.join(directory, BITMAPS_FILENAME), len(self.ids))
+        self.sample = np.load(os.path.join(directory, SAMPLE_FILENAME))
+        self._sample_columns = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def sample_columns(self):
+        """
+        Get the sampled voters' columns, copied into memory on first use.
+
+        Returns:
+            dict --> column name (from SAMPLE_COLUMNS) -> array with one entry per sampled voter
+        """
+        if self._sample_columns is None:
+            self._sample_columns = {name: np.asarray(getattr(self, name)[self.sample]) for name in SAMPLE_COLUMNS}
+        return self._sample_columns
+
+    def select_bits(self, filters):
+        """
+        Combine the bitmap index into a bitset of the voters matching a set of filters.
+
+        Parameters:
+            filters --> dict from voter_analytics.filters.parse_filters
+
+        Returns:
+            ndarray or None --> packed bitset with one bit per voter, or None if nothing is filtered
+        """
+        bitsets = []
+        if filters['party_affiliation'] is not None:
+            code = self.party_codes.get(filters['party_affiliation'])
+            if code is None:
+                return self.bitmaps.empty()
+            bitsets.append(self.bitmaps.get(party_key(code)))
+        if filters['voter_score'] is not None:
+            bitsets.append(self.bitmaps.get(score_key(filters['voter_score'])))
+        for field in filters['elections']:
+            bitsets.append(self.bitmaps.get(field))
+
+        # Birth years are a range, so they come from the column rather than a bitmap
+        years = None
+        if filters['min_birth_year'] is not None:
+            years = self.birth_year >= filters['min_birth_year']
+        if filters['max_birth_year'] is not None:
+            below = self.birth_year <= filters['max_birth_year']
+            years = below if years is None else years & below
+        if years is not None:
+            bitsets.append(np.packbits(years))
+
+        return self.bitmaps.intersect(bitsets) if bitsets else None
+
+    def mask(self, filters):
+        """
+        Build a boolean mask of the voters matching a set of filters.
+
+        Parameters:
+            filters --> dict from voter_analytics.filters.parse_filters
+
+        Returns:
+            ndarray or None --> boolean array with one entry per voter, or None if nothing is filtered
+        """
+        bits = self.select_bits(filters)
+        return None if bits is None else self.bitmaps.to_mask(bits)
+
+    def count(self, filters):
+        """Return the number of matching voters, counted straight from the bitsets."""
+        bits = self.select_bits(filters)
+        return len(self) if bits is None else self.bitmaps.count(bits)
+
+    def select_ids(self, filters):
+        """Return the ids of the matching voters, in list order."""
+        bits = self.select_bits(filters)
+        return self.ids if bits is None else self.ids[self.bitmaps.positions(bits)]
+
+    def graph_counts(self, filters):
+        """
+        Compute the counts behind the voter graphs for a set of filters.
+
+        Returns the same structure as voter_analytics.aggregates.graph_counts.
+        """
+        mask = self.mask(filters)
+        birth_year = self.birth_year if mask is None else self.birth_year[mask]
+        party = self.party if mask is None else self.party[mask]
+        elections = self.elections if mask is None else self.elections[mask]
+
+        birth_years = []
+        if len(birth_year):
+            first_year = int(birth_year.min())
+            year_counts = np.bincount(birth_year - first_year)
+            birth_years = [(first_year + offset, int(count))
+                           for offset, count in enumerate(year_counts) if count]
+
+        party_counts = np.bincount(party, minlength=len(self.parties))
+        parties = sorted(((self.parties[code], int(count)) for code, count in enumerate(party_counts) if count),
+                         key=lambda item: (-item[1], item[0]))
+
+        return {
+            'total': int(len(birth_year)),
+            'birth_years': birth_years,
+            'parties': parties,
+            'elections': {field: int(np.count_nonzero(elections & bit))
+                          for field, bit in ELECTION_BITS.items()},
+        }
+
+
+class SnapshotResults:
+    """
+    Sequence of Voters for a list of ids, fetched from the database one slice at a time.
+
+    Lets a Paginator page through snapshot results: its length comes from
+    the id array, and only the voters on the requested page are loaded.
+    """
+
+    def __init__(self, ids):
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        page_ids = [int(pk) for pk in self.ids[index]]
+        voters = Voter.objects.in_bulk(page_ids)
+        return [voters[pk] for pk in page_ids if pk in voters]
+
+
+def snapshot_supports(filters):
+    """
+    Return True if every active filter can be answered from the snapshot.
+
+    Parameters:
+        filters --> dict from voter_analytics.filters.parse_filters
+    """
+    return all(name in SNAPSHOT_FILTERS for name, value in filters.items() if value not in (None, []))
+
+
+def _snapshot_dir():
+    return settings.VOTER_SNAPSHOT_DIR
+
+
+def _read_meta():
+    try:
+        with open(os.path.join(_snapshot_dir(), META_FILENAME)) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def build_snapshot(version=None):
+    """
+    Write a new snapshot of the Voter table to disk and make it current.
+
+    Columns are written to a private temporary directory, which is renamed
+    to a name no other build uses once complete; only then is the small
+    metadata file atomically replaced to point at it. Concurrent builds never
+    share a directory, and the previous snapshot is kept so processes that
+    have just read the old metadata can still map it.
+
+    Parameters:
+        version --> data version the snapshot is built for (defaults to the current one)
+
+    Returns:
+        VoterSnapshot or None --> the new snapshot, or None if NumPy is not installed
+    """
+    if np is None:
+        return None
+    if version is None:
+        version = get_data_version()
+
+    root = _snapshot_dir()
+    os.makedirs(root, exist_ok=True)
+    building = tempfile.mkdtemp(dir=root, prefix='.build-')
+    try:
+        meta = _write_snapshot(building, version)
+        directory = os.path.join(root, f'snapshot-{version}-{uuid.uuid4().hex}')
+        os.replace(building, directory)
+    except BaseException:
+        shutil.rmtree(building, ignore_errors=True)
+        raise
+    meta['directory'] = os.path.basename(directory)
+    snapshot = VoterSnapshot(directory, meta)
+
+    previous = _read_meta()
+    temporary = os.path.join(root, f'{META_FILENAME}.{os.getpid()}.tmp')
+    with open(temporary, 'w') as file:
+        json.dump(meta, file)
+    os.replace(temporary, os.path.join(root, META_FILENAME))
+
+    # Snapshots of older data than the one just replaced are no longer
+    # referenced; mapped files stay readable until closed. Other builds of
+    # this version are kept, as a concurrent build may be about to publish one.
+    keep = {previous and previous.get('directory')}
+    for name in os.listdir(root):
+        if name.startswith('snapshot-') and not name.startswith(f'snapshot-{version}-') and name not in keep:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+    return snapshot
+
+
+def _write_snapshot(directory, version):
+    """
+    Write the columns, bitmaps and sample of the Voter table into directory.
+
+    Returns:
+        dict --> the snapshot's metadata, without its directory
+    """
+    # Coded column -> value -> code, in order of first appearance
+    codes = {name: {} for name in CODED_COLUMNS}
+    chunks = {name: [] for name in COLUMNS}
+    reservoir = Reservoir(settings.VOTER_SAMPLE_SIZE)
+    fields = {
+        'ids': 'id', 'birth_year': 'birth_year', 'party': 'party_affiliation', 'score': 'voter_score',
+        'elections': 'voting_history', 'registration_year': 'registration_year',
+        'precinct': 'precinct_number', 'zip_code': 'zip_code',
+    }
+    with transaction.atomic():
+        rows = (Voter.objects.order_by(*SNAPSHOT_ORDERING)
+                .annotate(birth_year=ExtractYear('date_of_birth'),
+                          registration_year=ExtractYear('date_of_registration'))
+                .values_list(*fields.values())
+                .iterator(chunk_size=CHUNK_SIZE))
+        while True:
+            chunk = list(islice(rows, CHUNK_SIZE))
+            if not chunk:
+                break
+            reservoir.add(len(chunk))
+            for name, values in zip(fields, zip(*chunk)):
+                if name in codes:
+                    values = [codes[name].setdefault(value, len(codes[name])) for value in values]
+                chunks[name].append(np.array(values, dtype=COLUMNS[name]))
+
+    columns = {}
+    for name, dtype in COLUMNS.items():
+        columns[name] = np.concatenate(chunks[name]) if chunks[name] else np.zeros(0, dtype=dtype)
+        np.save(os.path.join(directory, f'{name}.npy'), columns[name])
+
+    bitmaps = BitmapIndex.build(columns['party'], columns['score'], columns['elections'], ELECTION_BITS)
+    bitmaps.save(os.path.join(directory, BITMAPS_FILENAME))
+    np.save(os.path.join(directory, SAMPLE_FILENAME), reservoir.sample())
+
+    return {
+        'version': version,
+        'format': SNAPSHOT_FORMAT,
+        **{key: sorted(codes[name], key=codes[name].get) for name, key in CODED_COLUMNS.items()},
+    }
+
+
+def _rebuild_in_background(version):
+    """
+    Start building the snapshot for a data version on a background thread.
+
+    Used when no snapshot matches the current data version outside the
+    loader (the snapshot directory or the version cache was cleared, or
+    voters were edited without the loader). Each process starts at most one
+    rebuild at a time, and only one per version, so a burst of requests does
+    not build the same snapshot repeatedly.
+
+    Parameters:
+        version --> data version to build the snapshot for
+    """
+    if version in _rebuilt_versions or not _rebuild_lock.acquire(blocking=False):
+        return
+    _rebuilt_versions.add(version)
+    logger.warning('No voter snapshot matches data version %s; rebuilding it in the background', version)
+
+    def rebuild():
+        try:
+            # Skip if the data moved on while the thread was starting; the
+            # next request starts a rebuild for the newer version
+            if get_data_version() == version:
+                build_snapshot(version)
+        except Exception:
+            logger.exception('Rebuilding the voter snapshot for data version %s failed', version)
+        finally:
+            connections.close_all()
+            _rebuild_lock.release()
+
+    threading.Thread(target=rebuild, name='voter-snapshot-rebuild', daemon=True).start()
+
+
+def get_snapshot(build=False):
+    """
+    Return a snapshot matching the current data version.
+
+    The snapshot is mapped once per process and reused until the data
+    version moves on. Snapshots are normally built by the loader once a
+    load commits. If none matches (e.g. the snapshot directory was cleared),
+    requests get None and query the database while the snapshot is rebuilt
+    on a background thread.
+
+    Parameters:
+        build --> build the snapshot before returning if none matches (for management commands)
+
+    Returns:
+        VoterSnapshot or None --> the snapshot, or None if NumPy is not installed
+                                  or no snapshot matches and build is False
+    """
+    global _loaded
+    if np is None:
+        return None
+
+    version = get_data_version()
+    if _loaded is not None and _loaded.version == version:
+        return _loaded
+
+    meta = _read_meta()
+    if meta is not None and meta['version'] == version and meta.get('format') == SNAPSHOT_FORMAT:
+        try:
+            _loaded = VoterSnapshot(os.path.join(_snapshot_dir(), meta['directory']), meta)
+            return _loaded
+        except OSError:
+            pass  # removed by a concurrent rebuild
+
+    if not build:
+        _rebuild_in_background(version)
+        return None
+    _loaded = build_snapshot(version)
+    return _loaded
@@ -0,0 +1,300 @@
+# File: voter_analytics/synthetic.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Generator for realistic synthetic voter CSV files in the newton_voters.csv layout,
+#              drawn from a distribution profile that can be fitted to a real voter file
+
+import csv
+import random
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from itertools import accumulate
+
+from .parsing import ELECTION_BITS, ELECTION_FIELDS, ROW_ERRORS, parse_voter_row
+
+
+CSV_COLUMNS = [
+    'Voter ID Number',
+    'Last Name',
+    'First Name',
+    'Residential Address - Street Number',
+    'Residential Address - Street Name',
+    'Residential Address - Apartment Number',
+    'Residential Address - Zip Code',
+    'Date of Birth',
+    'Date of Registration',
+    'Party Affiliation',
+    'Precinct Number',
+    'v20state',
+    'v21town',
+    'v21primary',
+    'v22general',
+    'v23town',
+    'voter_score',
+]
+
+# Polling day of each election; nobody can have voted before registering
+ELECTION_DATES = {
+    'v20state': date(2020, 11, 3),
+    'v21town': date(2021, 11, 2),
+    'v21primary': date(2021, 9, 14),
+    'v22general': date(2022, 11, 8),
+    'v23town': date(2023, 11, 7),
+}
+
+LATEST_REGISTRATION = date(2024, 10, 1)
+VOTING_AGE = 18
+
+# Common surnames and first names, most frequent first (weights fall off by rank, see _zipf)
+LAST_NAMES = [
+    'SMITH', 'COHEN', 'MURPHY', 'SULLIVAN', 'KIM', 'LEE', 'BROWN', 'WANG', 'JOHNSON', 'CHEN',
+    'OBRIEN', 'WILLIAMS', 'MILLER', 'LIU', 'KELLY', 'LEVINE', 'JONES', 'MCCARTHY', 'DAVIS', 'PATEL',
+    'GOLDBERG', 'ZHANG', 'NGUYEN', 'WALSH', 'GARCIA', 'FRIEDMAN', 'RYAN', 'SHAPIRO', 'MARTIN', 'LI',
+    'DONOVAN', 'KAPLAN', 'ROSSI', 'PARK', 'MOORE', 'FITZGERALD', 'WHITE', 'ANDERSON', 'SHAH', 'THOMPSON',
+    'CLARK', 'RUSSO', 'GREEN', 'HUANG', 'CHOI', 'RODRIGUEZ', 'SILVA', 'BERNSTEIN', 'HALL', 'YOUNG',
+]
+FIRST_NAMES = [
+    'DAVID', 'MICHAEL', 'JOHN', 'SUSAN', 'ELIZABETH', 'MARY', 'ROBERT', 'JENNIFER', 'JAMES', 'KAREN',
+    'WILLIAM', 'SARAH', 'RICHARD', 'LISA', 'DANIEL', 'EMILY', 'PETER', 'ANNE', 'PAUL', 'LAURA',
+    'JOSEPH', 'NANCY', 'THOMAS', 'RACHEL', 'STEVEN', 'BARBARA', 'MARK', 'JESSICA', 'ANDREW', 'RUTH',
+    'BENJAMIN', 'KATHERINE', 'MATTHEW', 'ELLEN', 'JONATHAN', 'AMY', 'KEVIN', 'HANNAH', 'ALEXANDER', 'GRACE',
+    'WEI', 'PRIYA', 'JUN', 'ANA', 'SOPHIA', 'ETHAN', 'OLIVIA', 'NOAH', 'MAYA', 'LUCAS',
+]
+
+# Street name -> (precinct, zip code); streets belong to one precinct, as real addresses do
+STREETS = {
+    'WASHINGTON ST': ('1', '02458'), 'CHURCH ST': ('1', '02458'), 'CENTRE ST': ('1', '02458'),
+    'PARK ST': ('1', '02458'), 'JEFFERSON ST': ('1', '02458'),
+    'WATERTOWN ST': ('2', '02460'), 'CRAFTS ST': ('2', '02460'), 'CABOT ST': ('2', '02460'),
+    'WALNUT ST': ('2', '02460'), 'CALIFORNIA ST': ('2', '02460'),
+    'AUBURN ST': ('3', '02466'), 'COMMONWEALTH AVE': ('3', '02466'), 'GROVE ST': ('3', '02466'),
+    'LEXINGTON ST': ('3', '02466'), 'HANCOCK ST': ('3', '02466'),
+    'BEACON ST': ('4', '02468'), 'CHESTNUT ST': ('4', '02464'), 'BOYLSTON ST': ('4', '02467'),
+    'WOODWARD ST': ('4', '02468'), 'LINCOLN ST': ('4', '02461'),
+    'HAMMOND POND PKWY': ('5', '02467'), 'PARKER ST': ('5', '02459'), 'DUDLEY RD': ('5', '02459'),
+    'CYPRESS ST': ('5', '02459'), 'HOMER ST': ('5', '02459'),
+    'LOWELL AVE': ('6', '02460'), 'ADAMS ST': ('6', '02458'), 'MAPLE ST': ('6', '02466'),
+    'DEDHAM ST': ('6', '02461'), 'BROOKLINE ST': ('6', '02459'),
+    'WARD ST': ('7', '02459'), 'OTIS ST': ('7', '02460'), 'VALENTINE ST': ('7', '02465'),
+    'CHERRY ST': ('7', '02465'), 'PROSPECT ST': ('7', '02465'),
+    'HIGHLAND ST': ('8', '02465'), 'DERBY ST': ('8', '02465'), 'WINCHESTER ST': ('8', '02461'),
+    'NEEDHAM ST': ('8', '02461'), 'HILLSIDE AVE': ('8', '02461'),
+}
+
+# Share of voters in each party, roughly as in Newton (unenrolled, Democratic, Republican, then small parties)
+PARTIES = {
+    'U ': 0.545, 'D ': 0.375, 'R ': 0.062, 'J ': 0.006, 'L ': 0.004,
+    'CC': 0.002, 'X ': 0.002, 'G ': 0.002, 'Q ': 0.001, 'AA': 0.001,
+}
+
+# Kinds of voter -> (share by age group, chance of voting in each election). Turnout is
+# strongly correlated within a voter, so histories are drawn per kind rather than per election.
+VOTER_KINDS = {
+    'never': ({'18-29': 0.34, '30-49': 0.20, '50-64': 0.11, '65+': 0.08},
+              {'v20state': 0.05, 'v21town': 0.01, 'v21primary': 0.01, 'v22general': 0.02, 'v23town': 0.01}),
+    'presidential': ({'18-29': 0.40, '30-49': 0.30, '50-64': 0.20, '65+': 0.12},
+                     {'v20state': 0.90, 'v21town': 0.04, 'v21primary': 0.02, 'v22general': 0.45, 'v23town': 0.04}),
+    'general': ({'18-29': 0.20, '30-49': 0.35, '50-64': 0.40, '65+': 0.35},
+                {'v20state': 0.96, 'v21town': 0.25, 'v21primary': 0.10, 'v22general': 0.90, 'v23town': 0.25}),
+    'regular': ({'18-29': 0.06, '30-49': 0.15, '50-64': 0.29, '65+': 0.45},
+                {'v20state': 0.98, 'v21town': 0.85, 'v21primary': 0.60, 'v22general': 0.96, 'v23town': 0.85}),
+}
+
+
+def _age_group(birth_year):
+    age = LATEST_REGISTRATION.year - birth_year
+    if age < 30:
+        return '18-29'
+    if age < 50:
+        return '30-49'
+    if age < 65:
+        return '50-64'
+    return '65+'
+
+
+def _zipf(names, exponent=0.8):
+    """Weight a list of names by 1 / rank ** exponent, so the first names are the most common."""
+    return {name: 1 / (rank + 1) ** exponent for rank, name in enumerate(names)}
+
+
+def _default_birth_years():
+    """Relative number of registered voters born in each year: a college bump, then a middle-aged bulge."""
+    weights = {}
+    for age in range(VOTING_AGE, 100):
+        if age <= 22:
+            weight = 1.6
+        elif age < 35:
+            weight = 1.0
+        elif age < 65:
+            weight = 1.3
+        elif age < 80:
+            weight = 1.1
+        else:
+            weight = 1.1 * 0.88 ** (age - 80)
+        weights[LATEST_REGISTRATION.year - age] = weight
+    return weights
+
+
+def _default_histories():
+    """Probability of each voting history per age group, mixing VOTER_KINDS."""
+    histories = {}
+    for group in ('18-29', '30-49', '50-64', '65+'):
+        table = defaultdict(float)
+        for shares, turnout in VOTER_KINDS.values():
+            for history in range(1 << len(ELECTION_FIELDS)):
+                probability = shares[group]
+                for field, bit in ELECTION_BITS.items():
+                    probability *= turnout[field] if history & bit else 1 - turnout[field]
+                table[history] += probability
+        histories[group] = dict(table)
+    return histories
+
+
+def _default_registration_lags():
+    """Years between turning 18 and the current registration: most voters re-register when they move."""
+    return {years: 0.8 ** years + 0.02 for years in range(0, 80)}
+
+
+class _Choice:
+    """Weighted random choice over a fixed set of values, with the cumulative weights precomputed."""
+
+    def __init__(self, weights):
+        self.values = list(weights)
+        self.cum_weights = list(accumulate(weights.values()))
+
+    def __call__(self, rng):
+        return rng.choices(self.values, cum_weights=self.cum_weights)[0]
+
+
+class VoterProfile:
+    """
+    The distributions synthetic voters are drawn from.
+
+    Every attribute maps a value to a relative weight:
+        parties --> party affiliation code
+        birth_years --> year of birth
+        registration_lags --> whole years between a voter's 18th birthday and registration
+        histories --> age group ('18-29', '30-49', '50-64', '65+') -> voting history bitmask
+        streets --> (street name, precinct, zip code)
+        last_names, first_names --> name
+
+    The default profile approximates the Newton voter file; from_csv fits one to a real file.
+    """
+
+    def __init__(self, parties=None, birth_years=None, registration_lags=None, histories=None,
+                 streets=None, last_names=None, first_names=None):
+        self.parties = parties or PARTIES
+        self.birth_years = birth_years or _default_birth_years()
+        self.registration_lags = registration_lags or _default_registration_lags()
+        self.histories = histories or _default_histories()
+        self.streets = streets or {(name, precinct, zip_code): weight
+                                   for (name, (precinct, zip_code)), weight
+                                   in zip(STREETS.items(), _zipf(STREETS, 0.5).values())}
+        self.last_names = last_names or _zipf(LAST_NAMES)
+        self.first_names = first_names or _zipf(FIRST_NAMES)
+
+    @classmethod
+    def from_csv(cls, filename):
+        """
+        Measure the distributions of a real voter file.
+
+        Rows that cannot be parsed are skipped.
+
+        Parameters:
+            filename --> path of a voter CSV file in the newton_voters.csv layout
+
+        Returns:
+            VoterProfile --> profile whose samples match the file's distributions
+        """
+        counts = defaultdict(Counter)
+        histories = defaultdict(Counter)
+        with open(filename, newline='', encoding='utf-8-sig') as file:
+            for row in csv.DictReader(file):
+                try:
+                    fields = parse_voter_row(row)
+                except ROW_ERRORS:
+                    continue
+                birth = fields['date_of_birth']
+                registration = fields['date_of_registration']
+                counts['parties'][fields['party_affiliation']] += 1
+                counts['birth_years'][birth.year] += 1
+                counts['registration_lags'][max(registration.year - birth.year - VOTING_AGE, 0)] += 1
+                counts['streets'][(fields['street_name'], fields['precinct_number'], fields['zip_code'])] += 1
+                counts['last_names'][fields['last_name']] += 1
+                counts['first_names'][fields['first_name']] += 1
+                histories[_age_group(birth.year)][fields['voting_history']] += 1
+        if not counts:
+            raise ValueError(f'{filename} has no valid voter rows')
+        return cls(histories={group: dict(table) for group, table in histories.items()},
+                   **{name: dict(counter) for name, counter in counts.items()})
+
+
+def synthetic_rows(count, seed=0, profile=None):
+    """
+    Yield raw CSV rows (lists of strings) for synthetic voters.
+
+    Party, birth year, registration date, address and voting history are
+    each drawn from the profile. Voting histories depend on age, and any
+    election held before the voter registered is cleared.
+
+    Parameters:
+        count --> number of rows to generate
+        seed --> random seed, so the same arguments always produce the same file
+        profile --> VoterProfile to draw from (defaults to the Newton-like profile)
+
+    Yields:
+        list --> one row of values in CSV_COLUMNS order
+    """
+    rng = random.Random(seed)
+    profile = profile or VoterProfile()
+    choose_party = _Choice(profile.parties)
+    choose_birth_year = _Choice(profile.birth_years)
+    choose_lag = _Choice(profile.registration_lags)
+    choose_street = _Choice(profile.streets)
+    choose_last_name = _Choice(profile.last_names)
+    choose_first_name = _Choice(profile.first_names)
+    choose_history = {group: _Choice(table) for group, table in profile.histories.items()}
+    any_history = _Choice(Counter(history for table in profile.histories.values() for history in table))
+    election_dates = [(ELECTION_BITS[field], ELECTION_DATES[field]) for field in ELECTION_FIELDS]
+
+    for number in range(count):
+        birth_year = choose_birth_year(rng)
+        date_of_birth = date(birth_year, 1, 1) + timedelta(days=rng.randrange(365))
+        eligible = date(birth_year + VOTING_AGE, 1, 1) + (date_of_birth - date(birth_year, 1, 1))
+        date_of_registration = min(eligible + timedelta(days=choose_lag(rng) * 365 + rng.randrange(365)),
+                                   LATEST_REGISTRATION)
+        history = choose_history.get(_age_group(birth_year), any_history)(rng)
+        for bit, polling_day in election_dates:
+            if date_of_registration > polling_day:
+                history &= ~bit
+        street_name, precinct, zip_code = choose_street(rng)
+        flags = [bool(history & ELECTION_BITS[field]) for field in ELECTION_FIELDS]
+        yield [
+            f"{number:012d}",
+            choose_last_name(rng),
+            choose_first_name(rng),
+            str(rng.randint(1, 999)),
+            street_name,
+            str(rng.randint(1, 12)) if rng.random() < 0.2 else '',
+            zip_code,
+            date_of_birth.isoformat(),
+            date_of_registration.isoformat(),
+            choose_party(rng),
+            precinct,
+        ] + ['TRUE' if flag else 'FALSE' for flag in flags] + [str(sum(flags))]
+
+
+def write_voter_csv(filename, count, seed=0, profile=None):
+    """
+    Write a synthetic voter CSV file with a header row.
+
+    Parameters:
+        filename --> path of the file to create
+        count --> number of voter rows
+        seed --> random seed
+        profile --> VoterProfile to draw from (defaults to the Newton-like profile)
+    """
+    with open(filename, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_COLUMNS)
+        writer.writerows(synthetic_rows(count, seed, profile))
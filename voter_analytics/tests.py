@@ -1,3 +1,822 @@
-from django.test import TestCase
+# File: voter_analytics/tests.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Tests for the voter loader and sync, the aggregate cube, the columnar snapshot, the
+#              bitmap indexes, approximate graphs, the packed voting history, keyset pagination, the
+#              voter query plans, ranked search, exports, rollups, crosstabs, the page cache and the
+#              graph request log
 
-# Create your tests here.
+import csv
+import json
+import os
+import tempfile
+import threading
+from datetime import date
+from itertools import combinations
+from unittest import mock, skipIf
+
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import export, loader, snapshot, warmup
+from .aggregates import graph_counts
+from .bitmaps import party_key, score_key
+from .crosstab import Dimension, database_crosstab, snapshot_crosstab
+from .cube import cube_graph_counts, cube_supports, refresh_cube
+from .export import DATE_EXPORT_FIELDS, EXPORT_FIELDS
+from .filters import filter_voters, parse_filters
+from .loader import STAGE_TABLE, load_voters, sync_voters
+from .management.commands.check_voter_plans import PLAN_CHECKS
+from .models import GraphRequestLog, PrecinctRollup, StreetRollup, Voter, VoterCube
+from .pagination import NEXT, PREVIOUS, KeysetPage, decode_cursor, encode_cursor, voter_key
+from .parsing import ELECTION_BITS, ELECTION_FIELDS, election_mask
+from .rollups import refresh_rollups
+from .sampling import approximate_graph_counts
+from .search import RankedSearchResults, ranked_search_ids
+from .snapshot import SNAPSHOT_ORDERING, build_snapshot, get_snapshot
+from .synthetic import CSV_COLUMNS, synthetic_rows
+from .versioning import bump_data_version, get_data_version
+
+
+def make_voters(count):
+    """Build count varied, unsaved Voters."""
+    parties = ['D ', 'R ', 'U ', 'CC', 'L ']
+    return [
+        Voter(
+            voter_id=f'V{number:06d}',
+            first_name=f'First{number % 37}',
+            last_name=f'Last{number % 53}',
+            street_number=str(number % 200),
+            street_name=f'Street {number % 11}',
+            zip_code=f'0246{number % 8}',
+            date_of_birth=date(1930 + number % 70, number % 12 + 1, number % 28 + 1),
+            date_of_registration=date(1990 + number % 30, 1, 1),
+            party_affiliation=parties[number % len(parties)],
+            precinct_number=str(number % 9 + 1),
+            voting_history=number % 32,
+        )
+        for number in range(count)
+    ]
+
+
+# Keeps pages and the data version cached by one test run out of the next
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in ('default', 'versions')
+}
+
+# Stops views from rebuilding the snapshot on a background thread while a test holds the database
+no_snapshot_rebuild = mock.patch.object(snapshot, '_rebuild_in_background', lambda version: None)
+
+# Query strings every graph and filter engine must answer like the database
+FILTER_CASES = [
+    {},
+    {'party_affiliation': 'D '},
+    {'min_birth_year': '1950', 'max_birth_year': '1970'},
+    {'voter_score': '3'},
+    {'v20state': 'on', 'v22general': 'on'},
+    {'party_affiliation': 'R ', 'min_birth_year': '1960', 'v21town': 'on'},
+    {'party_affiliation': 'CC', 'voter_score': '2', 'max_birth_year': '1985'},
+    {'party_affiliation': 'X '},
+    {'max_birth_year': '1900'},
+]
+
+
+# Positions of columns in a synthetic_rows row
+VOTER_ID, LAST_NAME, PARTY, PRECINCT = (CSV_COLUMNS.index(column) for column in (
+    'Voter ID Number', 'Last Name', 'Party Affiliation', 'Precinct Number'))
+
+
+def table_contents():
+    """Return every voter's field values, without the primary key, ordered by voter_id."""
+    fields = [field.name for field in Voter._meta.concrete_fields if field.name != 'id']
+    return list(Voter.objects.order_by('voter_id').values_list(*fields))
+
+
+def rollup_contents(model):
+    """Return the field values of every row of a rollup or cube model, without the primary key, in a fixed order."""
+    fields = [field.name for field in model._meta.concrete_fields if field.name != 'id']
+    return sorted(model.objects.values(*fields), key=lambda row: [str(row[field]) for field in fields])
+
+
+class LoaderTests(TestCase):
+    """
+    Full loads and incremental syncs of voter CSV files.
+
+    refresh_derived_data is replaced by a mock, so no snapshot or warm-up
+    job is built for the test database.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.rows = list(synthetic_rows(80, seed=1))
+        patcher = mock.patch.object(loader, 'refresh_derived_data')
+        self.refresh_derived_data = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, rows, name='voters.csv'):
+        """Write rows to a CSV file with the voter file's header, and return its path."""
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_COLUMNS)
+            writer.writerows(rows)
+        return filename
+
+    def changed_rows(self):
+        """
+        Return a copy of self.rows with five voters removed, two edited and three added.
+
+        Returns:
+            tuple --> (rows, precincts of the removed and edited voters)
+        """
+        rows = [list(row) for row in self.rows[5:]]
+        rows[0][LAST_NAME] += 'son'
+        rows[1][PARTY] = 'R ' if rows[1][PARTY] != 'R ' else 'D '
+        rows += [[f'NEW{number}'] + row[1:] for number, row in enumerate(self.rows[:3])]
+        touched = {row[PRECINCT] for row in self.rows[:5]} | {rows[1][PRECINCT]}
+        return rows, touched
+
+    def test_load_rejects_duplicate_voter_ids(self):
+        duplicate = list(self.rows[3])
+        duplicate[LAST_NAME] = 'Duplicate'
+        filename = self.write(self.rows + [duplicate])
+        for workers in (1, 2):
+            with self.subTest(workers=workers):
+                stats = load_voters(filename, batch_size=30, workers=workers)
+                self.assertEqual((stats.loaded, stats.rejected), (80, 1))
+                self.assertEqual(Voter.objects.count(), 80)
+                self.assertNotEqual(Voter.objects.get(voter_id=self.rows[3][VOTER_ID]).last_name, 'Duplicate')
+
+    def test_sync_rejects_missing_and_duplicate_voter_ids(self):
+        missing = [''] + list(self.rows[0][1:])
+        stats = sync_voters(self.write(self.rows + [missing, self.rows[7]]), batch_size=30)
+        self.assertEqual((stats.inserted, stats.rejected), (80, 2))
+        self.assertEqual(Voter.objects.count(), 80)
+        self.assertFalse(Voter.objects.filter(voter_id__isnull=True).exists())
+
+    def test_sync_matches_a_full_load(self):
+        load_voters(self.write(self.rows))
+        rows, _ = self.changed_rows()
+        filename = self.write(rows, 'changed.csv')
+
+        with CaptureQueriesContext(connection) as queries:
+            stats = sync_voters(filename, batch_size=30)
+        self.assertEqual((stats.inserted, stats.updated, stats.deleted, stats.unchanged), (3, 2, 5, 73))
+        self.assertEqual(dict(stats.field_changes), {'last_name': 1, 'party_affiliation': 1})
+        # Stale voters are found against the staged ids, not a list built in Python
+        self.assertTrue(any(STAGE_TABLE in query['sql'] and 'NOT' in query['sql']
+                            for query in queries.captured_queries))
+        synced = table_contents()
+
+        load_voters(filename)
+        self.assertEqual(synced, table_contents())
+
+    def test_sync_refreshes_only_touched_precincts(self):
+        load_voters(self.write(self.rows))
+        rows, touched = self.changed_rows()
+        # Spoil every rollup, so only the refreshed ones come back correct
+        PrecinctRollup.objects.update(num_voters=-1)
+        StreetRollup.objects.update(num_voters=-1)
+
+        with mock.patch.object(loader, 'refresh_rollups', wraps=refresh_rollups) as refresh:
+            sync_voters(self.write(rows, 'changed.csv'))
+        refresh.assert_called_once_with(touched)
+        self.assertEqual(set(PrecinctRollup.objects.exclude(num_voters=-1).values_list('precinct_number', flat=True)),
+                         touched)
+        self.assertEqual(set(StreetRollup.objects.exclude(num_voters=-1).values_list('precinct_number', flat=True)),
+                         touched)
+
+        def touched_rollups():
+            return [[row for row in rollup_contents(model) if row['precinct_number'] in touched]
+                    for model in (PrecinctRollup, StreetRollup)]
+        synced = touched_rollups()
+        refresh_rollups()
+        self.assertEqual(synced, touched_rollups())
+        self.assertLess(len(touched), PrecinctRollup.objects.count())
+
+        # The cube has no precinct dimension, so it is rebuilt whole
+        cube = rollup_contents(VoterCube)
+        refresh_cube()
+        self.assertEqual(cube, rollup_contents(VoterCube))
+
+    def test_unchanged_sync_writes_nothing(self):
+        filename = self.write(self.rows)
+        load_voters(filename)
+        with mock.patch.object(loader, 'refresh_rollups') as refresh, \
+                mock.patch.object(loader, 'refresh_cube') as refresh_cube_mock, \
+                self.captureOnCommitCallbacks() as callbacks:
+            stats = sync_voters(filename)
+        self.assertEqual((stats.written, stats.unchanged), (0, 80))
+        refresh.assert_not_called()
+        refresh_cube_mock.assert_not_called()
+        self.assertEqual(callbacks, [])
+
+    def test_derived_data_is_refreshed_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            load_voters(self.write(self.rows))
+        self.refresh_derived_data.assert_not_called()
+        self.assertEqual(callbacks, [self.refresh_derived_data])
+
+        rows, _ = self.changed_rows()
+        with self.captureOnCommitCallbacks(execute=True):
+            sync_voters(self.write(rows, 'changed.csv'))
+        self.refresh_derived_data.assert_called_once_with()
+
+
+class FilterCasesMixin:
+    """Runs a check once for each of FILTER_CASES."""
+
+    def filter_cases(self):
+        """Yield (params, filters, filtered Voter QuerySet) for each of FILTER_CASES, in a subTest."""
+        for params in FILTER_CASES:
+            with self.subTest(**params):
+                filters = parse_filters(params)
+                yield params, filters, filter_voters(Voter.objects.all(), filters)
+
+
+class CubeTests(FilterCasesMixin, TestCase):
+    """The aggregate cube gives the same graph counts as grouped queries on the Voter table."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(400))
+        refresh_cube()
+
+    def test_supports_every_filter_but_search(self):
+        for _, filters, _ in self.filter_cases():
+            self.assertTrue(cube_supports(filters))
+        self.assertFalse(cube_supports(parse_filters({'q': 'street'})))
+
+    def test_matches_the_database(self):
+        for _, filters, queryset in self.filter_cases():
+            self.assertEqual(cube_graph_counts(filters), graph_counts(queryset))
+
+
+class RollupTests(TestCase):
+    """Refreshing the rollups of some precincts gives the same rollups as a full rebuild."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(300))
+        refresh_rollups()
+
+    def test_incremental_refresh_matches_a_full_rebuild(self):
+        # Change voters in precinct 2, move one from 3 to 2, and empty precinct 9
+        Voter.objects.filter(precinct_number='2', voting_history__lt=8).update(party_affiliation='R ')
+        Voter.objects.filter(precinct_number='2', party_affiliation='D ').update(voting_history=31)
+        moved = Voter.objects.filter(precinct_number='3').first()
+        moved.precinct_number = '2'
+        moved.street_name = 'New Street'
+        moved.save()
+        Voter.objects.filter(precinct_number='9').delete()
+
+        self.assertEqual(refresh_rollups({'2', '3', '9'}), 2)
+        incremental = [rollup_contents(model) for model in (PrecinctRollup, StreetRollup)]
+        refresh_rollups()
+        self.assertEqual(incremental, [rollup_contents(model) for model in (PrecinctRollup, StreetRollup)])
+        self.assertFalse(PrecinctRollup.objects.filter(precinct_number='9').exists())
+
+    def test_rollups_count_every_voter(self):
+        for rollup in PrecinctRollup.objects.all():
+            voters = Voter.objects.filter(precinct_number=rollup.precinct_number)
+            self.assertEqual(rollup.num_voters, voters.count())
+            self.assertEqual(rollup.v22general, voters.filter(voting_history__hasall=['v22general']).count())
+
+    def test_empty_refresh_writes_nothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(refresh_rollups(set()), 0)
+
+
+class SnapshotTestCase(FilterCasesMixin, TestCase):
+    """Builds a snapshot of 400 voters into a temporary directory before each test."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(CACHES=LOCAL_CACHES, VOTER_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(setattr, snapshot, '_loaded', None)
+        Voter.objects.bulk_create(make_voters(400))
+        self.snapshot = build_snapshot()
+
+
+@skipIf(snapshot.np is None, 'NumPy is not installed')
+class SnapshotTests(SnapshotTestCase):
+    """The snapshot selects and counts the same voters as the database."""
+
+    def test_matches_the_database(self):
+        for _, filters, queryset in self.filter_cases():
+            self.assertEqual(list(self.snapshot.select_ids(filters)), list(queryset.values_list('id', flat=True)))
+            self.assertEqual(self.snapshot.count(filters), queryset.count())
+            self.assertEqual(self.snapshot.graph_counts(filters), graph_counts(queryset))
+
+    def test_stale_snapshot_is_not_used(self):
+        self.assertEqual(get_snapshot().version, self.snapshot.version)
+        voter = Voter.objects.first()
+        voter.party_affiliation = 'R '
+        with no_snapshot_rebuild, self.captureOnCommitCallbacks(execute=True):
+            voter.save()
+        self.assertNotEqual(get_data_version(), self.snapshot.version)
+        with no_snapshot_rebuild:
+            self.assertIsNone(get_snapshot())
+
+
+@skipIf(snapshot.np is None, 'NumPy is not installed')
+class BitmapIndexTests(SnapshotTestCase):
+    """Every bitmap, and every combination the snapshot builds from them, selects the voters the database does."""
+
+    def voter_ids(self, bits):
+        """Return the ids of the voters set in a bitset, sorted."""
+        return sorted(int(pk) for pk in self.snapshot.ids[self.snapshot.bitmaps.positions(bits)])
+
+    def database_ids(self, queryset):
+        return sorted(queryset.values_list('id', flat=True))
+
+    def test_each_bitmap_matches_the_database(self):
+        bitmaps = self.snapshot.bitmaps
+        expected = {field: Voter.objects.filter(voting_history__hasall=[field]) for field in ELECTION_BITS}
+        expected.update({party_key(code): Voter.objects.filter(party_affiliation=party)
+                         for code, party in enumerate(self.snapshot.parties)})
+        expected.update({score_key(score): Voter.objects.filter(voter_score=score) for score in range(6)})
+        for key, queryset in expected.items():
+            with self.subTest(key):
+                self.assertEqual(self.voter_ids(bitmaps.get(key)), self.database_ids(queryset))
+                self.assertEqual(bitmaps.count(bitmaps.get(key)), queryset.count())
+
+    def test_combined_bitsets_match_the_database(self):
+        for _, filters, queryset in self.filter_cases():
+            bits = self.snapshot.select_bits(filters)
+            if bits is None:
+                bits = self.snapshot.bitmaps.full()
+            self.assertEqual(self.voter_ids(bits), self.database_ids(queryset))
+            self.assertEqual(self.snapshot.bitmaps.count(bits), queryset.count())
+
+    def test_union_and_intersection(self):
+        bitmaps = self.snapshot.bitmaps
+        parties = [party_key(self.snapshot.party_codes[party]) for party in ('D ', 'R ')]
+        either = Voter.objects.filter(party_affiliation__in=['D ', 'R '])
+        self.assertEqual(self.voter_ids(bitmaps.union([bitmaps.get(key) for key in parties])),
+                         self.database_ids(either))
+        self.assertEqual(bitmaps.count(bitmaps.intersect([bitmaps.get(key) for key in parties])), 0)
+        self.assertEqual(bitmaps.count(bitmaps.intersect([])), len(self.snapshot))
+        self.assertEqual(bitmaps.count(bitmaps.union([])), 0)
+        self.assertEqual(bitmaps.get('score:99').tolist(), bitmaps.empty().tolist())
+
+
+@skipIf(snapshot.np is None, 'NumPy is not installed')
+@override_settings(VOTER_SAMPLE_SIZE=100)
+class SamplingTests(SnapshotTestCase):
+    """Approximate graph counts are estimated from the sampled voters, and exact for small results."""
+
+    def test_sample_matches_are_counted_like_the_database(self):
+        sampled = Voter.objects.filter(id__in=[int(pk) for pk in self.snapshot.ids[self.snapshot.sample]])
+        self.assertEqual(sampled.count(), 100)
+        for _, filters, _ in self.filter_cases():
+            counts = approximate_graph_counts(self.snapshot, filters, min_voters=0)
+            approximate = counts['approximate']
+            self.assertEqual(approximate['sample_matches'], filter_voters(sampled, filters).count())
+            self.assertEqual((approximate['sample_size'], approximate['population']), (100, 400))
+            low, high = approximate['total']
+            self.assertLessEqual(low, counts['total'])
+            self.assertLessEqual(counts['total'], high)
+
+    def test_small_results_are_left_to_exact_counts(self):
+        for _, filters, _ in self.filter_cases():
+            self.assertIsNone(approximate_graph_counts(self.snapshot, filters))
+        # A result estimated at 400 voters is under a 401 voter threshold
+        self.assertIsNone(approximate_graph_counts(self.snapshot, parse_filters({}), min_voters=401))
+
+    def test_census_is_left_to_exact_counts(self):
+        with self.settings(VOTER_SAMPLE_SIZE=400):
+            census = build_snapshot()
+        self.assertIsNone(approximate_graph_counts(census, parse_filters({}), min_voters=0))
+
+    @no_snapshot_rebuild
+    def test_graphs_data_falls_back_to_exact_counts(self):
+        refresh_cube()
+        self.addCleanup(warmup.flush_graph_requests, force=True)
+        url = reverse('voter_analytics:graphs_data') + '?approximate=on&party_affiliation=D+'
+        exact = Voter.objects.filter(party_affiliation='D ').count()
+
+        data = self.client.get(url).json()
+        self.assertIsNone(data['approximate'])
+        self.assertEqual(data['total'], exact)
+
+        # Another query string, so the page cached above is not reused
+        with self.settings(VOTER_APPROXIMATE_MIN_VOTERS=0):
+            data = self.client.get(url + '&min_birth_year=1930').json()
+        self.assertEqual(data['approximate']['sample_size'], 100)
+
+
+@skipIf(snapshot.np is None, 'NumPy is not installed')
+class SnapshotCrosstabTests(SnapshotTestCase):
+    """The snapshot bins voters exactly like the grouped query on the database."""
+
+    def test_matches_the_database(self):
+        pairs = [[('birth_year', 5)], [('party', 1), ('score', 1)], [('birth_decade', 1), ('v22general', 1)],
+                 [('precinct', 1), ('zip_code', 1)], [('registration_year', 3), ('score', 2)]]
+        for _, filters, queryset in self.filter_cases():
+            for pair in pairs:
+                dimensions = [Dimension(name, width) for name, width in pair]
+                self.assertEqual(snapshot_crosstab(self.snapshot, filters, dimensions),
+                                 database_crosstab(queryset, dimensions))
+
+
+@skipIf(snapshot.np is None, 'NumPy is not installed')
+class SnapshotRebuildTests(TransactionTestCase):
+    """A missing snapshot is rebuilt off the request once per data version."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = self.settings(CACHES=LOCAL_CACHES, VOTER_SNAPSHOT_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(setattr, snapshot, '_loaded', None)
+        patcher = mock.patch.object(snapshot, '_rebuilt_versions', set())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Voter.objects.bulk_create(make_voters(50))
+
+    def wait_for_rebuild(self):
+        """Wait for this process's background rebuild, if one is running."""
+        for thread in threading.enumerate():
+            if thread.name == 'voter-snapshot-rebuild':
+                thread.join()
+
+    def test_missing_snapshot_is_rebuilt_in_background(self):
+        with mock.patch.object(snapshot, 'build_snapshot', wraps=build_snapshot) as build, \
+                self.assertLogs('voter_analytics.snapshot', 'WARNING'):
+            self.assertIsNone(get_snapshot())
+            self.wait_for_rebuild()
+            rebuilt = get_snapshot()
+            build.assert_called_once_with(get_data_version())
+        self.assertEqual(rebuilt.version, get_data_version())
+        self.assertEqual(len(rebuilt), 50)
+
+    def test_rebuild_is_started_once_per_version(self):
+        with mock.patch.object(snapshot, 'build_snapshot', side_effect=OSError('disk full')) as build, \
+                self.assertLogs('voter_analytics.snapshot') as logs:
+            for _ in range(3):
+                self.assertIsNone(get_snapshot())
+                self.wait_for_rebuild()
+        build.assert_called_once_with(get_data_version())
+        self.assertEqual([record.levelname for record in logs.records], ['WARNING', 'ERROR'])
+
+
+class VotingHistoryTests(TestCase):
+    """The bit-packed voting history answers the same questions as the election booleans it replaced."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # 64 voters, so every one of the 32 histories is present twice
+        Voter.objects.bulk_create(make_voters(64))
+
+    def assertLookupMatches(self, lookup, fields, expected):
+        """Check a lookup, given as a list of field names and as a mask, against a predicate on the voters."""
+        voters = list(Voter.objects.all())
+        matching = sorted(voter.pk for voter in voters if expected(voter))
+        for value in (fields, election_mask(fields)):
+            queryset = Voter.objects.filter(**{f'voting_history__{lookup}': value})
+            self.assertEqual(sorted(queryset.values_list('pk', flat=True)), matching)
+
+    def test_hasall_and_hasany_match_the_election_booleans(self):
+        for size in range(len(ELECTION_FIELDS) + 1):
+            for fields in combinations(ELECTION_FIELDS, size):
+                fields = list(fields)
+                with self.subTest(fields=fields):
+                    self.assertLookupMatches('hasall', fields, lambda voter: all(getattr(voter, field)
+                                                                                 for field in fields))
+                    self.assertLookupMatches('hasany', fields, lambda voter: any(getattr(voter, field)
+                                                                                 for field in fields))
+
+    def test_lookups_compile_to_a_list_of_histories(self):
+        queryset = Voter.objects.filter(voting_history__hasall=['v20state', 'v21town'])
+        sql, params = queryset.query.sql_with_params()
+        self.assertIn('"voting_history" IN (', sql)
+        self.assertEqual(list(params), [history for history in range(32) if history & 3 == 3])
+        # Voting in none of no elections matches nobody; voting in all of them matches everyone
+        self.assertFalse(Voter.objects.filter(voting_history__hasany=[]).exists())
+        self.assertIn('WHERE 1 = 1', str(Voter.objects.filter(voting_history__hasall=[]).query))
+        self.assertEqual(Voter.objects.filter(voting_history__hasall=[]).count(), 64)
+
+    def test_election_properties(self):
+        voter = Voter(v21town=True, v23town=True)
+        self.assertEqual(voter.voting_history, ELECTION_BITS['v21town'] | ELECTION_BITS['v23town'])
+        self.assertEqual([getattr(voter, field) for field in ELECTION_FIELDS], [False, True, False, False, True])
+        voter.v21town = False
+        voter.v20state = True
+        self.assertEqual(voter.voting_history, ELECTION_BITS['v20state'] | ELECTION_BITS['v23town'])
+        voter.v20state = True  # setting a bit again changes nothing
+        self.assertEqual(voter.voting_history, ELECTION_BITS['v20state'] | ELECTION_BITS['v23town'])
+
+
+class VotingHistoryMigrationTests(TransactionTestCase):
+    """Migration 0007 packs the election booleans into voting_history and unpacks them again when reversed."""
+
+    before = [('voter_analytics', '0006_rollups')]
+    after = [('voter_analytics', '0007_voting_history')]
+
+    def setUp(self):
+        self.executor = MigrationExecutor(connection)
+        self.addCleanup(self.migrate, self.executor.loader.graph.leaf_nodes())
+
+    def migrate(self, targets):
+        """Migrate the test database to targets, and return the historical Voter model there."""
+        self.executor.loader.build_graph()
+        self.executor.migrate(targets)
+        return self.executor.loader.project_state(targets).apps.get_model('voter_analytics', 'Voter')
+
+    def test_round_trip(self):
+        OldVoter = self.migrate(self.before)
+        booleans = [dict(zip(ELECTION_FIELDS, (bool(history & bit) for bit in ELECTION_BITS.values())))
+                    for history in range(32)]
+        OldVoter.objects.bulk_create(
+            OldVoter(first_name='First', last_name=f'Last{history}', street_number='1', street_name='Main',
+                     zip_code='02460', date_of_birth=date(1970, 1, 1), date_of_registration=date(2000, 1, 1),
+                     party_affiliation='D ', precinct_number='1', voter_score=sum(voted.values()), **voted)
+            for history, voted in enumerate(booleans))
+
+        NewVoter = self.migrate(self.after)
+        self.assertEqual(list(NewVoter.objects.order_by('pk').values_list('voting_history', 'voter_score')),
+                         [(history, sum(voted.values())) for history, voted in enumerate(booleans)])
+
+        OldVoter = self.migrate(self.before)
+        self.assertEqual(list(OldVoter.objects.order_by('pk').values(*ELECTION_FIELDS, 'voter_score')),
+                         [{**voted, 'voter_score': sum(voted.values())} for voted in booleans])
+
+
+@no_snapshot_rebuild
+@override_settings(CACHES=LOCAL_CACHES)
+class KeysetPaginationTests(TestCase):
+    """Walking the voter list by cursor visits every voter exactly once, in list order."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # make_voters repeats names, so pages split runs of equal names
+        Voter.objects.bulk_create(make_voters(250))
+
+    def setUp(self):
+        bump_data_version()  # so no page is served from the cache
+        self.filters = parse_filters({})
+        self.expected = list(Voter.objects.order_by(*SNAPSHOT_ORDERING).values_list('pk', flat=True))
+
+    def walk(self, direction):
+        """Page through every voter from one end of the list, and return their ids in list order."""
+        cursor = {'filters': self.filters, 'key': None, 'direction': direction}
+        pages = []
+        while cursor is not None:
+            page = KeysetPage(Voter.objects.all(), cursor, 30)
+            pages.append([voter.pk for voter in page.object_list])
+            more = page.has_next if direction == NEXT else page.has_previous
+            token = page.next_cursor() if direction == NEXT else page.previous_cursor()
+            cursor = decode_cursor(token) if more else None
+        if direction == PREVIOUS:
+            pages.reverse()
+        return [pk for page in pages for pk in page]
+
+    def test_next_cursors_cover_every_voter_once(self):
+        self.assertEqual(self.walk(NEXT), self.expected)
+
+    def test_previous_cursors_from_the_last_page_cover_every_voter_once(self):
+        self.assertEqual(self.walk(PREVIOUS), self.expected)
+
+    def test_list_view_links_walk_the_list(self):
+        url = reverse('voter_analytics:voters')
+        response = self.client.get(url)
+        seen = [voter.pk for voter in response.context['voters']]
+        while response.context['next_query']:
+            response = self.client.get(f"{url}?{response.context['next_query']}")
+            seen += [voter.pk for voter in response.context['voters']]
+        self.assertEqual(seen, self.expected)
+
+        response = self.client.get(f"{url}?{response.context['last_query']}")
+        self.assertEqual([voter.pk for voter in response.context['voters']], self.expected[-100:])
+        response = self.client.get(f"{url}?{response.context['previous_query']}")
+        self.assertEqual([voter.pk for voter in response.context['voters']], self.expected[-200:-100])
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        url = reverse('voter_analytics:voters')
+        token = encode_cursor(self.filters, voter_key(Voter.objects.get(pk=self.expected[99])), NEXT)
+        tampered = token[:-3] + ('AAA' if not token.endswith('AAA') else 'BBB')
+        self.assertIsNone(decode_cursor(tampered))
+        for cursor in (tampered, 'not-a-cursor'):
+            with self.subTest(cursor=cursor):
+                bump_data_version()
+                response = self.client.get(url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([voter.pk for voter in response.context['voters']], self.expected[:100])
+
+
+class VoterQueryPlanTests(TestCase):
+    """
+    EXPLAIN the voter list filters and the loader's voter_id lookups, and fail if
+    any of them stops using its index (an index or filter change that causes a
+    full table scan is caught here rather than on the full voter file).
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(500))
+
+    def assertUsesIndex(self, queryset, index):
+        """Fail unless the query plan of queryset names index."""
+        plan = queryset.explain()
+        self.assertIn(index, plan, f'expected {index} in plan:\n{plan}')
+
+    def test_list_filters_use_their_indexes(self):
+        for description, params, expected in PLAN_CHECKS:
+            queryset = filter_voters(Voter.objects.all(), parse_filters(params))
+            queries = {'list': queryset[:100], 'count': queryset.order_by()}
+            for kind, index in expected.items():
+                with self.subTest(description, kind=kind):
+                    self.assertUsesIndex(queries[kind], index)
+
+    def test_voter_id_lookups_use_the_unique_index(self):
+        plan = Voter.objects.filter(voter_id__in=['V000001', 'V000002']).explain()
+        self.assertIn('USING INDEX', plan)
+        self.assertIn('(voter_id=?)', plan)
+
+
+class RankedSearchTests(TestCase):
+    """Pages of ranked search results fit together into the full ranking."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(300))
+
+    def test_pages_match_the_full_ranking(self):
+        queryset = Voter.objects.filter(party_affiliation='D ')
+        ranked = ranked_search_ids(queryset, 'street')
+        self.assertEqual(len(ranked), queryset.count())
+        pages = [ranked_search_ids(queryset, 'street', offset, 25) for offset in range(0, len(ranked), 25)]
+        self.assertEqual([pk for page in pages for pk in page], ranked)
+
+    def test_results_load_only_the_requested_slice(self):
+        queryset = Voter.objects.all()
+        expected = ranked_search_ids(queryset, 'last1')
+        results = RankedSearchResults(queryset, 'last1', len(expected))
+        self.assertEqual(len(results), len(expected))
+        with self.assertNumQueries(2):
+            page = results[10:20]
+        self.assertEqual([voter.pk for voter in page], expected[10:20])
+
+
+
+class ExportTests(TestCase):
+    """Streamed exports hold exactly the filtered voters, in id order, in every format."""
+
+    params = {'party_affiliation': 'D ', 'v20state': 'on'}
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(120))
+
+    def setUp(self):
+        # Small chunks, so every export is written in several pieces
+        patcher = mock.patch.object(export, 'CHUNK_SIZE', 5)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        voters = filter_voters(Voter.objects.all(), parse_filters(self.params)).order_by('id')
+        self.expected = [{field: getattr(voter, field) for field in EXPORT_FIELDS} for voter in voters]
+        self.assertGreater(len(self.expected), export.CHUNK_SIZE)
+
+    def download(self, format):
+        """Return the body of an export of the filtered voters."""
+        response = self.client.get(reverse('voter_analytics:export', args=[format]), self.params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.DictReader(self.download('csv').decode().splitlines()))
+        self.assertEqual(rows, [{field: '' if value is None else str(value) for field, value in voter.items()}
+                                for voter in self.expected])
+
+    def test_ndjson(self):
+        rows = [json.loads(line) for line in self.download('ndjson').decode().splitlines()]
+        self.assertEqual(rows, [{field: value.isoformat() if field in DATE_EXPORT_FIELDS else value
+                                 for field, value in voter.items()} for voter in self.expected])
+
+    @skipIf(export.pa is None, 'pyarrow is not installed')
+    def test_arrow_and_parquet(self):
+        table = export.pa.ipc.open_stream(self.download('arrow')).read_all()
+        self.assertEqual(table.to_pylist(), self.expected)
+        table = export.pq.read_table(export.pa.BufferReader(self.download('parquet')))
+        self.assertEqual(table.to_pylist(), self.expected)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('voter_analytics:export', args=['xlsx'])).status_code, 404)
+
+
+@no_snapshot_rebuild
+@override_settings(CACHES=LOCAL_CACHES)
+class CrosstabViewTests(TestCase):
+    """The crosstab endpoint rejects bad dimensions and counts every filtered voter once."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(200))
+
+    def setUp(self):
+        bump_data_version()
+
+    def get(self, **params):
+        return self.client.get(reverse('voter_analytics:crosstab'), params)
+
+    def test_invalid_dimensions_are_rejected(self):
+        for params in ({}, {'y': 'party'}, {'x': 'height'}, {'x': 'party', 'y': 'height'},
+                       {'x': 'birth_year', 'x_bin': '0'}, {'x': 'birth_year', 'x_bin': '-5'},
+                       {'x': 'birth_year', 'x_bin': 'wide'}, {'x': 'party', 'y': 'score', 'y_bin': '0'}):
+            with self.subTest(**params):
+                response = self.get(**params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+    def test_cells_add_up_to_the_filtered_voters(self):
+        filters = {'party_affiliation': 'R ', 'min_birth_year': '1950', 'v21town': 'on'}
+        queryset = filter_voters(Voter.objects.all(), parse_filters(filters))
+        data = self.get(x='birth_decade', y='party', **filters).json()
+        self.assertEqual(data['total'], queryset.count())
+        self.assertEqual(sum(map(sum, data['counts'])), data['total'])
+        self.assertEqual(data['dimensions'][1]['bins'], ['R '])
+        for decade, row in zip(data['dimensions'][0]['bins'], data['counts']):
+            born = queryset.filter(date_of_birth__year__gte=decade, date_of_birth__year__lt=decade + 10)
+            self.assertEqual(row, [born.count()])
+
+    def test_one_dimension_with_bins(self):
+        data = self.get(x='birth_year', x_bin='7').json()
+        self.assertEqual(data['total'], 200)
+        self.assertEqual(sum(data['counts']), 200)
+        self.assertEqual(data['dimensions'][0]['bin_width'], 7)
+        self.assertTrue(all(year % 7 == 0 for year in data['dimensions'][0]['bins']))
+
+
+@no_snapshot_rebuild
+@override_settings(CACHES=LOCAL_CACHES)
+class PageCacheTests(TestCase):
+    """Cached pages are served until the data version moves on."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Voter.objects.bulk_create(make_voters(20))
+
+    def setUp(self):
+        bump_data_version()
+        self.addCleanup(warmup.flush_graph_requests, force=True)
+
+    def test_version_bump_turns_a_hit_into_a_miss(self):
+        for name in ('voter_analytics:voters', 'voter_analytics:graphs', 'voter_analytics:graphs_data'):
+            with self.subTest(name):
+                url = reverse(name) + '?party_affiliation=D+'
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+                self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+                bump_data_version()
+                self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+                self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+
+    def test_saving_a_voter_turns_a_hit_into_a_miss(self):
+        url = reverse('voter_analytics:voters')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        voter = Voter.objects.first()
+        voter.last_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            voter.save()
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertContains(response, 'Renamed')
+
+
+@no_snapshot_rebuild
+@override_settings(CACHES=LOCAL_CACHES)
+class GraphRequestLogTests(TestCase):
+    """Graph requests are buffered in memory and written to the log in batches."""
+
+    def setUp(self):
+        warmup.flush_graph_requests(force=True)
+        self.addCleanup(warmup.flush_graph_requests, force=True)
+
+    def test_cache_hits_do_not_write(self):
+        url = reverse('voter_analytics:graphs') + '?party_affiliation=D+'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with mock.patch.object(warmup, 'REQUEST_LOG_FLUSH_SECONDS', 0), self.assertNumQueries(0):
+            for _ in range(3):
+                response = self.client.get(url)
+                self.assertEqual(response['X-Cache'], 'HIT')
+
+    def test_flush_adds_buffered_counts(self):
+        filters = parse_filters({'party_affiliation': 'R '})
+        for _ in range(5):
+            warmup.record_graph_request(filters)
+        self.assertEqual(warmup.flush_graph_requests(), 0)  # not due yet
+        self.assertEqual(warmup.flush_graph_requests(force=True), 1)
+        warmup.record_graph_request(filters)
+        warmup.flush_graph_requests(force=True)
+        self.assertEqual(GraphRequestLog.objects.get().requests, 6)
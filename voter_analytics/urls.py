@@ -4,11 +4,18 @@
 # Description: URL configuration for voter analytics application
 
 from django.urls import path
-from .views import VoterListView, VoterDetailView, GraphsView
+from .views import VoterListView, VoterDetailView, VoterExportView, PrecinctListView, PrecinctDetailView, RollupDataView, GraphsView, GraphsDataView, CrosstabView, plotly_js
 
 app_name = 'voter_analytics'
 urlpatterns = [
     path('', VoterListView.as_view(), name='voters'),
+    path('export.<str:format>', VoterExportView.as_view(), name='export'),
     path('voter/<int:pk>', VoterDetailView.as_view(), name='voter'),
     path('graphs', GraphsView.as_view(), name='graphs'),
+    path('precincts', PrecinctListView.as_view(), name='precincts'),
+    path('precincts/<str:precinct>', PrecinctDetailView.as_view(), name='precinct'),
+    path('rollups.json', RollupDataView.as_view(), name='rollups_data'),
+    path('graphs.json', GraphsDataView.as_view(), name='graphs_data'),
+    path('crosstab.json', CrosstabView.as_view(), name='crosstab'),
+    path('plotly-<str:version>.min.js', plotly_js, name='plotly_js'),
 ]
\ No newline at end of file
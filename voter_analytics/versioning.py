@@ -0,0 +1,63 @@
+# File: voter_analytics/versioning.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Shared data-version stamp for the Voter table, bumped whenever the loader changes it
+
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+
+DATA_VERSION_KEY = 'voter_analytics:data_version'
+
+# Cache alias holding the stamp; unlike the default cache it holds only a
+# few keys, so the stamp is never culled to make room for cached pages
+VERSION_CACHE = 'versions'
+
+
+def get_data_version():
+    """
+    Return the current data version of the Voter table.
+
+    The stamp lives in the shared 'versions' cache so every worker process
+    sees the same value. If it is missing (a first run, or the cache
+    directory was cleared), a fresh stamp is issued, which makes anything
+    derived from an older version look stale and get rebuilt.
+
+    Returns:
+        str --> opaque version stamp
+    """
+    cache = caches[VERSION_CACHE]
+    version = cache.get(DATA_VERSION_KEY)
+    if version is None:
+        cache.add(DATA_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(DATA_VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """
+    Mark the Voter table as changed.
+
+    The loader calls this after every committed load or sync, and saving a
+    single Voter calls it through voter_saved. Code that deletes or bulk
+    edits Voter rows some other way (e.g. from the shell) should call it too.
+
+    Returns:
+        str --> the new version stamp
+    """
+    version = uuid.uuid4().hex
+    caches[VERSION_CACHE].set(DATA_VERSION_KEY, version, timeout=None)
+    return version
+
+
+def voter_saved(sender, **kwargs):
+    """
+    Bump the data version once a Voter saved outside the loader is committed.
+
+    Connected to post_save in VoterAnalyticsConfig.ready. The loader's bulk
+    writes do not send signals, and no delete signal is connected, so bulk
+    deletes keep Django's fast path.
+    """
+    transaction.on_commit(bump_data_version)
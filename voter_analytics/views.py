@@ -3,16 +3,148 @@
 # BU email: belsanyj@bu.edu
 # Description: Views for voter analytics application inclding list and detail views with filtering 
 
-from django.shortcuts import render
+import gzip
+from urllib.parse import urlencode
+
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.cache import cache_control
 from django.views.generic import ListView, DetailView
-from .models import Voter
+from .models import PrecinctRollup, StreetRollup, Voter
+from .parsing import ELECTION_FIELDS
+from .aggregates import graph_counts
+from .charts import graph_figures
+from .crosstab import DIMENSIONS, Dimension, crosstab
+from .export import EXPORT_FORMATS, available_formats
+from .cube import cube_supports, cube_graph_counts
+from .filters import parse_filters, filter_voters, filter_query_string
+from .metadata import get_filter_metadata
+from .snapshot import get_snapshot, snapshot_supports, SnapshotResults
+from .sampling import approximate_graph_counts
+from .search import RankedSearchResults
+from .rollups import rollup_dict
+from .pagination import KeysetPage, decode_cursor, encode_cursor, voter_key, total_count, NEXT, PREVIOUS
+from .result_cache import page_cache
+from .versioning import get_data_version
+from .warmup import flush_graph_requests, record_graph_request
 from django.db.models import Q
-import plotly.graph_objects as go
-import plotly.express as px
-from collections import Counter
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
 # Create your views here.
 
-class VoterListView(ListView):
+# plotly.js is served under a versioned URL, so it can be cached for a year
+PLOTLY_JS_MAX_AGE = 365 * 24 * 60 * 60
+
+# Gzipped plotly.js bundle, built on first request
+_plotly_js_gzip = None
+
+class VoterFilterMixin:
+    """
+    Filtering shared by the voter list and graph views.
+    
+    Reads the filter form from the query string and provides both the
+    filtered QuerySet and the context needed to redraw the filter form.
+    """
+    
+    def get_filters(self):
+        """
+        Get the parsed filters for this request.
+        
+        Returns:
+            dict: Canonical filters from voter_analytics.filters.parse_filters
+        """
+        if not hasattr(self, '_filters'):
+            self._filters = parse_filters(self.request.GET)
+        return self._filters
+    
+    def get_queryset(self):
+        """
+        Get the filtered queryset of voters based on query parameters.
+        
+        Returns:
+            QuerySet: Filtered set of Voter objects
+        """
+        return filter_voters(Voter.objects.all(), self.get_filters())
+    
+    def get_filter_context(self):
+        """
+        Build the filter options and current filter values for the template.
+        
+        Returns:
+            dict: Context entries for the filter form
+        """
+        context = {}
+        
+        # Dropdown options come from the cached filter metadata, so they cost no queries
+        metadata = get_filter_metadata()
+        context['party_affiliations'] = metadata['parties']
+        context['birth_years'] = range(metadata['min_birth_year'], metadata['max_birth_year'] + 1)
+        context['voter_scores'] = range(metadata['min_score'], metadata['max_score'] + 1)
+        
+        # Pass current filter values back to template (from the parsed filters,
+        # which may have come from a pagination cursor rather than the form)
+        filters = self.get_filters()
+        
+        def current(value):
+            return '' if value is None else str(value)
+        
+        context['current_party'] = current(filters['party_affiliation'])
+        context['current_min_year'] = current(filters['min_birth_year'])
+        context['current_max_year'] = current(filters['max_birth_year'])
+        context['current_voter_score'] = current(filters['voter_score'])
+        context['current_search'] = current(filters['search'])
+        for field in ELECTION_FIELDS:
+            context[f'current_{field}'] = 'on' if field in filters['elections'] else ''
+        
+        return context
+
+
+class CachedPageMixin:
+    """
+    Serve repeat requests for a voter page from the rendered page cache.
+    
+    Pages are keyed by the parsed filters (so parameter order, empty values
+    and unchecked boxes don't matter) plus anything else that changes the
+    page, and are stamped with the data version so a reload invalidates them.
+    The X-Cache response header says whether the page came from the cache.
+    """
+    page_content_type = 'text/html; charset=utf-8'
+    
+    def get_page_cache_parts(self):
+        """
+        Get everything that identifies the rendered page.
+        
+        Returns:
+            list: JSON-serialisable key parts
+        """
+        return [self.__class__.__name__, self.get_filters()]
+    
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Return the cached page for a GET if there is one, otherwise render and cache it.
+        """
+        if request.method != 'GET':
+            return super().dispatch(request, *args, **kwargs)
+        
+        version = get_data_version()
+        key = page_cache.make_key(*self.get_page_cache_parts())
+        content = page_cache.get(key, version)
+        if content is not None:
+            response = HttpResponse(content, content_type=self.page_content_type)
+            response['X-Cache'] = 'HIT'
+            return response
+        
+        response = super().dispatch(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code == 200:
+            page_cache.set(key, version, response.content)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+class VoterListView(CachedPageMixin, VoterFilterMixin, ListView):
     """
     View to display a paginated list of voters with filtering options.
     
@@ -24,48 +156,127 @@ class VoterListView(ListView):
     context_object_name = 'voters'
     paginate_by = 100
     
-    def get_queryset(self):
+    def get_cursor(self):
         """
-        Get the filtered queryset of voters based on query parameters.
+        Get the keyset pagination cursor for this request, if there is one.
         
         Returns:
-            QuerySet: Filtered set of Voter objects
+            dict or None: Decoded cursor (see voter_analytics.pagination.decode_cursor)
+        """
+        if not hasattr(self, '_cursor'):
+            token = self.request.GET.get('cursor')
+            self._cursor = decode_cursor(token) if token else None
+        return self._cursor
+    
+    def get_filters(self):
+        """
+        Get the filters for this request, taking them from the cursor when paging.
+        
+        Returns:
+            dict: Canonical filters from voter_analytics.filters.parse_filters
         """
-        queryset = Voter.objects.all()
-        
-        # Filter by party affiliation
-        party = self.request.GET.get('party_affiliation')
-        if party:
-            queryset = queryset.filter(party_affiliation=party)
-        
-        # Filter by minimum birth year
-        min_year = self.request.GET.get('min_birth_year')
-        if min_year:
-            queryset = queryset.filter(date_of_birth__year__gte=int(min_year))
-        
-        # Filter by maximum birth year
-        max_year = self.request.GET.get('max_birth_year')
-        if max_year:
-            queryset = queryset.filter(date_of_birth__year__lte=int(max_year))
-        
-        # Filter by voter score
-        voter_score = self.request.GET.get('voter_score')
-        if voter_score:
-            queryset = queryset.filter(voter_score=int(voter_score))
-        
-        # Filter by specific elections
-        if self.request.GET.get('v20state'):
-            queryset = queryset.filter(v20state=True)
-        if self.request.GET.get('v21town'):
-            queryset = queryset.filter(v21town=True)
-        if self.request.GET.get('v21primary'):
-            queryset = queryset.filter(v21primary=True)
-        if self.request.GET.get('v22general'):
-            queryset = queryset.filter(v22general=True)
-        if self.request.GET.get('v23town'):
-            queryset = queryset.filter(v23town=True)
-        
-        return queryset
+        cursor = self.get_cursor()
+        if cursor is not None:
+            return cursor['filters']
+        return super().get_filters()
+    
+    def get_page_cache_parts(self):
+        """
+        Identify the page by its filters and its cursor position or page number.
+        
+        Returns:
+            list: JSON-serialisable key parts
+        """
+        cursor = self.get_cursor()
+        if cursor is not None:
+            position = ['cursor', cursor['key'], cursor['direction']]
+        else:
+            position = ['page', self.request.GET.get('page') or '1']
+        return super().get_page_cache_parts() + position
+    
+    def paginate_queryset(self, queryset, page_size):
+        """
+        Paginate the matching voters.
+        
+        Requests with a cursor seek straight to their page through the sort
+        index (keyset pagination), so every page costs the same. Otherwise
+        the page number is used: searches fetch one page of ids ranked by
+        the full-text index, and other filters are applied as array operations
+        on the columnar snapshot when available. Either way only the voters
+        on the requested page are loaded from the database.
+        
+        Parameters:
+            queryset --> Filtered QuerySet
+            page_size --> Number of voters per page
+            
+        Returns:
+            tuple --> (paginator, page, object_list, is_paginated)
+        """
+        cursor = self.get_cursor()
+        if cursor is not None:
+            self.keyset_page = KeysetPage(queryset, cursor, page_size)
+            return (None, None, self.keyset_page.object_list, True)
+        
+        filters = self.get_filters()
+        if filters['search'] is not None:
+            # Search results are ranked by relevance, so they page by number
+            unsearched = filter_voters(Voter.objects.all(), dict(filters, search=None))
+            queryset = RankedSearchResults(unsearched, filters['search'], total_count(queryset, filters))
+        else:
+            snapshot = get_snapshot()
+            if snapshot is not None and snapshot_supports(filters):
+                queryset = SnapshotResults(snapshot.select_ids(filters))
+        return super().paginate_queryset(queryset, page_size)
+    
+    def get_pagination_context(self, context):
+        """
+        Build the links and total count for the pagination bar.
+        
+        Pages in name order link to each other by cursor; ranked search
+        results link by page number.
+        
+        Parameters:
+            context --> Context from ListView.get_context_data
+            
+        Returns:
+            dict --> Query strings for the First/Previous/Next/Last links and total count
+        """
+        filters = self.get_filters()
+        first_page_query = filter_query_string(filters)
+        voters = list(context['object_list'])
+        page = context['page_obj']
+        
+        if page is None:
+            has_next = self.keyset_page.has_next
+            has_previous = self.keyset_page.has_previous
+            count = total_count(self.object_list, filters)
+        else:
+            has_next = page.has_next()
+            has_previous = page.has_previous()
+            count = page.paginator.count
+        
+        if filters['search'] is not None:
+            def page_query(number):
+                return f'{first_page_query}&page={number}'
+            
+            return {
+                'total_count': count,
+                'next_query': page_query(page.next_page_number()) if has_next else None,
+                'previous_query': page_query(page.previous_page_number()) if has_previous else None,
+                'last_query': page_query(page.paginator.num_pages),
+                'first_page_query': first_page_query,
+            }
+        
+        def cursor_query(key, direction):
+            return urlencode({'cursor': encode_cursor(filters, key, direction)})
+        
+        return {
+            'total_count': count,
+            'next_query': cursor_query(voter_key(voters[-1]), NEXT) if has_next and voters else None,
+            'previous_query': cursor_query(voter_key(voters[0]), PREVIOUS) if has_previous and voters else None,
+            'last_query': cursor_query(None, PREVIOUS),
+            'first_page_query': first_page_query,
+        }
     
     def get_context_data(self, **kwargs):
         """
@@ -78,30 +289,39 @@ class VoterListView(ListView):
             dict --> Context dictionary with filter options and current values
         """
         context = super().get_context_data(**kwargs)
+        context.update(self.get_filter_context())
+        context.update(self.get_pagination_context(context))
+        context['export_formats'] = available_formats()
+        return context
+
+
+class VoterExportView(VoterFilterMixin, View):
+    """
+    Stream every voter matching the list filters as a downloadable file.
+    
+    Takes the same query parameters as VoterListView. Rows are read through
+    a database cursor and written out a chunk at a time, so memory use stays
+    bounded however many voters match and the download starts at once.
+    """
+    
+    def get(self, request, format):
+        """
+        Stream the export.
         
-        # Get unique party affiliations
-        context['party_affiliations'] = Voter.objects.values_list('party_affiliation', flat=True).distinct().order_by('party_affiliation')
-        
-        # Generate birth year range (from min to max in database)
-        min_year = Voter.objects.order_by('date_of_birth').first().date_of_birth.year if Voter.objects.exists() else 1900
-        max_year = Voter.objects.order_by('-date_of_birth').first().date_of_birth.year if Voter.objects.exists() else 2024
-        context['birth_years'] = range(min_year, max_year + 1)
-        
-        # Voter scores (0-5)
-        context['voter_scores'] = range(0, 6)
-        
-        # Pass current filter values back to template
-        context['current_party'] = self.request.GET.get('party_affiliation', '')
-        context['current_min_year'] = self.request.GET.get('min_birth_year', '')
-        context['current_max_year'] = self.request.GET.get('max_birth_year', '')
-        context['current_voter_score'] = self.request.GET.get('voter_score', '')
-        context['current_v20state'] = self.request.GET.get('v20state', '')
-        context['current_v21town'] = self.request.GET.get('v21town', '')
-        context['current_v21primary'] = self.request.GET.get('v21primary', '')
-        context['current_v22general'] = self.request.GET.get('v22general', '')
-        context['current_v23town'] = self.request.GET.get('v23town', '')
+        Parameters:
+            request --> HttpRequest
+            format --> one of the names in voter_analytics.export.EXPORT_FORMATS
+            
+        Returns:
+            StreamingHttpResponse --> the export, as an attachment
+        """
+        if format not in available_formats():
+            raise Http404(f'Unsupported export format: {format}')
         
-        return context
+        stream, content_type, _ = EXPORT_FORMATS[format]
+        response = StreamingHttpResponse(stream(self.get_queryset()), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="voters.{format}"'
+        return response
 
 
 class VoterDetailView(DetailView):
@@ -134,160 +354,292 @@ class VoterDetailView(DetailView):
         
         return context
     
-class GraphsView(ListView):
+class PrecinctListView(ListView):
+    """
+    View to display the voter summary of every precinct.
+    
+    Reads the precinct rollups maintained by the loader, so it never
+    groups the Voter table.
+    """
+    model = PrecinctRollup
+    template_name = 'voter_analytics/precinct_list.html'
+    context_object_name = 'precincts'
+
+
+class PrecinctDetailView(DetailView):
+    """
+    View to display a precinct's summary and the summary of each of its streets.
+    """
+    model = PrecinctRollup
+    template_name = 'voter_analytics/precinct_detail.html'
+    context_object_name = 'precinct'
+    slug_field = 'precinct_number'
+    slug_url_kwarg = 'precinct'
+    
+    def get_context_data(self, **kwargs):
+        """
+        Add the precinct's street rollups to context.
+        
+        Parameters:
+            **kwargs: Additional keyword arguments
+            
+        Returns:
+            dict: Context dictionary with the street rollups
+        """
+        context = super().get_context_data(**kwargs)
+        context['streets'] = StreetRollup.objects.filter(precinct_number=self.object.precinct_number)
+        return context
+
+
+class RollupDataView(View):
+    """
+    JSON endpoint for the precinct and street rollups.
+    
+    Returns every precinct, or with ?precinct=<number> that precinct and
+    each of its streets.
+    """
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Return the requested rollups as JSON.
+        """
+        precinct_number = request.GET.get('precinct')
+        if not precinct_number:
+            return JsonResponse({'precincts': [
+                {'precinct_number': rollup.precinct_number, **rollup_dict(rollup)}
+                for rollup in PrecinctRollup.objects.all()
+            ]})
+        
+        precinct = get_object_or_404(PrecinctRollup, precinct_number=precinct_number)
+        return JsonResponse({
+            'precinct_number': precinct.precinct_number,
+            **rollup_dict(precinct),
+            'streets': [
+                {'street_name': rollup.street_name, **rollup_dict(rollup)}
+                for rollup in StreetRollup.objects.filter(precinct_number=precinct_number)
+            ],
+        })
+
+
+class GraphCountsMixin(VoterFilterMixin):
+    """
+    Counts behind the voter graphs, shared by the graphs page and its JSON endpoint.
+    
+    With approximate=on in the query string, large results are estimated
+    from the uniform sample kept with the snapshot (see voter_analytics.sampling).
+    """
+    
+    def is_approximate(self):
+        """
+        Check whether approximate mode was requested.
+        
+        Returns:
+            bool: True if graphs may be estimated from the sample
+        """
+        return bool(self.request.GET.get('approximate'))
+    
+    def get_page_cache_parts(self):
+        """
+        Identify the page by its filters and whether it is approximate.
+        
+        Returns:
+            list: JSON-serialisable key parts
+        """
+        return super().get_page_cache_parts() + [self.is_approximate()]
+    
+    def get_graph_counts(self):
+        """
+        Get the counts behind the three graphs without loading any Voter rows.
+        
+        In approximate mode, estimates the counts from the sample unless the
+        result is small enough to count exactly. Otherwise uses the aggregate
+        cube when every filter maps onto it, then the columnar snapshot, and
+        grouped aggregate queries if neither can answer the filters (e.g. a
+        name search).
+        
+        Returns:
+            dict: Counts as returned by voter_analytics.aggregates.graph_counts,
+                  plus an 'approximate' entry when they were estimated
+        """
+        filters = self.get_filters()
+        snapshot = get_snapshot()
+        if self.is_approximate() and snapshot is not None and snapshot_supports(filters):
+            counts = approximate_graph_counts(snapshot, filters)
+            if counts is not None:
+                return counts
+        
+        if cube_supports(filters):
+            return cube_graph_counts(filters)
+        if snapshot is not None and snapshot_supports(filters):
+            return snapshot.graph_counts(filters)
+        return graph_counts(self.get_queryset())
+
+
+class GraphRequestLogMixin:
+    """
+    Count every GET in the graph request log, including cache hits.
+    
+    Must come before CachedPageMixin, which answers hits without calling
+    the rest of the view. Requests are counted in process memory, and the
+    counts are written to the log (at most once a minute) only after a page
+    has been rendered, so a cache hit never writes to the database. Pages
+    rendered by the warm-up job are not counted.
+    """
+    
+    def dispatch(self, request, *args, **kwargs):
+        """
+        Count the requested filters, serve the page, and write the counts out after a cache miss.
+        """
+        if request.method != 'GET' or getattr(request, 'warmup', False):
+            return super().dispatch(request, *args, **kwargs)
+        record_graph_request(parse_filters(request.GET))
+        response = super().dispatch(request, *args, **kwargs)
+        if response.get('X-Cache') != 'HIT':
+            flush_graph_requests()
+        return response
+
+
+class GraphsView(GraphRequestLogMixin, GraphCountsMixin, CachedPageMixin, ListView):
     """
     View to display graphs of voter data with filtering options.
     
-    Generates three graphs using Plotly:
+    Generates three graphs drawn in the browser by plotly.js:
     1. Histogram of voters by year of birth
     2. Pie chart of voters by party affiliation
     3. Bar chart of voter participation by election
+    
+    The page embeds each figure as a small JSON spec and loads plotly.js
+    once from plotly_js, which browsers cache. Changing the filters fetches
+    new figures from GraphsDataView instead of reloading the page.
     """
     model = Voter
     template_name = 'voter_analytics/graphs.html'
     context_object_name = 'voters'
     
-    def get_queryset(self):
-        """
-        Get the filtered queryset of voters based on query parameters.
-        Reuses the same filtering logic as VoterListView.
-        
-        Returns:
-            QuerySet: Filtered set of Voter objects
-        """
-        queryset = Voter.objects.all()
-        
-        # Filter by party affiliation
-        party = self.request.GET.get('party_affiliation')
-        if party:
-            queryset = queryset.filter(party_affiliation=party)
-        
-        # Filter by minimum birth year
-        min_year = self.request.GET.get('min_birth_year')
-        if min_year:
-            queryset = queryset.filter(date_of_birth__year__gte=int(min_year))
-        
-        # Filter by maximum birth year
-        max_year = self.request.GET.get('max_birth_year')
-        if max_year:
-            queryset = queryset.filter(date_of_birth__year__lte=int(max_year))
-        
-        # Filter by voter score
-        voter_score = self.request.GET.get('voter_score')
-        if voter_score:
-            queryset = queryset.filter(voter_score=int(voter_score))
-        
-        # Filter by specific elections
-        if self.request.GET.get('v20state'):
-            queryset = queryset.filter(v20state=True)
-        if self.request.GET.get('v21town'):
-            queryset = queryset.filter(v21town=True)
-        if self.request.GET.get('v21primary'):
-            queryset = queryset.filter(v21primary=True)
-        if self.request.GET.get('v22general'):
-            queryset = queryset.filter(v22general=True)
-        if self.request.GET.get('v23town'):
-            queryset = queryset.filter(v23town=True)
-        
-        return queryset
-    
     def get_context_data(self, **kwargs):
         """
-        Add graph visualizations and filter options to context.
+        Add graph figure specs and filter options to context.
         
         Parameters:
             **kwargs: Additional keyword arguments
             
         Returns:
-            dict: Context dictionary with graph HTML and filter options
+            dict: Context dictionary with figure specs and filter options
         """
         context = super().get_context_data(**kwargs)
+        counts = self.get_graph_counts()
+        context['figures'] = graph_figures(counts)
+        context['approximate'] = counts.get('approximate')
+        context['current_approximate'] = 'on' if self.is_approximate() else ''
+        context['plotly_version'] = get_plotlyjs_version()
+        context['crosstab_dimensions'] = DIMENSIONS.items()
         
-        # Get filtered voters
-        voters = self.get_queryset()
-        
-        # Graph 1: Histogram of voters by year of birth
-        birth_years = [voter.date_of_birth.year for voter in voters]
-        year_counts = Counter(birth_years)
-        
-        fig1 = go.Figure(data=[
-            go.Bar(
-                x=sorted(year_counts.keys()),
-                y=[year_counts[year] for year in sorted(year_counts.keys())],
-                marker_color='#6B7FFF'
-            )
-        ])
-        fig1.update_layout(
-            title=f'Voter distribution by Year of Birth (n={len(voters)})',
-            xaxis_title='Year of Birth',
-            yaxis_title='Count',
-            plot_bgcolor='#E8ECEF',
-            paper_bgcolor='white',
-            font=dict(size=14)
-        )
-        context['birth_year_graph'] = fig1.to_html(full_html=False)
-        
-        # Graph 2: Pie chart of voters by party affiliation
-        party_counts = Counter([voter.party_affiliation for voter in voters])
-        
-        fig2 = go.Figure(data=[
-            go.Pie(
-                labels=list(party_counts.keys()),
-                values=list(party_counts.values()),
-                textposition='inside',
-                textinfo='percent+label'
-            )
-        ])
-        fig2.update_layout(
-            title=f'Voter distribution by Party Affiliation (n={len(voters)})',
-            font=dict(size=14)
-        )
-        context['party_affiliation_graph'] = fig2.to_html(full_html=False)
-        
-        # Graph 3: Bar chart of voter participation by election
-        elections = {
-            'v20state': sum(1 for v in voters if v.v20state),
-            'v21town': sum(1 for v in voters if v.v21town),
-            'v21primary': sum(1 for v in voters if v.v21primary),
-            'v22general': sum(1 for v in voters if v.v22general),
-            'v23town': sum(1 for v in voters if v.v23town),
-        }
+        # Add filter options (shared with VoterListView)
+        context.update(self.get_filter_context())
         
-        fig3 = go.Figure(data=[
-            go.Bar(
-                x=list(elections.keys()),
-                y=list(elections.values()),
-                marker_color='#6B7FFF'
-            )
-        ])
-        fig3.update_layout(
-            title=f'Vote Count by Election (n={len(voters)})',
-            xaxis_title='Election',
-            yaxis_title='Number of Voters',
-            plot_bgcolor='#E8ECEF',
-            paper_bgcolor='white',
-            font=dict(size=14)
-        )
-        context['election_participation_graph'] = fig3.to_html(full_html=False)
-        
-        # Add filter options (reuse from VoterListView)
-        context['party_affiliations'] = Voter.objects.values_list('party_affiliation', flat=True).distinct().order_by('party_affiliation')
-        
-        min_year = Voter.objects.order_by('date_of_birth').first().date_of_birth.year if Voter.objects.exists() else 1900
-        max_year = Voter.objects.order_by('-date_of_birth').first().date_of_birth.year if Voter.objects.exists() else 2024
-        context['birth_years'] = range(min_year, max_year + 1)
-        
-        context['voter_scores'] = range(0, 6)
-        
-        # Pass current filter values back to template
-        context['current_party'] = self.request.GET.get('party_affiliation', '')
-        context['current_min_year'] = self.request.GET.get('min_birth_year', '')
-        context['current_max_year'] = self.request.GET.get('max_birth_year', '')
-        context['current_voter_score'] = self.request.GET.get('voter_score', '')
-        context['current_v20state'] = self.request.GET.get('v20state', '')
-        context['current_v21town'] = self.request.GET.get('v21town', '')
-        context['current_v21primary'] = self.request.GET.get('v21primary', '')
-        context['current_v22general'] = self.request.GET.get('v22general', '')
-        context['current_v23town'] = self.request.GET.get('v23town', '')
-        
-        return context
\ No newline at end of file
+        return context
+
+
+class GraphsDataView(GraphRequestLogMixin, GraphCountsMixin, CachedPageMixin, View):
+    """
+    JSON endpoint returning the graph figure specs for a set of filters.
+    
+    Takes the same query parameters as GraphsView, so the graphs page can
+    redraw its charts without a full reload.
+    """
+    page_content_type = 'application/json'
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Return the total and figure specs as JSON.
+        """
+        counts = self.get_graph_counts()
+        return JsonResponse({'total': counts['total'], 'figures': graph_figures(counts),
+                             'approximate': counts.get('approximate')})
+
+
+class CrosstabView(CachedPageMixin, VoterFilterMixin, View):
+    """
+    JSON endpoint counting the filtered voters per bin of one or two dimensions.
+    
+    Takes the list filters plus x (and optionally y) naming a dimension from
+    voter_analytics.crosstab.DIMENSIONS, and x_bin / y_bin bin widths for
+    numeric dimensions, e.g. crosstab.json?x=birth_year&x_bin=5&y=party.
+    The chart builder on the graphs page draws its charts from this.
+    """
+    page_content_type = 'application/json'
+    crosstab_params = ['x', 'x_bin', 'y', 'y_bin']
+    
+    def get_page_cache_parts(self):
+        """
+        Identify the response by its filters and requested dimensions.
+        
+        Returns:
+            list: JSON-serialisable key parts
+        """
+        return super().get_page_cache_parts() + [self.request.GET.get(name) for name in self.crosstab_params]
+    
+    def get_dimensions(self):
+        """
+        Read the requested dimensions from the query string.
+        
+        Returns:
+            list: One or two Dimension objects
+            
+        Raises:
+            ValueError: If a dimension or bin width is missing or invalid
+        """
+        dimensions = []
+        for axis in ('x', 'y'):
+            name = self.request.GET.get(axis)
+            if not name:
+                continue
+            width = self.request.GET.get(f'{axis}_bin') or '1'
+            if not width.isdigit():
+                raise ValueError(f'{axis}_bin must be a positive integer')
+            dimensions.append(Dimension(name, int(width)))
+        if not dimensions or not self.request.GET.get('x'):
+            raise ValueError('the x dimension is required')
+        return dimensions
+    
+    def get(self, request, *args, **kwargs):
+        """
+        Return the binned counts as JSON, or a 400 response describing a bad parameter.
+        """
+        try:
+            dimensions = self.get_dimensions()
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(crosstab(self.get_queryset(), self.get_filters(), dimensions, get_snapshot()))
+
+
+@cache_control(public=True, max_age=PLOTLY_JS_MAX_AGE, immutable=True)
+def plotly_js(request, version):
+    """
+    Serve the plotly.js bundle that ships with the plotly package.
+    
+    The URL contains the plotly.js version, so browsers may cache it for a
+    year; a plotly upgrade changes the URL. The bundle is compressed once
+    per process and sent gzipped to clients that accept it.
+    
+    Parameters:
+        request --> HttpRequest
+        version --> plotly.js version from the URL
+        
+    Returns:
+        HttpResponse --> the JavaScript bundle
+    """
+    global _plotly_js_gzip
+    if version != get_plotlyjs_version():
+        raise Http404('Unknown plotly.js version')
+    
+    if _plotly_js_gzip is None:
+        _plotly_js_gzip = gzip.compress(get_plotlyjs().encode(), compresslevel=9)
+    
+    if 'gzip' in request.headers.get('Accept-Encoding', ''):
+        response = HttpResponse(_plotly_js_gzip, content_type='application/javascript')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(gzip.decompress(_plotly_js_gzip), content_type='application/javascript')
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,224 @@
+# File: voter_analytics/warmup.py
+# Name: Jed Belsany
+# BU email: belsanyj@bu.edu
+# Description: Request log of graph filters and the warm-up job that renders the default and most-requested
+#              graph pages into the shared page cache after every data load
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.db import IntegrityError, connections, transaction
+from django.db.models import F
+from django.http import HttpRequest, QueryDict
+from django.urls import resolve, reverse
+from django.utils import timezone
+
+from .filters import filter_query_string, filters_key, parse_filters
+from .models import GraphRequestLog, WarmupJob
+from .versioning import get_data_version
+
+
+# Most-requested filter combinations warmed besides the unfiltered graphs
+DEFAULT_TOP = 20
+DEFAULT_WORKERS = 4
+
+# Seconds between writing a process's buffered graph requests to the log
+REQUEST_LOG_FLUSH_SECONDS = 60
+# Filter combinations buffered per process; requests for others wait for the next flush
+REQUEST_LOG_MAX_PENDING = 1000
+
+# filters_key -> [filters, requests, last requested] not yet written to GraphRequestLog
+_pending_requests = {}
+_pending_lock = threading.Lock()
+_flushed_at = time.monotonic()
+
+# URL names of the pages warmed for every filter combination
+WARMUP_PAGES = ['voter_analytics:graphs', 'voter_analytics:graphs_data']
+
+
+def record_graph_request(filters):
+    """
+    Count one request for a set of graph filters, in this process's memory only.
+
+    The counts reach the request log when flush_graph_requests runs, so
+    serving a page from the cache never writes to the database.
+
+    Parameters:
+        filters --> dict from voter_analytics.filters.parse_filters
+    """
+    key = filters_key(filters)
+    now = timezone.now()
+    with _pending_lock:
+        pending = _pending_requests.get(key)
+        if pending is not None:
+            pending[1] += 1
+            pending[2] = now
+        elif len(_pending_requests) < REQUEST_LOG_MAX_PENDING:
+            _pending_requests[key] = [filters, 1, now]
+
+
+def flush_graph_requests(force=False):
+    """
+    Add the graph requests buffered in this process to the request log.
+
+    Does nothing until REQUEST_LOG_FLUSH_SECONDS have passed since the last
+    flush, unless force is set.
+
+    Returns:
+        int --> number of filter combinations written
+    """
+    global _pending_requests, _flushed_at
+    with _pending_lock:
+        if not force and time.monotonic() - _flushed_at < REQUEST_LOG_FLUSH_SECONDS:
+            return 0
+        pending, _pending_requests = _pending_requests, {}
+        _flushed_at = time.monotonic()
+
+    for key, (filters, requests, now) in pending.items():
+        logged = GraphRequestLog.objects.filter(filters_key=key)
+        if logged.update(requests=F('requests') + requests, last_requested=now):
+            continue
+        try:
+            with transaction.atomic():
+                GraphRequestLog.objects.create(filters_key=key, filters=filters, requests=requests, last_requested=now)
+        except IntegrityError:  # another process logged the first request at the same moment
+            logged.update(requests=F('requests') + requests, last_requested=now)
+    return len(pending)
+
+
+def warmup_filters(top=DEFAULT_TOP):
+    """
+    Choose the filter combinations to warm: no filters, then the most requested ones.
+
+    Parameters:
+        top --> how many logged combinations to add
+
+    Returns:
+        list --> filter dicts, without duplicates
+    """
+    flush_graph_requests(force=True)
+    default = parse_filters({})
+    chosen = {filters_key(default): default}
+    for entry in GraphRequestLog.objects.all()[:top]:
+        # Logs written before a filter existed lack its key; parse_filters fills it in
+        filters = parse_filters(QueryDict(filter_query_string({**default, **entry.filters})))
+        chosen.setdefault(filters_key(filters), filters)
+    return list(chosen.values())
+
+
+def enqueue_warmup(version):
+    """
+    Queue a warm-up job for a data version, retiring jobs queued for older versions.
+
+    Called by the loader once a load or sync has committed.
+
+    Parameters:
+        version --> data version the pages should be rendered for
+
+    Returns:
+        WarmupJob --> the queued job
+    """
+    WarmupJob.objects.filter(status=WarmupJob.QUEUED).update(status=WarmupJob.SUPERSEDED,
+                                                             finished=timezone.now())
+    return WarmupJob.objects.create(data_version=version)
+
+
+def _render_page(url_name, filters):
+    """
+    Render one page through its view, which stores it in the page cache.
+
+    Runs in a worker thread, so the thread's database connection is closed afterwards.
+
+    Returns:
+        float --> milliseconds taken
+    """
+    started = time.perf_counter()
+    try:
+        request = HttpRequest()
+        request.method = 'GET'
+        request.warmup = True  # keeps the page out of the request log
+        request.path = request.path_info = reverse(url_name)
+        request.GET = QueryDict(filter_query_string(filters))
+        request.META['QUERY_STRING'] = request.GET.urlencode()
+        match = resolve(request.path_info)
+        response = match.func(request, *match.args, **match.kwargs)
+        if response.status_code != 200:
+            raise ValueError(f'HTTP {response.status_code}')
+    finally:
+        connections.close_all()
+    return (time.perf_counter() - started) * 1000
+
+
+def run_warmup(job, workers=DEFAULT_WORKERS, top=DEFAULT_TOP, progress=None):
+    """
+    Render the default and most-requested graph pages into the shared cache.
+
+    Pages are rendered on a thread pool; the job row records progress as
+    they finish. If the data changes again while the job runs, the rest of
+    its pages are skipped and the job is marked superseded.
+
+    Parameters:
+        job --> queued WarmupJob
+        workers --> threads rendering pages at once
+        top --> most-requested filter combinations to warm (see warmup_filters)
+        progress --> optional callable invoked with the job after each page
+
+    Returns:
+        WarmupJob --> the finished job
+    """
+    pages = [(url_name, filters) for filters in warmup_filters(top) for url_name in WARMUP_PAGES]
+    job.status = WarmupJob.RUNNING
+    job.total = len(pages)
+    job.started = timezone.now()
+    job.save(update_fields=['status', 'total', 'started'])
+
+    timings = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_render_page, url_name, filters): (url_name, filters)
+                   for url_name, filters in pages}
+        for future in as_completed(futures):
+            url_name, filters = futures[future]
+            label = f"{url_name.split(':')[-1]}?{filter_query_string(filters)}".rstrip('?')
+            try:
+                timings.append([label, round(future.result(), 1)])
+                job.completed += 1
+            except Exception as e:
+                job.failed += 1
+                job.error += f'{label}: {e}\n'
+            if get_data_version() != job.data_version:
+                job.status = WarmupJob.SUPERSEDED
+                for pending in futures:
+                    pending.cancel()
+                break
+            WarmupJob.objects.filter(pk=job.pk).update(completed=job.completed, failed=job.failed)
+            if progress is not None:
+                progress(job)
+
+    if job.status == WarmupJob.RUNNING:
+        job.status = WarmupJob.FAILED if job.failed else WarmupJob.DONE
+    job.timings = sorted(timings, key=lambda timing: -timing[1])
+    job.finished = timezone.now()
+    job.save()
+    return job
+
+
+def run_pending_warmups(workers=DEFAULT_WORKERS, top=DEFAULT_TOP, progress=None):
+    """
+    Run the queued warm-up job for the current data version, if there is one.
+
+    Jobs queued for an older version are marked superseded instead.
+
+    Returns:
+        WarmupJob or None --> the job that ran
+    """
+    version = get_data_version()
+    ran = None
+    for job in WarmupJob.objects.filter(status=WarmupJob.QUEUED).order_by('created'):
+        if job.data_version != version:
+            job.status = WarmupJob.SUPERSEDED
+            job.finished = timezone.now()
+            job.save(update_fields=['status', 'finished'])
+        else:
+            ran = run_warmup(job, workers, top, progress)
+    return ran